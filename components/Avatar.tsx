@@ -1,12 +1,80 @@
 import React from 'react';
 import { Mic, Volume2 } from 'lucide-react';
+// Generated by `npm run build:avatars` (server/build_avatars.py)
+import avatarManifest from './avatar-manifest.json';
+
+interface AvatarVariant {
+  format: string;
+  width: number;
+  height: number;
+  src: string;
+}
+
+interface AvatarManifestEntry {
+  width: number;
+  height: number;
+  variants: AvatarVariant[];
+}
+
+const AVATAR_IMAGES = (avatarManifest as { images: Record<string, AvatarManifestEntry> }).images;
+const FORMAT_TYPES: Record<string, string> = { avif: 'image/avif', webp: 'image/webp', jpeg: 'image/jpeg' };
+const FALLBACK_WIDTH = 768; // <img src> for browsers without srcset support
+
+// '/examiners/alex.jpg' -> manifest key 'alex'
+const manifestKey = (src: string) => (src.split('/').pop() ?? '').replace(/\.[^.]+$/, '').toLowerCase();
+
+interface AvatarImageProps {
+  src: string;
+  alt: string;
+  sizes: string; // displayed CSS width, e.g. '128px' or '(min-width: 768px) 288px, 256px'
+  className?: string;
+}
+
+/**
+ * Examiner portrait from the avatar manifest: one <source> per modern format plus a JPEG <img>,
+ * all with width-described srcsets, so the browser downloads the smallest variant that covers
+ * `sizes` at the device pixel ratio. Images not in the manifest fall back to the original file.
+ */
+export const AvatarImage: React.FC<AvatarImageProps> = ({ src, alt, sizes, className }) => {
+  const entry = AVATAR_IMAGES[manifestKey(src)];
+  if (!entry) {
+    return <img src={src} alt={alt} className={className} />;
+  }
+  const byFormat = (format: string) => entry.variants.filter(v => v.format === format);
+  const srcSet = (variants: AvatarVariant[]) => variants.map(v => `${v.src} ${v.width}w`).join(', ');
+  const jpeg = byFormat('jpeg');
+  const fallback = jpeg.find(v => v.width >= FALLBACK_WIDTH) ?? jpeg[jpeg.length - 1];
+
+  return (
+    <picture style={{ display: 'contents' }}>
+      {Object.keys(FORMAT_TYPES).filter(f => f !== 'jpeg').map(format => {
+        const variants = byFormat(format);
+        return variants.length ? (
+          <source key={format} type={FORMAT_TYPES[format]} srcSet={srcSet(variants)} sizes={sizes} />
+        ) : null;
+      })}
+      <img
+        src={fallback?.src ?? src}
+        srcSet={jpeg.length ? srcSet(jpeg) : undefined}
+        sizes={sizes}
+        width={entry.width}
+        height={entry.height}
+        alt={alt}
+        decoding="async"
+        className={className}
+      />
+    </picture>
+  );
+};
 
 interface AvatarProps {
   isSpeaking: boolean;
   isListening: boolean;
+  image?: string;
+  name?: string;
 }
 
-const Avatar: React.FC<AvatarProps> = ({ isSpeaking, isListening }) => {
+const Avatar: React.FC<AvatarProps> = ({ isSpeaking, isListening, image, name }) => {
   return (
     <div className="relative flex flex-col items-center justify-center">
       {/* Outer Glow Ring - Active when speaking */}
@@ -14,11 +82,15 @@ const Avatar: React.FC<AvatarProps> = ({ isSpeaking, isListening }) => {
       
       {/* Avatar Container */}
       <div className="relative w-32 h-32 rounded-full overflow-hidden ring-4 ring-white shadow-2xl bg-gradient-to-br from-slate-100 to-slate-200 z-10">
-        <img 
-            src="https://picsum.photos/400/400?grayscale" 
-            alt="AI Examiner" 
-            className="w-full h-full object-cover"
-        />
+        {image ? (
+          <AvatarImage src={image} alt={name ?? 'AI Examiner'} sizes="128px" className="w-full h-full object-cover" />
+        ) : (
+          <img
+              src="https://picsum.photos/400/400?grayscale"
+              alt="AI Examiner"
+              className="w-full h-full object-cover"
+          />
+        )}
         
         {/* Status Overlay */}
         <div className="absolute inset-0 bg-black/10 flex items-center justify-center">
@@ -1,14 +1,19 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { Mic, Square, RefreshCw, ChevronRight, ChevronLeft, Video, VideoOff, Settings, Volume2, MessageSquare, Globe, User, History, X, Calendar, ArrowRight } from 'lucide-react';
-import { ExamState, Message, FeedbackData, ExaminerTurnResponse } from '../types';
+import { ExamState, Message, FeedbackData, ExaminerTurnResponse, AcousticFeatures } from '../types';
 import Button from '../components/Button';
 import Modal from '../components/Modal';
+import { AvatarImage } from '../components/Avatar';
+import { decodeImaAdpcm } from '../services/imaAdpcm';
 
 // Hardcoded Railway Backend for Production
 const API_BASE = import.meta.env.PROD
   ? 'https://smartalk-production-4b65.up.railway.app'
   : ''; // In dev, use proxy
 
+// TTS 下行格式：pcm_24000（默认）或 ima_adpcm_24000（约 1/4 带宽，适合弱网）
+const TTS_FORMAT = import.meta.env.VITE_TTS_FORMAT || 'pcm_24000';
+
 const EXAMINERS = [
   {
     id: 'alex',
@@ -69,12 +74,16 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
   // 0=intro, 1=part1, 2=part2, 3=part3, 4=end
   const [currentPart, setCurrentPart] = useState(0);
   const [questionCount, setQuestionCount] = useState(0);
+  // Part the exam is in or moving to, updated as soon as the examiner's meta arrives (before its
+  // speech starts); read by the ASR standby URL and TTS metering, which run in stale closures
+  const currentPartRef = useRef(0);
 
   // Refs
   const recognitionRef = useRef<any>(null);
   const synthRef = useRef<SpeechSynthesis>(window.speechSynthesis);
   const isRecordingRef = useRef(false);
   const asrWsRef = useRef<WebSocket | null>(null);
+  const asrStandbyRef = useRef<WebSocket | null>(null); // pre-opened while the examiner speaks
   const asrStreamRef = useRef<MediaStream | null>(null);
   const asrCtxRef = useRef<AudioContext | null>(null);
   const asrProcessorRef = useRef<AudioWorkletNode | null>(null);
@@ -94,6 +103,14 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
   // ASR partial text throttling
   const asrPartialBufferRef = useRef<string>('');
   const asrPartialTimerRef = useRef<number | null>(null);
+  // partial_delta 重建：上一条完整 partial 文本与序号（seq 断档时等下一次全量 partial 重同步）
+  const asrPartialTextRef = useRef<string>('');
+  const asrPartialSeqRef = useRef<number>(0);
+  const asrAcousticRef = useRef<AcousticFeatures | null>(null); // features of the answer just committed
+  // 本场考试 ID：ASR 桥接按它归档考生音频（每次 commit 一个 turn）
+  const examSessionIdRef = useRef<string>(`exam_${Date.now()}`);
+  // Messages the server holds for this exam (examiner session mode); 0 = send the full history to (re)seed it
+  const serverHistoryLenRef = useRef(0);
 
   // Derived current examiner
   const currentExaminer = EXAMINERS[currentExaminerIdx];
@@ -159,6 +176,7 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
         // ignore
       }
       asrWsRef.current = null;
+      closeAsrStandby();
       try {
         asrStreamRef.current?.getTracks().forEach(t => t.stop());
       } catch {
@@ -190,15 +208,26 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
   ): Promise<{ text: string; meta?: any }> => {
     console.log(`[LLM] Calling API: part=${currentPart}, q_count=${questionCount}, msg_count=${llmMessages.length}`);
 
+    // Session mode: once the server holds the history, send only the new user message.
+    // Any failure resets the count, so the next turn re-sends everything.
+    const held = serverHistoryLenRef.current;
+    const incremental = held > 0 && held === llmMessages.length - 1;
+    serverHistoryLenRef.current = 0;
+
     // Use correct endpoint for streaming
     const resp = await fetch(`${API_BASE}/api/v1/ielts/examiner/stream`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
-        messages: llmMessages, // Kept original `llmMessages` as `historyWithoutSystem` is undefined
-        model: 'qwen-plus',
+        ...(incremental
+          ? { message: llmMessages[llmMessages.length - 1], historyLength: held }
+          : { messages: llmMessages }),
+        sessionId: examSessionIdRef.current,
+        // model is chosen server-side per part (model_router.py); meta.route reports it
         part: currentPart,
-        questionCount: questionCount
+        questionCount: questionCount,
+        session: examSessionIdRef.current,
+        examinerId: currentExaminer.id, // recorded with the exam history (session_store.py)
       }),
     });
 
@@ -213,6 +242,7 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
     let accumulatedText = '';
     let finalMeta: any = null;
     let sawEnd = false;
+    let outOfSync = false;
 
     while (true) {
       const { value, done } = await reader.read();
@@ -251,6 +281,8 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
                   accumulatedText = obj.text || accumulatedText;
                   finalMeta = obj.meta;
                   console.log('[LLM] Received final response with metadata:', finalMeta);
+                } else if (obj.type === 'error' && obj.code === 'session_out_of_sync') {
+                  outOfSync = true;
                 } else if (obj.type === 'error') {
                   throw new Error(obj.message || 'LLM API Error');
                 }
@@ -273,10 +305,16 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
       }
     }
 
+    if (outOfSync && incremental) {
+      console.warn('[LLM] Server conversation out of sync, resending full history');
+      return fetchExaminerTurn(llmMessages, { onDraft });
+    }
+
     if (!accumulatedText.trim()) {
       throw new Error('LLM returned empty response');
     }
 
+    serverHistoryLenRef.current = llmMessages.length + 1; // + the examiner reply the server appended
     return {
       text: accumulatedText.trim(),
       meta: finalMeta
@@ -290,7 +328,10 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
       setAiDraft('');
 
       // Reset exam state machine
+      examSessionIdRef.current = `exam_${Date.now()}`;
+      serverHistoryLenRef.current = 0;
       setCurrentPart(0); // Start from intro
+      currentPartRef.current = 0;
       setQuestionCount(0);
 
       // OPTIMIZATION: Use preset greeting immediately (0 latency)
@@ -333,13 +374,63 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
     }
   };
 
-  const decodeBase64ToInt16 = (b64: string) => {
+  const buildAsrWsUrl = (standby: boolean) => {
+    // Part 2 long turn: the bridge commits at pauses, so only the last stretch is left to finalize after stop
+    const query = `language=en&threshold=0.0&silenceMs=400&partial=delta&raw=0&session=${examSessionIdRef.current}${standby ? '&standby=1' : ''}&segment=${currentPartRef.current === 2 ? 1 : 0}`;
+    if (API_BASE) {
+      // Production: Use API_BASE (replace https -> wss, http -> ws)
+      const wsBase = API_BASE.replace(/^http/, 'ws');
+      return `${wsBase}/api/v1/asr/realtime/ws?${query}`;
+    }
+    // Dev: Localhost direct connect (bypass Vite proxy for stability)
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    return `${proto}://${window.location.hostname}:5176/api/v1/asr/realtime/ws?${query}`;
+  };
+
+  const closeAsrStandby = () => {
+    const ws = asrStandbyRef.current;
+    asrStandbyRef.current = null;
+    if (!ws) return;
+    try {
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: 'close' }));
+      ws.close();
+    } catch {
+      // ignore
+    }
+  };
+
+  // Warm standby: while the examiner is speaking, open and configure the next ASR session
+  // so that recording starts against a ready upstream. The bridge closes it after an idle timeout.
+  const openAsrStandby = () => {
+    if (isRecordingRef.current) return;
+    const existing = asrStandbyRef.current;
+    if (existing && (existing.readyState === WebSocket.OPEN || existing.readyState === WebSocket.CONNECTING)) return;
+    const ws = new WebSocket(buildAsrWsUrl(true));
+    asrStandbyRef.current = ws;
+    ws.onmessage = (ev) => {
+      try {
+        const msg = JSON.parse(String(ev.data));
+        if (msg.event === 'standby_expired' || msg.event === 'error' || msg.event === 'close') {
+          if (asrStandbyRef.current === ws) closeAsrStandby();
+        }
+      } catch {
+        // ignore non-JSON
+      }
+    };
+    ws.onclose = () => {
+      if (asrStandbyRef.current === ws) asrStandbyRef.current = null;
+    };
+  };
+
+  const decodeBase64ToBytes = (b64: string) => {
     const bin = atob(b64);
     const bytes = new Uint8Array(bin.length);
     for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
-    return new Int16Array(bytes.buffer);
+    return bytes;
   };
 
+  const decodeBase64ToInt16 = (b64: string) => new Int16Array(decodeBase64ToBytes(b64).buffer);
+
   const playPcmChunk = (pcm16: Int16Array, sampleRate: number) => {
     if (!audioCtxRef.current) return;
     const ctx = audioCtxRef.current;
@@ -397,6 +488,7 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
       await audioCtxRef.current.resume();
 
       setIsAiSpeaking(true);
+      openAsrStandby();
 
       const ctrl = new AbortController();
       ttsAbortRef.current = ctrl;
@@ -409,7 +501,10 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
           voice: currentExaminer.voice, // Use examiner-specific voice
           language_type: 'English',
           mode: 'server_commit',
-          format: 'pcm_24000'
+          format: TTS_FORMAT,
+          // 计量：按考试会话 / 部分记账
+          session: examSessionIdRef.current,
+          part: currentPartRef.current,
         }),
         signal: ctrl.signal,
       });
@@ -422,6 +517,9 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
       const decoder = new TextDecoder('utf-8');
       let buf = '';
       let lastScheduledEnd = 0;
+      // 服务端给出精确的累计采样数：收到 response_done 且样本数对齐时，最后一块已排进播放队列，
+      // 此时的 lastScheduledEnd 就是考官说完的准确时刻，无需再等 session 结束。
+      let receivedSamples = 0;
 
       const flushEndTimer = () => {
         if (!audioCtxRef.current) return;
@@ -457,12 +555,21 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
 
             if (evt.event === 'audio' && evt.b64) {
               console.log('[TTS] Received audio chunk, length:', evt.b64.length);
-              const pcm16 = decodeBase64ToInt16(String(evt.b64));
+              const pcm16 = evt.codec === 'ima_adpcm'
+                ? decodeImaAdpcm(decodeBase64ToBytes(String(evt.b64)), Number(evt.samples) || 0, Number(evt.block) || 65)
+                : decodeBase64ToInt16(String(evt.b64));
               playPcmChunk(pcm16, 24000);
+              receivedSamples += pcm16.length;
               if (audioCtxRef.current) lastScheduledEnd = Math.max(lastScheduledEnd, ttsNextTimeRef.current || 0);
               continue;
             }
 
+            if (evt.event === 'response_done') {
+              console.log('[TTS] Response done:', evt.duration_ms, 'ms, trimmed', evt.trimmed_ms, 'ms');
+              if (typeof evt.samples !== 'number' || receivedSamples >= evt.samples) flushEndTimer();
+              continue;
+            }
+
             if (evt.event === 'error') {
               console.error('[TTS] Server error event:', evt.message);
               throw new Error(evt.message || 'TTS error');
@@ -594,20 +701,27 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
 
       finalTranscriptRef.current = '';
       autoStopGuardRef.current = false;
+      asrPartialTextRef.current = '';
+      asrPartialSeqRef.current = 0;
+      asrAcousticRef.current = null;
       setTranscript('');
 
-      let wsUrl = '';
-      if (API_BASE) {
-        // Production: Use API_BASE (replace https -> wss, http -> ws)
-        const wsBase = API_BASE.replace(/^http/, 'ws');
-        wsUrl = `${wsBase}/api/v1/asr/realtime/ws?language=en&threshold=0.0&silenceMs=400`;
+      // Reuse the warm standby session if it is still alive; otherwise connect now
+      const standby = asrStandbyRef.current;
+      asrStandbyRef.current = null;
+      let ws: WebSocket;
+      if (standby && (standby.readyState === WebSocket.OPEN || standby.readyState === WebSocket.CONNECTING)) {
+        console.log('[ASR] Using warm standby WebSocket');
+        ws = standby;
+        // The standby may predate a part change: set segmented commits for the part being answered
+        const segmentConfig = JSON.stringify({ type: 'config', segment: currentPartRef.current === 2 });
+        if (ws.readyState === WebSocket.OPEN) ws.send(segmentConfig);
+        else ws.addEventListener('open', () => ws.send(segmentConfig), { once: true });
       } else {
-        // Dev: Localhost direct connect (bypass Vite proxy for stability)
-        const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
-        wsUrl = `${proto}://${window.location.hostname}:5176/api/v1/asr/realtime/ws?language=en&threshold=0.0&silenceMs=400`;
+        const wsUrl = buildAsrWsUrl(false);
+        console.log('[ASR] Connecting to WebSocket:', wsUrl);
+        ws = new WebSocket(wsUrl);
       }
-      console.log('[ASR] Connecting to WebSocket:', wsUrl);
-      const ws = new WebSocket(wsUrl);
       asrWsRef.current = ws;
 
       ws.onopen = () => {
@@ -626,11 +740,30 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
             alert(`实时语音识别失败：${msg.message}\n请检查后端服务与 DASHSCOPE_API_KEY。`);
             return;
           }
-          if (msg.event === 'partial' && typeof msg.text === 'string') {
+          if (msg.event === 'acoustic' && msg.features) {
+            // Arrives right after commit, before the final transcript of the same answer
+            asrAcousticRef.current = msg.features as AcousticFeatures;
+            return;
+          }
+          if (msg.event === 'reconnecting' || msg.event === 'resumed') {
+            // The bridge reconnects upstream in place and replays buffered audio: keep recording
+            console.warn(`[ASR] Upstream ${msg.event}:`, msg);
+            return;
+          }
+          if ((msg.event === 'partial' || msg.event === 'partial_delta') && typeof msg.text === 'string') {
+            let text = msg.text;
+            if (msg.event === 'partial_delta') {
+              // Delta mode: keep the first `keep` chars of the previous partial, append the new suffix
+              if (msg.seq !== asrPartialSeqRef.current + 1) return; // gap: wait for the next full partial
+              text = asrPartialTextRef.current.slice(0, Number(msg.keep) || 0) + msg.text;
+            }
+            if (typeof msg.seq === 'number') asrPartialSeqRef.current = msg.seq;
+            asrPartialTextRef.current = text;
+
             // Manual commit mode: accumulate all partial text
             // OPTIMIZATION: Throttle UI updates to reduce re-renders
-            asrPartialBufferRef.current = msg.text;
-            finalTranscriptRef.current = msg.text; // Keep updating with latest
+            asrPartialBufferRef.current = text;
+            finalTranscriptRef.current = text; // Keep updating with latest
 
             // Only update UI every 300ms to avoid excessive re-renders
             if (!asrPartialTimerRef.current) {
@@ -644,6 +777,8 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
           if (msg.event === 'final' && typeof msg.text === 'string') {
             // In manual commit mode, final text comes after user clicks stop (commit)
             console.log('[ASR] Final transcript after commit:', msg.text);
+            asrPartialTextRef.current = '';
+            asrPartialSeqRef.current = 0;
             setTranscript(msg.text);
             finalTranscriptRef.current = msg.text;
 
@@ -782,7 +917,9 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
 
   const handleSendMessage = async (text: string) => {
     if (!text.trim()) return;
-    const userMsg: Message = { role: 'user', text };
+    const acoustic = asrAcousticRef.current;
+    asrAcousticRef.current = null;
+    const userMsg: Message = acoustic ? { role: 'user', text, acoustic } : { role: 'user', text };
 
     // Check if this is the answer to the greeting (Part 1 Start)
     // History: [Greeting] + [User Name] -> length 2
@@ -805,6 +942,10 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
       // Add examiner's response to messages
       const modelMsg: Message = { role: 'model', text: examinerText };
       setMessages(prev => [...prev, modelMsg]);
+      // The standby ASR session opened during this speech serves the next part (segmented in Part 2)
+      if (response.meta?.suggested_next_part !== undefined) {
+        currentPartRef.current = response.meta.suggested_next_part;
+      }
       speakText(examinerText);
 
       // Update exam state based on metadata (State Machine)
@@ -864,6 +1005,7 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
         body: JSON.stringify({
           model: 'qwen-plus',
           transcript: messages,
+          session: examSessionIdRef.current,
         }),
         signal: controller.signal,
       });
@@ -963,10 +1105,11 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
             <div className="absolute inset-0 bg-ios-blue/20 rounded-[2.5rem] blur-xl transform group-hover:scale-105 transition-transform duration-500"></div>
             <div className="bg-white rounded-[2.5rem] shadow-ios-hover relative border border-white/50 overflow-hidden transition-all duration-500 transform">
               <div className="h-64 md:h-72 w-full relative overflow-hidden">
-                <img
+                <AvatarImage
                   key={currentExaminer.id}
                   src={currentExaminer.image}
                   alt={currentExaminer.name}
+                  sizes="(min-width: 768px) 288px, 256px"
                   className="w-full h-full object-cover animate-fade-in"
                 />
                 <div className="absolute inset-0 bg-gradient-to-t from-black/60 to-transparent"></div>
@@ -1198,9 +1341,10 @@ const IeltsExam: React.FC<IeltsExamProps> = ({ onExamStatusChange }) => {
 
         {/* 1. EXAMINER FEED (Background) */}
         <div className="absolute inset-0">
-          <img
+          <AvatarImage
             src={currentExaminer.image}
             alt="Examiner"
+            sizes="(min-width: 1152px) 1152px, 100vw"
             className={`w-full h-full object-cover transition-transform duration-[20s] ease-linear ${isAiSpeaking ? 'scale-110' : 'scale-100'}`}
           />
           <div className="absolute inset-0 bg-gradient-to-t from-black/80 via-transparent to-black/30"></div>
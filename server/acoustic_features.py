@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Streaming acoustic analysis of the candidate's answer (16 kHz PCM16), for the rater.
+
+The ASR bridge feeds every audio chunk it forwards upstream; frames are
+analyzed in batches with numpy (40 ms window, 10 ms hop):
+  - loudness: frame RMS in dBFS; mean / spread over speech frames
+  - pitch: normalized autocorrelation (one FFT per batch), peak lag in
+    70-400 Hz with parabolic refinement; voiced = strong periodicity
+  - voiced / unvoiced ratio over speech frames
+  - syllable nuclei: prominent peaks of the voiced loudness envelope, for
+    articulation rate (per second of speaking time) and speech rate
+  - pauses: silent runs of at least 250 ms between speech
+
+Memory is constant per session: a few frames of carried samples and
+envelope, running sums, and fixed-bin histograms for the noise floor and
+pitch percentiles. `finish()` returns a compact per-turn feature dict and
+resets for the next turn; qwen_llm_feedback.py summarizes the turns for
+the rater prompt.
+
+Usage (offline check / speed):
+  python3 server/acoustic_features.py answer.wav [--chunk-ms 85]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+WIN = 640  # 40 ms: two periods of a 50 Hz voice
+HOP = 160  # 10 ms
+N_FFT = 1024
+F0_MIN, F0_MAX = 70.0, 400.0
+VOICING_THRESHOLD = 0.45  # normalized autocorrelation peak
+SPEECH_ABOVE_FLOOR_DB = 10.0
+SPEECH_MIN_DBFS = -55.0
+BATCH_FRAMES = 32  # analyze once this many new frames are available (~320 ms)
+PEAK_HALF_WINDOW = 7  # ±70 ms for syllable-peak prominence
+PEAK_PROMINENCE_DB = 3.0
+PEAK_MIN_DISTANCE = 10  # at most 10 syllables / s
+PAUSE_MIN_FRAMES = 25  # 250 ms
+LONG_PAUSE_FRAMES = 100  # 1 s
+
+_DB_BINS = np.arange(-100.0, 1.0, 1.0)  # loudness histogram (noise floor)
+_ST_REF = 55.0
+_ST_BINS = np.arange(0.0, 48.25, 0.25)  # pitch histogram, semitones above 55 Hz
+
+
+class _Running:
+    """Batch-updatable mean / variance (Chan et al.)."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x: np.ndarray) -> None:
+        if not len(x):
+            return
+        n_b = len(x)
+        mean_b = float(x.mean())
+        m2_b = float(((x - mean_b) ** 2).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+
+    def std(self) -> float:
+        return (self.m2 / self.n) ** 0.5 if self.n > 1 else 0.0
+
+
+def _hist_percentile(hist: np.ndarray, edges: np.ndarray, q: float) -> float:
+    total = hist.sum()
+    if total <= 0:
+        return float("nan")
+    idx = int(np.searchsorted(np.cumsum(hist), q / 100.0 * total))
+    idx = min(idx, len(hist) - 1)
+    return float((edges[idx] + edges[idx + 1]) / 2)
+
+
+class StreamingAcousticAnalyzer:
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        if sample_rate != SAMPLE_RATE:
+            raise ValueError("the analyzer expects 16 kHz audio (what the bridge forwards)")
+        self._window = np.hanning(WIN).astype(np.float32)
+        self._lag_lo = int(SAMPLE_RATE / F0_MAX)
+        self._lag_hi = int(SAMPLE_RATE / F0_MIN)
+        self._db_hist = np.zeros(len(_DB_BINS) - 1)  # noise floor survives across turns (same mic)
+        self.cpu_s = 0.0
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new turn."""
+        self._samples = np.zeros(0, dtype=np.float32)  # carried samples (< WIN + BATCH_FRAMES * HOP)
+        self._env = np.zeros(0)  # voiced-loudness envelope awaiting peak context
+        self._env_offset = 0  # frame index of _env[0]
+        self._last_peak = -PEAK_MIN_DISTANCE
+        self._frames = 0
+        self._speech_frames = 0
+        self._voiced_frames = 0
+        self._loud = _Running()
+        self._pitch = _Running()
+        self._st_hist = np.zeros(len(_ST_BINS) - 1)
+        self._syllables = 0
+        self._silence_run = 0
+        self._seen_speech = False
+        self._pauses = 0
+        self._pause_frames = 0
+        self._long_pauses = 0
+
+    # ---- streaming input ----
+
+    def feed(self, pcm: bytes) -> None:
+        t0 = time.process_time()
+        x = np.frombuffer(pcm[: len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.float32) / 32768.0
+        self._samples = np.concatenate([self._samples, x])
+        if len(self._samples) >= WIN + BATCH_FRAMES * HOP:
+            self._process(final=False)
+        self.cpu_s += time.process_time() - t0
+
+    def finish(self) -> dict:
+        """Analyze what is left, return the turn's feature vector and reset."""
+        t0 = time.process_time()
+        self._process(final=True)
+        features = self._features()
+        self.reset()
+        self.cpu_s += time.process_time() - t0
+        return features
+
+    # ---- batch math ----
+
+    def _process(self, final: bool) -> None:
+        x = self._samples
+        n = (len(x) - WIN) // HOP + 1 if len(x) >= WIN else 0
+        if n > 0:
+            frames = np.lib.stride_tricks.sliding_window_view(x, WIN)[::HOP][:n]
+            self._samples = x[n * HOP:]
+            self._analyze(frames)
+        if final:
+            self._flush_envelope()
+            self._samples = np.zeros(0, dtype=np.float32)
+
+    def _analyze(self, frames: np.ndarray) -> None:
+        rms_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        self._db_hist += np.histogram(np.clip(rms_db, -99.5, -0.5), bins=_DB_BINS)[0]
+        floor = _hist_percentile(self._db_hist, _DB_BINS, 10)
+        speech = rms_db > max(floor + SPEECH_ABOVE_FLOOR_DB, SPEECH_MIN_DBFS)
+
+        # normalized autocorrelation of every frame via one batched FFT
+        w = (frames - frames.mean(axis=1, keepdims=True)) * self._window
+        spec = np.fft.rfft(w, n=N_FFT, axis=1)
+        ac = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, n=N_FFT, axis=1)
+        r0 = ac[:, 0] + 1e-12
+        seg = ac[:, self._lag_lo:self._lag_hi + 2]
+        k = np.argmax(seg[:, :-1], axis=1)
+        peak = seg[np.arange(len(k)), k] / r0
+        voiced = speech & (peak > VOICING_THRESHOLD)
+        # parabolic refinement of the lag
+        y0 = seg[np.arange(len(k)), np.maximum(k - 1, 0)]
+        y1 = seg[np.arange(len(k)), k]
+        y2 = seg[np.arange(len(k)), k + 1]
+        denom = y0 - 2 * y1 + y2
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (y0 - y2) / np.where(denom == 0, 1, denom), 0.0)
+        lag = self._lag_lo + k + np.clip(shift, -0.5, 0.5)
+        f0 = SAMPLE_RATE / np.maximum(lag, 1.0)
+
+        self._frames += len(frames)
+        self._speech_frames += int(speech.sum())
+        self._voiced_frames += int(voiced.sum())
+        self._loud.update(rms_db[speech])
+        st = 12.0 * np.log2(f0[voiced] / _ST_REF)
+        self._pitch.update(st)
+        self._st_hist += np.histogram(np.clip(st, 0.0, 48.0 - 1e-6), bins=_ST_BINS)[0]
+
+        self._count_pauses(speech)
+        # syllable envelope: loudness on voiced frames, floor elsewhere
+        env = np.where(voiced, rms_db, floor)
+        self._env = np.concatenate([self._env, env])
+        self._pick_peaks(final=False)
+
+    def _count_pauses(self, speech: np.ndarray) -> None:
+        """Run-length of silence across batches; a run counts once speech resumes after it."""
+        idx = np.flatnonzero(speech)
+        if not len(idx):
+            self._silence_run += len(speech)
+            return
+        runs = []
+        first = idx[0]
+        runs.append(self._silence_run + first)
+        gaps = np.diff(idx) - 1
+        runs.extend(gaps[gaps > 0].tolist())
+        if self._seen_speech:
+            candidates = runs
+        else:
+            candidates = runs[1:]  # leading silence of the turn is not a pause
+        for r in candidates:
+            if r >= PAUSE_MIN_FRAMES:
+                self._pauses += 1
+                self._pause_frames += r
+                if r >= LONG_PAUSE_FRAMES:
+                    self._long_pauses += 1
+        self._seen_speech = True
+        self._silence_run = len(speech) - 1 - idx[-1]
+
+    def _pick_peaks(self, final: bool) -> None:
+        env = self._env
+        h = PEAK_HALF_WINDOW
+        if len(env) < 2 * h + 1:
+            if final:
+                self._env = np.zeros(0)
+            return
+        kernel = np.ones(3) / 3
+        smooth = np.convolve(env, kernel, mode="same")
+        win = np.lib.stride_tricks.sliding_window_view(smooth, 2 * h + 1)
+        center = smooth[h:len(smooth) - h]
+        is_max = (center >= win.max(axis=1)) & (center - win.min(axis=1) >= PEAK_PROMINENCE_DB)
+        for c in np.flatnonzero(is_max):
+            frame = self._env_offset + h + int(c)
+            if frame - self._last_peak >= PEAK_MIN_DISTANCE:
+                self._syllables += 1
+                self._last_peak = frame
+        # keep 2h frames of context for the next batch
+        done = len(env) - 2 * h
+        self._env = env[done:] if not final else np.zeros(0)
+        self._env_offset += done
+
+    def _flush_envelope(self) -> None:
+        if len(self._env):
+            pad = np.full(PEAK_HALF_WINDOW, self._env.min())
+            self._env = np.concatenate([self._env, pad])
+            self._pick_peaks(final=True)
+
+    # ---- output ----
+
+    def _features(self) -> dict:
+        hop_s = HOP / SAMPLE_RATE
+        duration = self._frames * hop_s
+        speech_s = self._speech_frames * hop_s
+        speaking_s = max(speech_s, 1e-6)
+        p5 = _hist_percentile(self._st_hist, _ST_BINS, 5)
+        p50 = _hist_percentile(self._st_hist, _ST_BINS, 50)
+        p95 = _hist_percentile(self._st_hist, _ST_BINS, 95)
+        has_pitch = self._voiced_frames >= 10
+
+        def r(v, nd=2):
+            return None if v is None or v != v else round(float(v), nd)
+
+        return {
+            "duration_s": r(duration),
+            "speech_s": r(speech_s),
+            "speech_ratio": r(speech_s / duration if duration else 0.0),
+            "voiced_ratio": r(self._voiced_frames / self._speech_frames if self._speech_frames else 0.0),
+            "loudness_db": r(self._loud.mean if self._loud.n else None, 1),
+            "loudness_std_db": r(self._loud.std(), 1),
+            "loudness_stability": r(np.exp(-self._loud.std() / 10.0) if self._loud.n else None),
+            "pitch_median_hz": r(_ST_REF * 2 ** (p50 / 12.0) if has_pitch else None, 0),
+            "pitch_range_st": r(p95 - p5 if has_pitch else None, 1),
+            "pitch_std_st": r(self._pitch.std() if has_pitch else None, 1),
+            "syllables": int(self._syllables),
+            "articulation_rate": r(self._syllables / speaking_s if speech_s else 0.0),
+            "speech_rate": r(self._syllables / duration if duration else 0.0),
+            "pauses": int(self._pauses),
+            "mean_pause_s": r(self._pause_frames * hop_s / self._pauses if self._pauses else 0.0),
+            "long_pauses": int(self._long_pauses),
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream a WAV through the acoustic analyzer (as the ASR bridge does)")
+    parser.add_argument("wav", help="16-bit mono 16 kHz WAV")
+    parser.add_argument("--chunk-ms", type=int, default=85)
+    args = parser.parse_args()
+
+    import wave
+
+    try:
+        with wave.open(args.wav, "rb") as w:
+            if w.getsampwidth() != 2 or w.getnchannels() != 1 or w.getframerate() != SAMPLE_RATE:
+                raise ValueError("need 16-bit mono 16 kHz WAV")
+            pcm = w.readframes(w.getnframes())
+    except (OSError, ValueError, wave.Error) as e:
+        sys.stderr.write(f"[ERROR] {e}\n")
+        return 2
+
+    analyzer = StreamingAcousticAnalyzer()
+    step = SAMPLE_RATE * args.chunk_ms // 1000 * 2
+    for pos in range(0, len(pcm), step):
+        analyzer.feed(pcm[pos:pos + step])
+    features = analyzer.finish()
+    audio_s = len(pcm) / 2 / SAMPLE_RATE
+    print(json.dumps(features, indent=2))
+    sys.stderr.write(f"[STATS] audio={audio_s:.1f}s cpu={analyzer.cpu_s * 1000:.1f}ms "
+                     f"({analyzer.cpu_s / max(audio_s, 1e-9) * 100:.2f}% of realtime)\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Replay a recording into the realtime ASR bridges, exactly as the frontend would.
+
+Feeds a WAV (any rate, resampled to 16 kHz the way the browser worklet does)
+or raw PCM16 file into qwen_asr_realtime_bridge.py or qwen_asr_realtime_ws.py
+over stdin, using that script's own JSONL protocol:
+
+  bridge: {"type":"config",...}  {"type":"audio","audio_b64":...}  {"type":"commit"}  {"type":"close"}
+  ws:     {"type":"audio","b64":...}  {"type":"commit"}  {"type":"stop"}
+
+Audio is paced on an absolute schedule (no drift) at 1x, Nx or as fast as
+possible (--speed 0), commits are sent at scripted audio positions, and
+every stdout event is logged with a timestamp. The summary gives, per
+commit, the latency from sending `commit` to the next `final`.
+
+Usage:
+  python3 server/asr_replay.py answer.wav --commit-at 12.5,30 --speed 2 --log replay.jsonl
+  python3 server/asr_replay.py turn-0003.wav --target ws --speed 0
+  python3 server/asr_replay.py part2.wav --segment --speed 4
+  python3 server/asr_replay.py capture.pcm --raw-rate 16000 --chunk-ms 85
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+TARGET_RATE = 16000
+# asr16k-worklet.ts posts every 4096 input samples: 4096 / 48000 s ≈ 85 ms
+DEFAULT_CHUNK_MS = 85
+
+TARGETS = {
+    "bridge": "server/qwen_asr_realtime_bridge.py",
+    "ws": "server/qwen_asr_realtime_ws.py",
+}
+
+
+def load_pcm16(path: str, raw_rate: int = 0) -> bytes:
+    """Return mono PCM16 @ 16 kHz. Resampling is nearest-neighbour, same as the browser worklet."""
+    if raw_rate:
+        with open(path, "rb") as f:
+            data = f.read()
+        rate, channels = raw_rate, 1
+    else:
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+            rate, channels = w.getframerate(), w.getnchannels()
+            data = w.readframes(w.getnframes())
+
+    import array
+
+    samples = array.array("h")
+    samples.frombytes(data[: len(data) - len(data) % (2 * channels)])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if channels > 1:
+        samples = samples[::channels]
+    if rate != TARGET_RATE:
+        ratio = rate / TARGET_RATE
+        samples = array.array("h", (samples[int(i * ratio)] for i in range(int(len(samples) / ratio))))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+class _Counter:
+    def __init__(self):
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def incr(self) -> None:
+        with self._lock:
+            self._n += 1
+
+    def value(self) -> int:
+        with self._lock:
+            return self._n
+
+
+class _Recorder:
+    """Reads the child's stdout on a thread and timestamps every JSON event."""
+
+    def __init__(self, proc, t0: float, clock):
+        self.proc = proc
+        self.t0 = t0
+        self.clock = clock
+        self.events = []
+        self.finals = _Counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        for raw in self.proc.stdout:
+            now = time.perf_counter()
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            try:
+                evt = json.loads(line)
+            except ValueError:
+                continue
+            rec = {"t_ms": round((now - self.t0) * 1000, 1), "audio_ms": self.clock(), "dir": "in", "msg": evt}
+            self.events.append(rec)
+            if evt.get("event") == "final":
+                self.finals.incr()
+
+    def join(self, timeout: float) -> None:
+        self._thread.join(timeout)
+
+
+def replay(pcm: bytes, target: str, speed: float, chunk_ms: int, commit_at, final_timeout: float,
+           language: str, env: dict, extra_args=(), config=None):
+    chunk_bytes = TARGET_RATE * chunk_ms // 1000 * 2
+    total_ms = len(pcm) / 2 / TARGET_RATE * 1000
+    commits = sorted(c for c in commit_at if 0 < c < total_ms) + [total_ms]
+    stop_msg = {"type": "close"} if target == "bridge" else {"type": "stop"}
+    audio_key = "audio_b64" if target == "bridge" else "b64"
+
+    args = [sys.executable, TARGETS[target]]
+    if target == "ws":
+        args += ["--language", language, "--enable-turn-detection", "false"]
+    args += list(extra_args)
+
+    sent_ms = [0.0]
+    log = []
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=ROOT_DIR, env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    rec = _Recorder(proc, t0, lambda: round(sent_ms[0], 1))
+    stderr_lines = []
+    threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True).start()
+
+    def send(msg: dict, log_it: bool = True) -> float:
+        proc.stdin.write((json.dumps(msg) + "\n").encode("utf-8"))
+        proc.stdin.flush()
+        now = time.perf_counter()
+        if log_it:
+            log.append({"t_ms": round((now - t0) * 1000, 1), "audio_ms": round(sent_ms[0], 1), "dir": "out", "msg": msg})
+        return now
+
+    results = []
+    try:
+        if target == "bridge":
+            # 与 Node 在连接建立时发送的 config 一致
+            send({"type": "config", "language": language, "enable_turn_detection": True,
+                  "turn_detection_threshold": 0.0, "turn_detection_silence_duration_ms": 400, "corpus_text": "",
+                  **(config or {})})
+
+        pos = 0
+        next_commit = 0
+        start = time.perf_counter()
+        while pos < len(pcm):
+            chunk = pcm[pos:pos + chunk_bytes]
+            if speed > 0:
+                # 绝对时间表：第 k 块在 start + 音频位置 / speed 发出，不累积误差
+                due = start + (sent_ms[0] / 1000) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            send({"type": "audio", audio_key: base64.b64encode(chunk).decode("ascii")}, log_it=False)
+            pos += len(chunk)
+            sent_ms[0] = pos / 2 / TARGET_RATE * 1000
+
+            while next_commit < len(commits) and sent_ms[0] >= commits[next_commit] - 1e-6:
+                sent_at = send({"type": "commit"})
+                results.append({"audio_ms": round(sent_ms[0], 1), "final_ms": None, "_sent_t": (sent_at - t0) * 1000})
+                next_commit += 1
+
+        # 推流不因中途 commit 阻塞；最后等齐每个 commit 的 final（按顺序一一对应）
+        deadline = time.perf_counter() + final_timeout
+        while rec.finals.value() < len(results) and proc.poll() is None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.01, remaining))
+        finals_in = [e for e in rec.events if e["msg"].get("event") == "final"]
+        for r in results:
+            match = next((e for e in finals_in if e["t_ms"] >= r["_sent_t"]), None)
+            if match is not None:
+                r["final_ms"] = round(match["t_ms"] - r["_sent_t"], 1)
+                finals_in.remove(match)
+        send(stop_msg)
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    except BrokenPipeError:
+        proc.wait()
+    rec.join(2.0)
+
+    for r in results:
+        r.pop("_sent_t", None)
+    events = sorted(log + rec.events, key=lambda e: e["t_ms"])
+    return {
+        "audio_ms": round(total_ms, 1),
+        "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "exit_code": proc.returncode,
+        "commits": results,
+        "events": events,
+        "stderr_tail": b"".join(stderr_lines[-5:]).decode("utf-8", errors="replace"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a recording into the realtime ASR bridge")
+    parser.add_argument("audio", help="WAV file (16-bit) or raw PCM16 with --raw-rate")
+    parser.add_argument("--target", default="bridge", choices=sorted(TARGETS))
+    parser.add_argument("--raw-rate", type=int, default=0, help="Treat input as raw mono PCM16 at this rate")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = realtime, N = N times faster, 0 = as fast as possible")
+    parser.add_argument("--chunk-ms", type=int, default=DEFAULT_CHUNK_MS)
+    parser.add_argument("--commit-at", default="", help="Comma-separated audio positions in seconds; a final commit is always sent at the end")
+    parser.add_argument("--final-timeout", type=float, default=15.0)
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--runs", type=int, default=1, help="Repeat the replay and report latency percentiles")
+    parser.add_argument("--log", default="", help="Write every sent command / received event as JSONL")
+    parser.add_argument("--segment", action="store_true", help="Bridge: segmented mode (auto-commit at pauses)")
+    args, extra = parser.parse_known_args()
+
+    try:
+        pcm = load_pcm16(args.audio, args.raw_rate)
+        commit_at = [float(x) * 1000 for x in args.commit_at.split(",") if x.strip()]
+    except (OSError, ValueError, wave.Error) as e:
+        sys.stderr.write(f"[ERROR] {e}\n")
+        return 2
+    if not pcm:
+        sys.stderr.write("[ERROR] no audio\n")
+        return 2
+
+    env = dict(os.environ)
+    log_f = open(args.log, "w", encoding="utf-8") if args.log else None
+    latencies = []
+    try:
+        for run_no in range(1, max(1, args.runs) + 1):
+            res = replay(pcm, args.target, args.speed, args.chunk_ms, commit_at, args.final_timeout,
+                         args.language, env, extra, {"segment": True} if args.segment else None)
+            if log_f:
+                for e in res["events"]:
+                    log_f.write(json.dumps({"run": run_no, **e}, ensure_ascii=False) + "\n")
+            finals = [e for e in res["events"] if e["dir"] == "in" and e["msg"].get("event") == "final"]
+            print(f"[REPLAY] run={run_no} audio={res['audio_ms'] / 1000:.1f}s wall={res['wall_ms'] / 1000:.1f}s "
+                  f"events={sum(1 for e in res['events'] if e['dir'] == 'in')} finals={len(finals)} exit={res['exit_code']}")
+            for i, c in enumerate(res["commits"], 1):
+                ms = "timeout" if c["final_ms"] is None else f"{c['final_ms']:.0f}ms"
+                print(f"  commit {i} @ {c['audio_ms'] / 1000:.2f}s -> final {ms}")
+                if c["final_ms"] is not None:
+                    latencies.append(c["final_ms"])
+            if res["exit_code"] not in (0, None) and res["stderr_tail"]:
+                print("  stderr: " + res["stderr_tail"].strip().replace("\n", "\n          "))
+    finally:
+        if log_f:
+            log_f.close()
+
+    if len(latencies) > 1:
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+        print(f"[REPLAY] commit->final ms: n={len(latencies)} p50={statistics.median(latencies):.0f} "
+              f"p95={p95:.0f} max={latencies[-1]:.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
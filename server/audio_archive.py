@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Per-turn archive of the candidate's PCM16 audio, plus a constant-memory reader.
+
+Writer (used by qwen_asr_realtime_bridge.py when ASR_ARCHIVE_DIR is set):
+  <root>/<session>/turn-0001.wav, turn-0002.wav, ...   one WAV per committed turn
+  <root>/<session>/index.json                          per-turn offsets / durations / times
+
+Audio is appended as it streams; the WAV header and index.json are
+rewritten at every commit (index via tmp + rename), so a crash loses at
+most the turn in progress.
+
+Reader: byte-range and time-range slices via mmap, never loading a whole
+file, so history playback stays constant-memory however long the exam is.
+
+Usage:
+  python3 server/audio_archive.py info <session_dir>
+  python3 server/audio_archive.py read <session_dir> --turn 2 [--from-ms 1000] [--to-ms 4000] [--raw] [--out x.wav|-]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+INDEX_NAME = "index.json"
+WAV_HEADER_BYTES = 44
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+DEFAULT_CHUNK_BYTES = 64 * 1024
+
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(SESSION_ID_RE.match(session_id or ""))
+
+
+def wav_header(data_bytes: int, sample_rate: int, channels: int = 1, bits: int = 16) -> bytes:
+    block_align = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits,
+        b"data", data_bytes,
+    )
+
+
+def _write_json_atomic(path: str, obj) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class TurnArchiver:
+    """
+    Append-only writer: one WAV per turn, a turn ends at each commit.
+    Thread-safe (audio arrives on the stdin thread, finals on the websocket thread).
+    """
+
+    def __init__(self, root: str, session_id: str, sample_rate: int = 16000):
+        if not valid_session_id(session_id):
+            raise ValueError(f"invalid session id: {session_id!r}")
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.dir = os.path.join(root, session_id)
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.dir, INDEX_NAME)
+        self.index = self._load_index()
+        self._file = None
+        self._turn = None  # index entry of the open turn
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("sample_rate") == self.sample_rate:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {"session": self.session_id, "sample_rate": self.sample_rate, "channels": 1,
+                "bits": 16, "created_at": time.time(), "turns": []}
+
+    def append(self, pcm: bytes) -> None:
+        if not pcm:
+            return
+        with self._lock:
+            if self._file is None:
+                self._open_turn()
+            self._file.write(pcm)
+            self._turn["bytes"] += len(pcm)
+
+    def _open_turn(self) -> None:
+        n = len(self.index["turns"]) + 1
+        name = f"turn-{n:04d}.wav"
+        self._file = open(os.path.join(self.dir, name), "wb")
+        self._file.write(wav_header(0, self.sample_rate))
+        self._turn = {
+            "turn": n,
+            "file": name,
+            "data_offset": WAV_HEADER_BYTES,
+            "bytes": 0,
+            "samples": 0,
+            "duration_ms": 0.0,
+            "started_at": time.time(),
+            "committed_at": None,
+            "final_at": None,
+            "text": None,
+        }
+        self.index["turns"].append(self._turn)
+
+    def commit(self):
+        """Close the current turn (called when the client sends `commit`); returns its index entry."""
+        with self._lock:
+            turn = self._turn
+            if turn is None:
+                return None
+            self._finish_file()
+            turn["committed_at"] = time.time()
+            _write_json_atomic(self._index_path, self.index)
+            return dict(turn)
+
+    def on_final(self, text: str) -> None:
+        """Attach the final transcript to the most recent committed turn that has none yet."""
+        with self._lock:
+            for turn in reversed(self.index["turns"]):
+                if turn["committed_at"] is not None and turn["final_at"] is None:
+                    turn["final_at"] = time.time()
+                    turn["text"] = text
+                    _write_json_atomic(self._index_path, self.index)
+                    return
+
+    def close(self) -> None:
+        with self._lock:
+            if self._turn is not None:
+                self._finish_file()
+            _write_json_atomic(self._index_path, self.index)
+
+    def _finish_file(self) -> None:
+        turn = self._turn
+        data = turn["bytes"] - (turn["bytes"] & 1)
+        turn["samples"] = data // 2
+        turn["duration_ms"] = round(turn["samples"] * 1000 / self.sample_rate, 1)
+        self._file.seek(0)
+        self._file.write(wav_header(data, self.sample_rate))
+        self._file.close()
+        self._file = None
+        self._turn = None
+
+
+class ArchiveReader:
+    """mmap-backed range reads over a session directory written by TurnArchiver."""
+
+    def __init__(self, session_dir: str):
+        self.dir = session_dir
+        with open(os.path.join(session_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.sample_rate = int(self.index["sample_rate"])
+        self._turns = {t["turn"]: t for t in self.index["turns"]}
+
+    def turns(self):
+        return list(self.index["turns"])
+
+    def _turn(self, turn: int) -> dict:
+        if turn not in self._turns:
+            raise KeyError(f"no turn {turn}")
+        return self._turns[turn]
+
+    def ms_to_bytes(self, turn: int, start_ms: float = 0.0, end_ms: float = None):
+        """Time range -> sample-aligned PCM byte range [start, end) within the turn's data."""
+        total = self._turn(turn)["samples"] * 2
+        start = min(total, max(0, int(start_ms * self.sample_rate / 1000)) * 2)
+        end = total if end_ms is None else min(total, max(0, int(end_ms * self.sample_rate / 1000)) * 2)
+        return start, max(start, end)
+
+    def iter_bytes(self, turn: int, start: int = 0, end: int = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+        """Yield PCM slices of at most chunk_bytes; only the touched pages are ever resident."""
+        info = self._turn(turn)
+        total = info["samples"] * 2
+        end = total if end is None else min(end, total)
+        start = max(0, start)
+        if start >= end:
+            return
+        with open(os.path.join(self.dir, info["file"]), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                base = info["data_offset"]
+                pos = start
+                while pos < end:
+                    nxt = min(end, pos + chunk_bytes)
+                    yield mm[base + pos:base + nxt]
+                    pos = nxt
+
+    def read_bytes(self, turn: int, start: int = 0, end: int = None) -> bytes:
+        return b"".join(self.iter_bytes(turn, start, end))
+
+    def iter_ms(self, turn: int, start_ms: float = 0.0, end_ms: float = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+        start, end = self.ms_to_bytes(turn, start_ms, end_ms)
+        return self.iter_bytes(turn, start, end, chunk_bytes)
+
+    def read_ms(self, turn: int, start_ms: float = 0.0, end_ms: float = None) -> bytes:
+        return b"".join(self.iter_ms(turn, start_ms, end_ms))
+
+
+def _cmd_info(args) -> int:
+    reader = ArchiveReader(args.session_dir)
+    print(json.dumps(reader.index, ensure_ascii=False, indent=2))
+    return 0
+
+
+def _cmd_read(args) -> int:
+    reader = ArchiveReader(args.session_dir)
+    start, end = reader.ms_to_bytes(args.turn, args.from_ms, args.to_ms)
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        if not args.raw:
+            out.write(wav_header(end - start, reader.sample_rate))
+        for chunk in reader.iter_bytes(args.turn, start, end):
+            out.write(chunk)
+        out.flush()
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Candidate audio archive: inspect / range-read turns")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_info = sub.add_parser("info", help="Print the session index")
+    p_info.add_argument("session_dir")
+    p_info.set_defaults(fn=_cmd_info)
+
+    p_read = sub.add_parser("read", help="Write a time slice of one turn as WAV (or raw PCM)")
+    p_read.add_argument("session_dir")
+    p_read.add_argument("--turn", type=int, required=True)
+    p_read.add_argument("--from-ms", type=float, default=0.0)
+    p_read.add_argument("--to-ms", type=float, default=None)
+    p_read.add_argument("--raw", action="store_true", help="Raw PCM16 without WAV header")
+    p_read.add_argument("--out", default="-")
+    p_read.set_defaults(fn=_cmd_read)
+
+    args = parser.parse_args()
+    try:
+        return args.fn(args)
+    except (OSError, KeyError, ValueError) as e:
+        sys.stderr.write(f"[ERROR] {e}\n")
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Quality / size / CPU benchmark for the IMA-ADPCM TTS downlink.
+
+Uses a synthetic speech-like signal (voiced harmonics with a moving pitch,
+syllable-rate envelope, noise bursts and pauses) at 24 kHz, or a real
+recording via --wav (16-bit mono).
+
+Usage:
+  python3 server/bench_adpcm.py [--seconds 10] [--chunk-ms 100] [--wav examiner.wav]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ima_adpcm  # noqa: E402
+
+SAMPLE_RATE = 24000
+
+
+def synth_speech(seconds: float, sr: int = SAMPLE_RATE, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.7 * t) + 15 * np.sin(2 * np.pi * 2.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum((0.6 / k) * np.sin(k * phase) for k in range(1, 16))
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 0.7  # ~4 syllables/s
+    pauses = (np.sin(2 * np.pi * 0.25 * t) > -0.8).astype(np.float64)
+    noise = rng.normal(0, 0.15, t.shape) * (np.sin(2 * np.pi * 1.3 * t) > 0.85)
+    x = (voiced * envelope + noise) * pauses
+    return np.clip(x / np.max(np.abs(x)) * 0.7 * 32767, -32768, 32767).astype(np.int16)
+
+
+def load_wav(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise SystemExit("--wav must be 16-bit mono")
+        return np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+
+
+def snr_db(ref: np.ndarray, test: np.ndarray) -> float:
+    ref = ref.astype(np.float64)
+    err = ref - test.astype(np.float64)
+    return 10 * np.log10(np.sum(ref ** 2) / max(np.sum(err ** 2), 1e-9))
+
+
+def seg_snr_db(ref: np.ndarray, test: np.ndarray, frame: int = 480) -> float:
+    n = (len(ref) // frame) * frame
+    r = ref[:n].astype(np.float64).reshape(-1, frame)
+    e = r - test[:n].astype(np.float64).reshape(-1, frame)
+    pr, pe = np.sum(r ** 2, axis=1), np.sum(e ** 2, axis=1)
+    active = pr > 1e4 * frame  # skip silent frames
+    seg = 10 * np.log10(pr[active] / np.maximum(pe[active], 1e-9))
+    return float(np.mean(np.clip(seg, -10, 35))) if seg.size else float("nan")
+
+
+def encode_scalar(pcm: np.ndarray, block_samples: int) -> bytes:
+    """Plain-Python reference with the same block layout, for CPU comparison and bit-exactness."""
+    steps = ima_adpcm.STEP_TABLE.tolist()
+    index_table = ima_adpcm.INDEX_TABLE.tolist()
+    out = bytearray()
+    n = len(pcm)
+    padded = np.concatenate([pcm, np.full((-n) % block_samples, pcm[-1], dtype=pcm.dtype)])
+    init = ima_adpcm._initial_index(padded.astype(np.int32).reshape(-1, block_samples)).tolist()
+    for b, start in enumerate(range(0, len(padded), block_samples)):
+        block = padded[start:start + block_samples].tolist()
+        pred, idx = block[0], init[b]
+        out += int(pred).to_bytes(2, "little", signed=True) + bytes([idx, 0])
+        nibbles = []
+        for s in block[1:]:
+            step = steps[idx]
+            diff = s - pred
+            code = 8 if diff < 0 else 0
+            diff = abs(diff)
+            vpdiff = step >> 3
+            if diff >= step:
+                code |= 4
+                diff -= step
+                vpdiff += step
+            if diff >= step >> 1:
+                code |= 2
+                diff -= step >> 1
+                vpdiff += step >> 1
+            if diff >= step >> 2:
+                code |= 1
+                vpdiff += step >> 2
+            pred = max(-32768, min(32767, pred - vpdiff if code & 8 else pred + vpdiff))
+            idx = max(0, min(88, idx + index_table[code]))
+            nibbles.append(code)
+        out += bytes(nibbles[i] | (nibbles[i + 1] << 4) for i in range(0, len(nibbles), 2))
+    return bytes(out[: ima_adpcm.encoded_size(n, block_samples)])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="IMA-ADPCM quality/size/CPU benchmark")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Size of each TTS audio delta")
+    parser.add_argument("--wav", default="")
+    args = parser.parse_args()
+
+    pcm = load_wav(args.wav) if args.wav else synth_speech(args.seconds)
+    audio_s = len(pcm) / SAMPLE_RATE
+    chunk = int(SAMPLE_RATE * args.chunk_ms / 1000)
+    chunks = [pcm[i:i + chunk] for i in range(0, len(pcm), chunk)]
+    pcm_b64 = sum(len(base64.b64encode(c.tobytes())) for c in chunks)
+
+    print(f"audio: {audio_s:.1f}s @ {SAMPLE_RATE} Hz, {len(chunks)} chunks of {args.chunk_ms} ms")
+    print(f"{'block':>6} {'bytes':>9} {'ratio':>6} {'b64 KB/s':>9} {'SNR dB':>7} {'segSNR':>7} "
+          f"{'enc ms/s':>9} {'scalar ms/s':>11} {'exact':>6}")
+    print(f"{'pcm':>6} {len(pcm) * 2:>9} {1.0:>6.2f} {pcm_b64 / audio_s / 1024:>9.1f}")
+    for block in (65, 129, 257, 505):
+        t0 = time.perf_counter()
+        enc = [ima_adpcm.encode(c, block) for c in chunks]
+        enc_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        ref = [encode_scalar(c, block) for c in chunks]
+        scalar_ms = (time.perf_counter() - t0) * 1000
+
+        dec = np.concatenate([ima_adpcm.decode(e, len(c), block) for e, c in zip(enc, chunks)])
+        size = sum(len(e) for e in enc)
+        b64 = sum(len(base64.b64encode(e)) for e in enc)
+        print(f"{block:>6} {size:>9} {len(pcm) * 2 / size:>6.2f} {b64 / audio_s / 1024:>9.1f} "
+              f"{snr_db(pcm, dec):>7.1f} {seg_snr_db(pcm, dec):>7.1f} {enc_ms / audio_s:>9.2f} "
+              f"{scalar_ms / audio_s:>11.2f} {str(enc == ref):>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
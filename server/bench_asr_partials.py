@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Downlink bytes of the ASR bridge for one long Part 2 answer.
+
+Replays a synthetic upstream event stream through BridgeCallback.on_message
+(no network): a 2-minute answer at ~130 wpm, one
+`conversation.item.input_audio_transcription.text` event every ~250 ms whose
+`stash` is the whole answer so far, with the last word occasionally revised.
+Compares the old behaviour (full stash + raw `asr` envelope) with the delta
+mode, and checks that the deltas rebuild exactly the same text as the
+frontend does.
+
+Usage:
+  python3 server/bench_asr_partials.py [--seconds 120] [--wpm 130] [--resync-every 20]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from event_writer import EventWriter  # noqa: E402
+from qwen_asr_realtime_bridge import BridgeCallback  # noqa: E402
+
+WORDS = (
+    "i would like to talk about a trip i took with my family to the coast last summer it was "
+    "one of the most memorable experiences because we had not travelled together for years "
+    "and the weather was absolutely perfect we stayed in a small guesthouse near the harbour "
+    "every morning we walked along the beach and watched the fishing boats come back in "
+    "what made it special was that my grandparents joined us and told stories about the town"
+).split()
+
+
+def synth_events(seconds: float, wpm: float, interval_ms: int, seed: int = 3):
+    rng = random.Random(seed)
+    item_id = f"item_{uuid.UUID(int=rng.getrandbits(128)).hex[:24]}"
+    words = []
+    t_ms = 0
+    next_word_ms = 0.0
+    events = []
+    while t_ms < seconds * 1000:
+        while next_word_ms <= t_ms:
+            words.append(WORDS[len(words) % len(WORDS)])
+            next_word_ms += 60000 / wpm * rng.uniform(0.6, 1.4)
+        shown = list(words)
+        # 末尾词还没定稿：有时是前缀，有时是错词
+        r = rng.random()
+        if r < 0.3 and len(shown[-1]) > 3:
+            shown[-1] = shown[-1][: rng.randint(2, len(shown[-1]) - 1)]
+        elif r < 0.4:
+            shown[-1] = rng.choice(WORDS)
+        events.append({
+            "event_id": f"event_{uuid.UUID(int=rng.getrandbits(128)).hex[:24]}",
+            "type": "conversation.item.input_audio_transcription.text",
+            "item_id": item_id,
+            "content_index": 0,
+            "language": "en",
+            "emotion": "neutral",
+            "text": "",
+            "stash": " ".join(shown),
+        })
+        t_ms += interval_ms
+    events.append({
+        "event_id": "event_final",
+        "type": "conversation.item.input_audio_transcription.completed",
+        "item_id": item_id,
+        "content_index": 0,
+        "language": "en",
+        "emotion": "neutral",
+        "transcript": " ".join(words),
+    })
+    return events
+
+
+def run(events, partial_mode: str, forward_raw: bool, resync_every: int):
+    cb = BridgeCallback(lambda: None, partial_mode=partial_mode, forward_raw=forward_raw)
+    cb.partials.resync_every = resync_every
+    out = io.BytesIO()
+    cb.out = EventWriter(out, counters=True)
+    with contextlib.redirect_stderr(io.StringIO()):
+        for evt in events:
+            cb.on_message(None, json.dumps(evt))
+    return cb.out.bytes_out, out.getvalue().decode("utf-8").splitlines()
+
+
+def rebuild(lines):
+    """Mirror of the frontend: apply partial / partial_delta, return every reconstructed text."""
+    text, seq, seen = "", 0, []
+    for line in lines:
+        msg = json.loads(line)
+        if msg.get("event") == "partial":
+            text, seq = msg["text"], msg.get("seq", seq)
+        elif msg.get("event") == "partial_delta":
+            if msg["seq"] != seq + 1:
+                raise AssertionError(f"seq gap {seq} -> {msg['seq']}")
+            text, seq = text[: msg["keep"]] + msg["text"], msg["seq"]
+        else:
+            continue
+        seen.append(text)
+    return seen
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ASR bridge partial downlink bytes per Part 2 answer")
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--wpm", type=float, default=130)
+    parser.add_argument("--interval-ms", type=int, default=250)
+    parser.add_argument("--resync-every", type=int, default=20)
+    args = parser.parse_args()
+
+    events = synth_events(args.seconds, args.wpm, args.interval_ms)
+    stashes = [e["stash"] for e in events if "stash" in e]
+    print(f"answer: {args.seconds:.0f}s, {len(stashes)} upstream partials, final {len(stashes[-1].split())} words")
+    print(f"{'mode':28} {'frames':>7} {'total KB':>9} {'partial KB':>11} {'raw asr KB':>11} {'B/partial':>10}")
+
+    modes = [
+        ("full + raw asr (before)", "full", True),
+        ("full, raw off", "full", False),
+        ("delta + raw asr", "delta", True),
+        ("delta, raw off (after)", "delta", False),
+    ]
+    for name, mode, raw in modes:
+        bytes_out, lines = run(events, mode, raw, args.resync_every)
+        partial = bytes_out.get("partial", 0) + bytes_out.get("partial_delta", 0)
+        total = sum(bytes_out.values())
+        print(f"{name:28} {len(lines):7d} {total / 1024:9.1f} {partial / 1024:11.1f} "
+              f"{bytes_out.get('asr', 0) / 1024:11.1f} {partial / max(1, len(stashes)):10.1f}")
+        if mode == "delta":
+            dedup = [s for i, s in enumerate(stashes) if i == 0 or s != stashes[i - 1]]
+            if rebuild(lines) != dedup:
+                print("  !! delta reconstruction mismatch")
+                return 1
+    print("delta reconstruction: exact")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Stop-to-final latency of a long Part 2 answer, one commit vs segmented mode.
+
+A synthetic answer (--seconds of speech-like phrases: voiced "words" with
+short gaps, phrase pauses of 0.25-1.4 s, a quiet noise floor) is replayed
+into qwen_asr_realtime_bridge.py with server/asr_replay.py against the
+stand-in. The stand-in's final latency is --asr-final-ms plus
+--asr-final-ms-per-s for every second of committed audio, and committed
+segments are recognized one after another. That is a model of a
+recognizer that finishes a commit's audio after it arrives, not a
+measurement of the real service: check the real numbers with asr_replay
+on a recording.
+
+For each variant (segment off / on) and run: the latency from the final
+`commit` (the candidate's stop) to the `final`, the number of auto-commits
+and segment events, and the words in the final (they should match between
+variants, up to one word of rounding per segment).
+
+Usage:
+  python3 server/bench_asr_segments.py [--seconds 120] [--runs 3] [--speed 4] [--final-ms-per-s 60]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+
+from asr_replay import TARGET_RATE, replay  # noqa: E402
+from load_exam import _pct, _wait_port  # noqa: E402
+
+
+def synth_answer(seconds: float, seed: int) -> bytes:
+    """PCM16 16 kHz: phrases of voiced words separated by pauses, over -62 dBFS noise."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * TARGET_RATE)
+    out = rng.normal(0, 10 ** (-62 / 20), n).astype(np.float32)
+    pos = int(0.5 * TARGET_RATE)
+    while pos < n:
+        phrase_end = pos + int(rng.uniform(1.5, 5.0) * TARGET_RATE)
+        while pos < min(phrase_end, n):
+            w = int(rng.uniform(0.2, 0.45) * TARGET_RATE)
+            t = np.arange(min(w, n - pos)) / TARGET_RATE
+            f0 = rng.uniform(110, 220)
+            tone = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+            env = np.abs(np.sin(np.pi * np.arange(len(t)) / max(1, len(t) - 1))) ** 0.5
+            out[pos:pos + len(t)] += (10 ** (-20 / 20)) * env * tone / 2.3
+            pos += w + int(rng.uniform(0.04, 0.15) * TARGET_RATE)
+        pos += int(rng.uniform(0.25, 1.4) * TARGET_RATE)
+    return (np.clip(out, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Long-answer stop-to-final latency, segmented vs single commit")
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--speed", type=float, default=4.0, help="Replay speed (audio seconds per wall second)")
+    parser.add_argument("--final-ms", type=int, default=250, help="Stand-in base final latency")
+    parser.add_argument("--final-ms-per-s", type=float, default=60.0, help="Stand-in final latency per committed second")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--port", type=int, default=18095)
+    args = parser.parse_args()
+
+    standin = subprocess.Popen([
+        sys.executable, os.path.join(SERVER_DIR, "dashscope_standin.py"), "--port", str(args.port),
+        "--asr-final-ms", str(args.final_ms), "--asr-final-ms-per-s", str(args.final_ms_per_s),
+    ], stderr=subprocess.DEVNULL)
+    if not _wait_port("127.0.0.1", args.port):
+        standin.kill()
+        raise RuntimeError(f"stand-in on :{args.port} did not start")
+    env = dict(os.environ)
+    env.update({
+        "DASHSCOPE_API_KEY": env.get("DASHSCOPE_API_KEY") or "standin",
+        "DASHSCOPE_ASR_WS_URL": f"ws://127.0.0.1:{args.port}/api-ws/v1/realtime",
+        "ASR_ACOUSTIC": "0",
+    })
+
+    print(f"answer={args.seconds:.0f}s speed={args.speed}x runs={args.runs} "
+          f"stand-in final={args.final_ms}ms + {args.final_ms_per_s:.0f}ms/s")
+    print(f"{'variant':12} {'run':>3} {'stop->final ms':>15} {'auto-commits':>13} {'segments':>9} {'words':>6}")
+    try:
+        for label, config in (("single", None), ("segmented", {"segment": True})):
+            lat = []
+            for run in range(1, args.runs + 1):
+                pcm = synth_answer(args.seconds, args.seed + run)
+                res = replay(pcm, "bridge", args.speed, 85, [], 30.0, "en", env, config=config)
+                events = [e["msg"] for e in res["events"] if e["dir"] == "in"]
+                final = next((e for e in events if e.get("event") == "final"), None)
+                ms = res["commits"][-1]["final_ms"] if res["commits"] else None
+                m = re.search(r"auto_commits=(\d+)", res["stderr_tail"])
+                if ms is not None:
+                    lat.append(ms)
+                print(f"{label:12} {run:3d} {'timeout' if ms is None else f'{ms:.0f}':>15} "
+                      f"{m.group(1) if m else 0:>13} {sum(1 for e in events if e.get('event') == 'segment'):9d} "
+                      f"{len(final['text'].split()) if final else 0:6d}")
+                sys.stdout.flush()
+            if lat:
+                print(f"{label:12} p50 {_pct(lat, 50):.0f}ms max {max(lat):.0f}ms")
+    finally:
+        standin.kill()
+        standin.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Cost of writing downlink events: json.dumps + text write + flush per event
+(the old code in every script) against event_writer.EventWriter.
+
+Two parts:
+  encode   events/s for the event shapes the scripts emit, json vs orjson
+  bridge   a 2-minute Part 2 answer (bench_asr_partials.synth_events) fed
+           through BridgeCallback.on_message with the raw `asr` envelope on,
+           writing into a real pipe drained by a reader thread like Node's.
+           Reports CPU per upstream message and write syscalls.
+
+Usage:
+  python3 server/bench_event_writer.py [--seconds 120] [--repeat 5]
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import event_writer  # noqa: E402
+from bench_asr_partials import synth_events  # noqa: E402
+from event_writer import EventWriter, frame  # noqa: E402
+from qwen_asr_realtime_bridge import BridgeCallback  # noqa: E402
+
+SHAPES = {
+    "speech_start": {"event": "speech_start"},
+    "partial": {"event": "partial", "text": "well I grew up in a small town near the coast and"},
+    "asr envelope": {"event": "asr", "message": {
+        "event_id": "event_4f1c2b9d8e7a6f5c4b3a2d1e", "type": "conversation.item.input_audio_transcription.text",
+        "item_id": "item_9a8b7c6d5e4f3a2b1c0d9e8f", "content_index": 0, "language": "en", "emotion": "neutral",
+        "text": "", "stash": "well I grew up in a small town near the coast and"}},
+    "tts audio 85ms": {"event": "audio", "b64": base64.b64encode(bytes(4080)).decode("ascii"),
+                       "samples": 2040, "end_ms": 1530.0},
+}
+
+
+class _CountingRaw(io.RawIOBase):
+    """Raw pipe writer that counts write syscalls."""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.syscalls = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.syscalls += 1
+        return os.write(self.fd, b)
+
+
+class _LegacyOut:
+    """The pre-EventWriter behaviour: json.dumps + "\\n", text write, flush, per event."""
+
+    def __init__(self, stream):
+        self._out = stream
+        self._lock = threading.Lock()
+        self.bytes_out = {}
+        self.events = self.writes = 0
+
+    def emit(self, obj) -> None:
+        if isinstance(obj, bytes):
+            obj = json.loads(obj)
+        line = json.dumps(obj) + "\n"
+        name = obj.get("event", "")
+        with self._lock:
+            self.bytes_out[name] = self.bytes_out.get(name, 0) + len(line.encode("utf-8"))
+            self._out.write(line)
+            self._out.flush()
+            self.events += 1
+            self.writes += 1
+
+    def batch(self):
+        return contextlib.nullcontext()
+
+
+def bench_encode(n: int) -> None:
+    backends = [("stdlib", None)] + ([("orjson", event_writer.orjson)] if event_writer.orjson else [])
+    print(f"{'encode':16} {'json.dumps':>12} " + " ".join(f"{name:>12}" for name, _ in backends) + "   (k events/s)")
+    for shape, obj in SHAPES.items():
+        t0 = time.perf_counter()
+        for _ in range(n):
+            (json.dumps(obj) + "\n").encode("utf-8")
+        row = [n / (time.perf_counter() - t0)]
+        for _, backend in backends:
+            saved, event_writer.orjson = event_writer.orjson, backend
+            try:
+                t0 = time.perf_counter()
+                for _ in range(n):
+                    event_writer.encode(obj)
+                row.append(n / (time.perf_counter() - t0))
+            finally:
+                event_writer.orjson = saved
+        print(f"{shape:16} " + " ".join(f"{v / 1000:12.1f}" for v in row))
+    const = frame(SHAPES["speech_start"])
+    print(f"{'':16} constant frames skip encoding entirely ({len(const)} bytes, built once)")
+
+
+def bench_bridge(events, repeat: int) -> dict:
+    messages = [json.dumps(e) for e in events]
+    results = {}
+    for label, backend, legacy in (
+        ("json.dumps + flush per event (before)", None, True),
+        ("EventWriter, stdlib json", None, False),
+        ("EventWriter, orjson", event_writer.orjson, False),
+    ):
+        if label.endswith("orjson") and backend is None:
+            continue  # orjson not installed
+        best_cpu, syscalls, nbytes = None, 0, 0
+        for _ in range(repeat):
+            r, w = os.pipe()
+            drained = []
+
+            def drain():
+                while True:
+                    chunk = os.read(r, 65536)
+                    if not chunk:
+                        break
+                    drained.append(len(chunk))
+
+            reader = threading.Thread(target=drain, daemon=True)
+            reader.start()
+            raw = _CountingRaw(w)
+            buffered = io.BufferedWriter(raw, buffer_size=65536)
+            cb = BridgeCallback(lambda: None, partial_mode="full", forward_raw=True)
+            if legacy:
+                cb.out = _LegacyOut(io.TextIOWrapper(buffered, encoding="utf-8", write_through=False))
+            else:
+                cb.out = EventWriter(buffered, counters=True)
+            saved, event_writer.orjson = event_writer.orjson, backend
+            try:
+                with contextlib.redirect_stderr(io.StringIO()):
+                    t0 = time.process_time()
+                    for m in messages:
+                        cb.on_message(None, m)
+                    cpu = time.process_time() - t0
+            finally:
+                event_writer.orjson = saved
+            os.close(w)
+            reader.join()
+            os.close(r)
+            if best_cpu is None or cpu < best_cpu:
+                best_cpu = cpu
+            syscalls, nbytes = raw.syscalls, sum(drained)
+        results[label] = (best_cpu, syscalls, nbytes, cb.out.events)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Downlink event writer microbenchmark")
+    parser.add_argument("--seconds", type=float, default=120, help="Length of the synthetic Part 2 answer")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant (best CPU time is reported)")
+    parser.add_argument("--encode-n", type=int, default=50000, help="Encodes per shape")
+    args = parser.parse_args()
+
+    print(f"backend available: {event_writer.BACKEND}")
+    bench_encode(args.encode_n)
+    print()
+
+    events = synth_events(args.seconds, 130, 250)
+    # 每 8 条 partial 插一对 speech_stop / speech_start，接近 VAD 模式下的真实节奏
+    mixed = []
+    for i, e in enumerate(events):
+        if i and i % 8 == 0:
+            mixed.append({"type": "input_audio_buffer.speech_stopped"})
+            mixed.append({"type": "input_audio_buffer.speech_started"})
+        mixed.append(e)
+    results = bench_bridge(mixed, args.repeat)
+    print(f"bridge: {len(mixed)} upstream messages ({args.seconds:.0f}s answer, raw asr on)")
+    print(f"{'variant':40} {'cpu ms':>8} {'us/msg':>8} {'events':>7} {'syscalls':>9} {'KB out':>8}")
+    base = None
+    for label, (cpu, syscalls, nbytes, n_events) in results.items():
+        base = base or cpu
+        print(f"{label:40} {cpu * 1000:8.1f} {cpu * 1e6 / len(mixed):8.1f} {n_events:7d} {syscalls:9d} "
+              f"{nbytes / 1024:8.1f}" + ("" if cpu == base else f"   x{base / cpu:.2f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tail latency of the examiner LLM stream and the TTS session, hedging off vs on.
+
+Two stand-ins (server/dashscope_standin.py) play the primary and the
+alternate endpoint; both stall --stall-rate of their first chunks for
+--stall-ms. For each variant the stand-ins are restarted with the same seeds
+and --n requests per service run back to back through the real scripts:
+  llm   qwen_llm_examiner_stream.py, spawn -> first {"type": "delta"}
+  tts   qwen_tts_stream.py, spawn -> first {"event": "audio"}
+The "on" variant sets HEDGE_REQUESTS=1 with a fresh state file, so the
+threshold starts at HEDGE_DEFAULT_MS and adapts to the p95 as samples come in.
+
+Reports p50 / p95 / p99 / max time to first byte, the share of requests
+that were hedged.
+
+Usage:
+  python3 server/bench_hedging.py [--n 100] [--stall-rate 0.05] [--stall-ms 5000] [--budget-per-min 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+
+from load_exam import _pct, _run_lines, _wait_port  # noqa: E402
+
+TTS_TEXT = "Thank you. Let's talk about your hometown. What do you like most about the place where you grew up?"
+EXAMINER_PAYLOAD = json.dumps({
+    "model": "qwen-plus", "part": 1, "questionCount": 1,
+    "messages": [{"role": "user", "text": "I'm from a small town near the coast."}],
+}).encode("utf-8")
+
+
+def _start_standins(args):
+    procs = []
+    for i, port in enumerate((args.port, args.port + 1)):
+        procs.append(subprocess.Popen([
+            sys.executable, os.path.join(SERVER_DIR, "dashscope_standin.py"), "--port", str(port),
+            "--stall-rate", str(args.stall_rate), "--stall-ms", str(args.stall_ms), "--seed", str(args.seed + i),
+        ], stderr=subprocess.DEVNULL))
+    for port in (args.port, args.port + 1):
+        if not _wait_port("127.0.0.1", port):
+            for p in procs:
+                p.kill()
+            raise RuntimeError(f"stand-in on :{port} did not start")
+    return procs
+
+
+def _first_byte(lines, match):
+    first = next((t for t, o in lines if match(o)), None)
+    hedged = any(o.get("type") == "hedge" or o.get("event") == "hedge" for _, o in lines)
+    return first, hedged
+
+
+def run_variant(args, hedging: bool) -> dict:
+    procs = _start_standins(args)
+    state = tempfile.NamedTemporaryFile(prefix="hedge_state_", suffix=".json", delete=False)
+    state.close()
+    os.unlink(state.name)
+    primary = f"http://127.0.0.1:{args.port}"
+    alternate = f"http://127.0.0.1:{args.port + 1}"
+    env = dict(os.environ)
+    env.update({
+        "DASHSCOPE_API_KEY": env.get("DASHSCOPE_API_KEY") or "standin",
+        "DASHSCOPE_BASE_HTTP_API_URL": primary + "/api/v1",
+        "DASHSCOPE_TTS_WS_URL": primary.replace("http", "ws", 1) + "/api-ws/v1/realtime",
+        "HEDGE_REQUESTS": "1" if hedging else "0",
+        "HEDGE_STATE_FILE": state.name,
+        "HEDGE_BUDGET_PER_MIN": str(args.budget_per_min),
+        "HEDGE_LLM_BASE_URL": alternate + "/api/v1",
+        "HEDGE_TTS_WS_URL": alternate.replace("http", "ws", 1) + "/api-ws/v1/realtime",
+    })
+    out = {}
+    try:
+        for service in ("llm", "tts"):
+            times, hedged, errors = [], 0, 0
+            for _ in range(args.n):
+                if service == "llm":
+                    lines, code, _ = _run_lines([sys.executable, "server/qwen_llm_examiner_stream.py"], EXAMINER_PAYLOAD, env)
+                    first, was_hedged = _first_byte(lines, lambda o: o.get("type") == "delta")
+                else:
+                    lines, code, _ = _run_lines([sys.executable, "server/qwen_tts_stream.py", "--text", TTS_TEXT], None, env)
+                    first, was_hedged = _first_byte(lines, lambda o: o.get("event") == "audio")
+                if code != 0 or first is None:
+                    errors += 1
+                    continue
+                times.append(first)
+                hedged += was_hedged
+            out[service] = {
+                "n": len(times), "errors": errors, "hedged": hedged,
+                "p50": _pct(times, 50), "p95": _pct(times, 95), "p99": _pct(times, 99), "max": max(times, default=float("nan")),
+            }
+    finally:
+        for p in procs:
+            p.kill()
+            p.wait()
+        try:
+            os.unlink(state.name)
+        except OSError:
+            pass
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Hedged LLM / TTS requests against stalling stand-ins")
+    parser.add_argument("--n", type=int, default=100, help="Requests per service and variant")
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-ms", type=int, default=5000)
+    parser.add_argument("--budget-per-min", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=18085, help="Primary stand-in port (alternate: port + 1)")
+    args = parser.parse_args()
+
+    print(f"n={args.n}/service stall_rate={args.stall_rate} stall_ms={args.stall_ms} budget={args.budget_per_min}/min")
+    print(f"{'variant':12} {'svc':4} {'n':>4} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'hedged':>7}")
+    for label, hedging in (("hedging off", False), ("hedging on", True)):
+        res = run_variant(args, hedging)
+        for service, r in res.items():
+            print(f"{label:12} {service:4} {r['n']:4d} {r['errors']:4d} {r['p50']:8.0f} {r['p95']:8.0f} {r['p99']:8.0f} "
+                  f"{r['max']:8.0f} {r['hedged'] / max(1, r['n']) * 100:6.1f}%")
+            sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Exam history store (server/session_store.py) at --sessions scale.
+
+Writes a synthetic spool (--sessions sessions spread over --users users,
+--turns turns each plus a scored report for 80% of them), then:
+  spool     cost of one spool() call, the only store work on a script's path
+  ingest    records/s applied per-record (--batch 1, first --per-record-sample
+            records) and batched (--batch, the whole spool)
+  list      first page and the page after --deep-pages pages, by date and by score
+  get       one session with its turns and report
+  search    FTS5 over transcripts, one user
+plus the query plans and the DB size. Timings are p50 / p95 over --reps runs.
+
+Usage:
+  python3 server/bench_session_store.py [--sessions 100000] [--turns 10] [--users 100] [--batch 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+
+import session_store  # noqa: E402
+from load_exam import _pct  # noqa: E402
+
+WORDS = (
+    "I think my hometown is quite famous for its food and the people are really friendly there "
+    "when I was a child we used to go to the park every weekend with my grandparents "
+    "photography travelling reading cooking music football technology environment education "
+    "actually honestly probably definitely however although because especially "
+    "city village river mountain market festival museum library university company"
+).split()
+QUESTIONS = [
+    "Where is your hometown?", "Do you work or are you a student?", "What do you do in your free time?",
+    "Describe a place you would like to visit.", "Why do people enjoy travelling?", "How has technology changed education?",
+]
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def write_spool(path, args):
+    rng = random.Random(args.seed)
+    t0 = time.time() - args.sessions * 600  # 每 10 分钟一场，倒推
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(args.sessions):
+            sid = f"exam_{i:07d}"
+            ts = t0 + i * 600
+            recs = [{"kind": "session", "session": sid, "ts": ts, "user": f"u{i % args.users}", "examiner": "ex1", "mode": "full"}]
+            for t in range(args.turns):
+                part = min(3, 1 + t * 3 // args.turns)
+                if t % 2 == 0:
+                    recs.append({"kind": "turn", "session": sid, "ts": ts + t * 30, "role": "examiner", "part": part, "text": rng.choice(QUESTIONS)})
+                else:
+                    recs.append({"kind": "turn", "session": sid, "ts": ts + t * 30, "role": "user", "part": part, "text": _sentence(rng, rng.randint(15, 60))})
+            if rng.random() < 0.8:
+                score = rng.randint(8, 18) / 2
+                recs.append({"kind": "report", "session": sid, "ts": ts + 500, "report": {
+                    "reportVersion": "v1", "score": score, "fluency": score, "vocabulary": score, "grammar": score,
+                    "pronunciation": score, "strengths": ["Clear answers."], "improvements": ["Use more linking words."],
+                    "comment": "Synthetic report."}})
+            for r in recs:
+                f.write(session_store.json.dumps(r, ensure_ascii=False) + "\n")
+            n += len(recs)
+    return n
+
+
+def _time(fn, reps):
+    times = []
+    for _ in range(reps):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return _pct(times, 50), _pct(times, 95)
+
+
+def _ingest(db_path, spool_path, batch, max_records=None):
+    store = session_store.SessionStore(db_path)
+    pos, total = 0, 0
+    t = time.perf_counter()
+    while max_records is None or total < max_records:
+        n = batch if max_records is None else min(batch, max_records - total)
+        records, pos = session_store._read_lines(spool_path, pos, n)
+        if not records:
+            break
+        total += store.apply(records, {"spool_offset": pos})
+    return total, time.perf_counter() - t
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Exam history store benchmark")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--per-record-sample", type=int, default=20000)
+    parser.add_argument("--deep-pages", type=int, default=40)
+    parser.add_argument("--reps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ielts_bench_")
+    spool_path = os.path.join(tmp, "spool.jsonl")
+    db_path = os.path.join(tmp, "ielts.db")
+
+    t = time.perf_counter()
+    n = write_spool(spool_path, args)
+    print(f"spool: {n} records for {args.sessions} sessions x {args.turns} turns, "
+          f"{os.path.getsize(spool_path) / 1e6:.1f} MB, written in {time.perf_counter() - t:.1f}s")
+
+    os.environ.update({"IELTS_STORE": "1", "IELTS_SPOOL": os.path.join(tmp, "calls.jsonl")})
+    rec = {"kind": "turn", "session": "exam_x", "role": "user", "part": 1, "text": _sentence(random.Random(1), 40)}
+    p50, p95 = _time(lambda: session_store.spool(dict(rec)), 2000)
+    print(f"spool() call: p50 {p50 * 1000:.0f}us p95 {p95 * 1000:.0f}us")
+
+    per_db = os.path.join(tmp, "per_record.db")
+    done, secs = _ingest(per_db, spool_path, 1, args.per_record_sample)
+    print(f"ingest per-record: {done} records in {secs:.1f}s = {done / secs:,.0f} rec/s")
+    done, secs = _ingest(db_path, spool_path, args.batch)
+    print(f"ingest batch={args.batch}: {done} records in {secs:.1f}s = {done / secs:,.0f} rec/s")
+
+    store = session_store.SessionStore(db_path, readonly=True)
+    db = store.db
+    size = sum(os.path.getsize(db_path + s) for s in ("", "-wal") if os.path.exists(db_path + s))
+    print(f"db: {size / 1e6:.1f} MB, {db.execute('SELECT count(*) FROM ielts_sessions').fetchone()[0]} sessions, "
+          f"{db.execute('SELECT count(*) FROM ielts_turns').fetchone()[0]} turns")
+
+    user = "u42"
+    print(f"queries for user {user} ({args.sessions // args.users} sessions), p50 / p95 over {args.reps} runs:")
+    for sort in ("date", "score"):
+        cursor = ""
+        for _ in range(args.deep_pages):
+            cursor = store.list_sessions(user, sort, 20, cursor)["next_cursor"] or ""
+        first = _time(lambda: store.list_sessions(user, sort, 20), args.reps)
+        deep = _time(lambda: store.list_sessions(user, sort, 20, cursor), args.reps)
+        print(f"  list by {sort:5}: first page {first[0]:.2f} / {first[1]:.2f} ms, "
+              f"page {args.deep_pages + 1} {deep[0]:.2f} / {deep[1]:.2f} ms")
+    rng = random.Random(args.seed)
+    ids = [f"exam_{rng.randrange(args.sessions):07d}" for _ in range(args.reps)]
+    it = iter(ids * 2)
+    p = _time(lambda: store.get_session(next(it)), args.reps)
+    print(f"  get session   : {p[0]:.2f} / {p[1]:.2f} ms")
+    for q in ("photography", "museum festival", "grandparents NOT football"):
+        p = _time(lambda: store.search(q, user, 20), max(10, args.reps // 10))
+        print(f"  search {q!r:28}: {p[0]:.2f} / {p[1]:.2f} ms")
+
+    print("plans:")
+    for label, sql, qargs in (
+        ("by date", "SELECT id FROM ielts_sessions WHERE user_id = ? AND (started_at, id) < (?, ?) "
+                    "ORDER BY started_at DESC, id DESC LIMIT 20", (user, 1e12, "")),
+        ("by score", "SELECT id FROM ielts_sessions WHERE user_id = ? AND overall_score IS NOT NULL AND "
+                     "(overall_score, started_at, id) < (?, ?, ?) ORDER BY overall_score DESC, started_at DESC, id DESC LIMIT 20",
+         (user, 10.0, 1e12, "")),
+    ):
+        plan = "; ".join(r[3] for r in db.execute("EXPLAIN QUERY PLAN " + sql, qargs))
+        print(f"  {label:8}: {plan}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
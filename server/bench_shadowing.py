@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Throughput and sanity benchmark for the local shadowing scorer.
+
+Builds a synthetic reference (syllables with their own formant pattern,
+word gaps and phrase pauses, as TTS at 24 kHz) and learner attempts that
+say the same syllables with another voice, their own tempo and jitter,
+shifted pauses and background noise, plus a control attempt of different
+syllables. Checks that the real attempts outscore the control, then scores
+a batch of attempts on a process pool of 1..N workers and reports
+attempts/s and attempts/s per core.
+
+Usage:
+  python3 server/bench_shadowing.py [--seconds 12] [--attempts 32] [--workers 1,2,4]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import shadowing_score as ss  # noqa: E402
+
+
+def make_script(seconds: float, seed: int):
+    """Sentences of words of syllables: [(F1, F2, dur_s)] with pause markers (None, None, dur_s)."""
+    rng = np.random.default_rng(seed)
+    script, t = [], 0.0
+    while t < seconds:
+        for _ in range(rng.integers(4, 9)):  # words per sentence
+            for _ in range(rng.integers(1, 4)):  # syllables per word
+                d = rng.uniform(0.12, 0.26)
+                script.append((rng.uniform(300, 850), rng.uniform(900, 2500), d))
+                t += d
+            script.append((None, None, 0.05))
+            t += 0.05
+        script.append((None, None, rng.uniform(0.35, 0.6)))  # sentence pause
+        t += script[-1][2]
+    return script
+
+
+def render(script, sr: int, f0: float, tempo: float = 1.0, jitter: float = 0.0, pause_scale: float = 1.0,
+           noise_db: float = -80.0, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    out = []
+    for f1, f2, d in script:
+        if f1 is None:
+            n = int(d * pause_scale * tempo * rng.uniform(1 - jitter, 1 + jitter) * sr)
+            out.append(np.zeros(max(0, n)))
+            continue
+        n = int(d * tempo * rng.uniform(1 - jitter, 1 + jitter) * sr)
+        t = np.arange(n) / sr
+        pitch = f0 * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / sr
+        x = np.zeros(n)
+        for k in range(1, int(4000 / f0)):
+            fk = k * f0
+            gain = 1.0 / (1 + ((fk - f1) / 120) ** 2) + 0.7 / (1 + ((fk - f2) / 180) ** 2) + 0.02
+            x += gain * np.sin(k * phase)
+        out.append(x * np.hanning(n))
+    x = np.concatenate(out)
+    x = x / (np.max(np.abs(x)) + 1e-9) * 0.5
+    x += rng.normal(0, 10 ** (noise_db / 20), len(x))
+    return x.astype(np.float32)
+
+
+def build_case(seconds: float, seed: int):
+    script = make_script(seconds, seed)
+    # 参考：24 kHz TTS，按句子切成 clip（和前端逐句合成一致）
+    clips, cur = [], []
+    for item in script:
+        cur.append(item)
+        if item[0] is None and item[2] > 0.3:
+            clips.append(ss.resample(render(cur[:-1], 24000, f0=210, seed=seed), 24000))
+            cur = []
+    if cur:
+        clips.append(ss.resample(render(cur, 24000, f0=210, seed=seed), 24000))
+    reference, bounds = ss.concat_clips(clips)
+    return script, reference, bounds
+
+
+def attempt(script, k: int, seconds_lead: float = 0.4) -> np.ndarray:
+    rng = np.random.default_rng(100 + k)
+    x = render(script, ss.SAMPLE_RATE, f0=rng.uniform(95, 140), tempo=rng.uniform(0.9, 1.25),
+               jitter=0.15, pause_scale=rng.uniform(0.7, 1.6), noise_db=-45, seed=k)
+    return np.concatenate([np.zeros(int(seconds_lead * ss.SAMPLE_RATE), dtype=np.float32), x])
+
+
+def _score(args):
+    reference, bounds, learner = args
+    return ss.score_attempt(reference, learner, bounds=bounds)["score"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Shadowing scorer benchmark (attempts/s per core)")
+    parser.add_argument("--seconds", type=float, default=12.0, help="Reference length")
+    parser.add_argument("--attempts", type=int, default=32)
+    parser.add_argument("--workers", default="1,2,4")
+    args = parser.parse_args()
+
+    script, reference, bounds = build_case(args.seconds, seed=1)
+    learners = [attempt(script, k) for k in range(args.attempts)]
+    control = render(make_script(args.seconds, seed=99), ss.SAMPLE_RATE, f0=120, noise_db=-45, seed=5)
+
+    t0 = time.perf_counter()
+    good = ss.score_attempt(reference, learners[0], bounds=bounds)
+    single_ms = (time.perf_counter() - t0) * 1000
+    bad = ss.score_attempt(reference, control, bounds=bounds)
+    print(f"reference {len(reference) / ss.SAMPLE_RATE:.1f}s, {len(bounds)} sentences; one attempt scored in {single_ms:.0f} ms")
+    print(f"same text:      score={good['score']:5.1f} coverage={good['coverage']:5.1f} rhythm={good['rhythm']:5.1f} "
+          f"timing_dev={good['timing_dev_ms']:5.1f}ms spectral={good['spectral_match']:5.1f} pause_mismatch={good['pause_mismatch_ms']}ms")
+    print(f"different text: score={bad['score']:5.1f} coverage={bad['coverage']:5.1f} rhythm={bad['rhythm']:5.1f} "
+          f"timing_dev={bad['timing_dev_ms']:5.1f}ms spectral={bad['spectral_match']:5.1f} pause_mismatch={bad['pause_mismatch_ms']}ms")
+    if good["score"] <= bad["score"]:
+        print("!! same-text attempt does not outscore the control")
+        return 1
+
+    jobs = [(reference, bounds, x) for x in learners]
+    print(f"{'workers':>7} {'attempts/s':>11} {'per core':>9} {'ms/attempt':>11}")
+    for w in sorted({int(x) for x in args.workers.split(",") if x.strip()}):
+        with ProcessPoolExecutor(max_workers=w) as pool:
+            list(pool.map(_score, jobs[:w]))  # warm up the workers (imports, filterbank)
+            t0 = time.perf_counter()
+            scores = list(pool.map(_score, jobs, chunksize=max(1, len(jobs) // (4 * w))))
+            wall = time.perf_counter() - t0
+        rate = len(jobs) / wall
+        print(f"{w:7d} {rate:11.1f} {rate / min(w, os.cpu_count() or 1):9.1f} {wall * 1000 / len(jobs):11.1f}"
+              f"   (scores {min(scores):.0f}-{max(scores):.0f})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
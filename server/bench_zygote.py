@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Spawn-to-first-output latency: plain `python3 script.py` vs the pre-fork zygote.
+
+Starts its own zygote on a temporary socket (unless --socket points at a
+running one) and runs each case N times both ways.
+
+Usage:
+  python3 server/bench_zygote.py [--runs 20]
+"""
+import argparse
+import os
+import select
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+from py_zygote import connect_and_run  # noqa: E402
+
+# (name, script, argv, stdin, extra env)
+CASES = [
+    # First stdout line ({"event": "ws_url"}) comes right after the websocket thread starts
+    ("asr_bridge", "server/qwen_asr_realtime_bridge.py", [], b"",
+     {"DASHSCOPE_API_KEY": "bench", "DASHSCOPE_ASR_WS_URL": "ws://127.0.0.1:9/realtime"}),
+    # First output is the "[LLM] part=..." log once the payload is parsed
+    ("examiner", "server/qwen_llm_examiner_stream.py", [], b"{}",
+     {"DASHSCOPE_API_KEY": "bench", "DASHSCOPE_BASE_HTTP_API_URL": "http://127.0.0.1:9/api/v1"}),
+]
+
+
+def _first_output_ms(fds, t0: float, timeout: float = 15.0) -> float:
+    ready, _, _ = select.select(fds, [], [], timeout)
+    if not ready:
+        raise TimeoutError("no output")
+    return (time.perf_counter() - t0) * 1000
+
+
+def run_plain(script: str, argv, stdin: bytes, env: dict) -> float:
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script] + list(argv), cwd=ROOT_DIR, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    proc.stdin.write(stdin)
+    proc.stdin.close()
+    ms = _first_output_ms([proc.stdout, proc.stderr], t0)
+    proc.kill()
+    proc.wait()
+    proc.stdout.close()
+    proc.stderr.close()
+    return ms
+
+
+def _strip_control(buf: bytes):
+    """Split zygote control frames (\\0PID / \\0EXIT) off the stderr stream."""
+    frames = []
+    while buf.startswith(b"\0"):
+        nl = buf.find(b"\n")
+        if nl < 0:
+            break
+        frames.append(buf[1:nl].decode("ascii"))
+        buf = buf[nl + 1:]
+    return buf, frames
+
+
+def run_zygote(sock_path: str, script: str, argv, stdin: bytes, env: dict) -> float:
+    t0 = time.perf_counter()
+    run, err = connect_and_run(sock_path, script, argv, env=env, cwd=ROOT_DIR)
+    run.sendall(stdin)
+    run.shutdown(socket.SHUT_WR)
+    pid = None
+    buf = b""
+    ms = None
+    while ms is None:
+        r, _, _ = select.select([run, err], [], [], 15.0)
+        if not r:
+            raise TimeoutError("no output")
+        if run in r:
+            ms = (time.perf_counter() - t0) * 1000
+            break
+        buf, frames = _strip_control(buf + err.recv(4096))
+        for f in frames:
+            if f.startswith("PID "):
+                pid = int(f[4:])
+        if buf and not buf.startswith(b"\0"):
+            ms = (time.perf_counter() - t0) * 1000
+    if pid:
+        try:
+            os.kill(pid, 9)
+        except OSError:
+            pass
+    run.close()
+    err.close()
+    return ms
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark zygote vs plain spawn")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--socket", default="", help="Use an already running zygote")
+    args = parser.parse_args()
+
+    zygote = None
+    sock_path = args.socket
+    if not sock_path:
+        sock_path = os.path.join(tempfile.mkdtemp(prefix="zygote-"), "z.sock")
+        zygote = subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "py_zygote.py"), "--socket", sock_path],
+                                  stderr=subprocess.DEVNULL)
+        deadline = time.time() + 30
+        while not os.path.exists(sock_path):
+            if time.time() > deadline or zygote.poll() is not None:
+                sys.stderr.write("zygote failed to start\n")
+                return 1
+            time.sleep(0.05)
+
+    try:
+        print(f"{'case':12} {'mode':8} {'p50 ms':>8} {'p95 ms':>8} {'min ms':>8}")
+        for name, script, argv, stdin, extra in CASES:
+            env = {**os.environ, **extra}
+            for mode in ("plain", "zygote"):
+                samples = []
+                for _ in range(args.runs):
+                    if mode == "plain":
+                        samples.append(run_plain(script, argv, stdin, env))
+                    else:
+                        samples.append(run_zygote(sock_path, script, argv, stdin, env))
+                print(f"{name:12} {mode:8} {statistics.median(samples):8.1f} {_pct(samples, 95):8.1f} {min(samples):8.1f}")
+    finally:
+        if zygote:
+            zygote.terminate()
+            zygote.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
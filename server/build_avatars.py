@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Build responsive variants of the examiner portraits.
+
+Every image in public/examiners/ is auto-rotated, converted to sRGB, stripped
+of metadata (EXIF / XMP / Photoshop / ICC) and downscaled to a ladder of
+widths, then encoded as AVIF and WebP (when this Pillow build supports them)
+and progressive JPEG as the fallback. Each variant is kept under a byte
+budget proportional to its pixel count by stepping the quality down.
+
+Variants are named by the hash of their encoded bytes, written to
+public/examiners/v/, and listed in components/avatar-manifest.json, which the
+Avatar component turns into <picture> srcsets so the browser fetches the
+smallest variant that covers the displayed size. The manifest keeps the
+SHA-256 of each source and the encoder settings, so unchanged sources are
+skipped; variants no longer referenced by the manifest are deleted.
+
+Build-time only (not in requirements.txt):  pip install pillow
+
+Usage:
+  python3 server/build_avatars.py            # incremental
+  python3 server/build_avatars.py --force    # re-encode everything
+  npm run build:avatars
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, "public", "examiners")
+OUT_DIR = os.path.join(SRC_DIR, "v")
+MANIFEST = os.path.join(ROOT_DIR, "components", "avatar-manifest.json")
+PUBLIC_PREFIX = "/examiners/v/"
+SOURCE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+WIDTHS = (160, 320, 480, 768, 1152, 1600)
+# format -> (Pillow format, start quality, lowest quality, save options)
+ENCODERS = {
+    "avif": ("AVIF", 55, 30, {"speed": 6}),
+    "webp": ("WEBP", 80, 50, {"method": 6}),
+    "jpeg": ("JPEG", 82, 55, {"optimize": True, "progressive": True}),
+}
+BYTES_PER_PIXEL = 0.12  # budget: a 1600x1200 variant must fit in ~230 KB
+PIPELINE_VERSION = 1  # bump when the resize / encode steps change
+
+
+def _settings_key() -> str:
+    return json.dumps({"v": PIPELINE_VERSION, "w": WIDTHS, "enc": ENCODERS, "bpp": BYTES_PER_PIXEL}, sort_keys=True)
+
+
+def available_formats():
+    from PIL import features
+
+    fmts = [f for f in ("avif", "webp") if features.check(f)]
+    return fmts + ["jpeg"]
+
+
+def load_image(path: str):
+    from PIL import Image, ImageCms, ImageOps
+
+    img = Image.open(path)
+    img = ImageOps.exif_transpose(img)  # bake the orientation in before EXIF is dropped
+    icc = img.info.get("icc_profile")
+    if icc:
+        try:
+            src = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+            img = ImageCms.profileToProfile(img, src, ImageCms.createProfile("sRGB"), outputMode="RGB")
+        except (ImageCms.PyCMSError, OSError):
+            pass
+    img = img.convert("RGB")
+    img.info = {}  # nothing from the source (EXIF, XMP, ICC, DPI) reaches the encoders
+    return img
+
+
+def encode(img, fmt: str, budget: int):
+    """Encode without metadata, stepping quality down until it fits the budget (or hits the floor)."""
+    pil_fmt, quality, floor, opts = ENCODERS[fmt]
+    while True:
+        buf = io.BytesIO()
+        img.save(buf, pil_fmt, quality=quality, **opts)
+        data = buf.getvalue()
+        if len(data) <= budget or quality <= floor:
+            return data, quality
+        quality = max(floor, quality - 8)
+
+
+def build_one(path: str, name: str, source_hash: str, formats) -> dict:
+    from PIL import Image
+
+    img = load_image(path)
+    w0, h0 = img.size
+    widths = [w for w in WIDTHS if w < w0] + [min(w0, WIDTHS[-1])]
+    variants = []
+    for w in sorted(set(widths)):
+        h = round(h0 * w / w0)
+        scaled = img if w == w0 else img.resize((w, h), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        budget = int(w * h * BYTES_PER_PIXEL)
+        for fmt in formats:
+            data, quality = encode(scaled, fmt, budget)
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            filename = f"{name}-{w}.{digest}.{'jpg' if fmt == 'jpeg' else fmt}"
+            out = os.path.join(OUT_DIR, filename)
+            if not os.path.exists(out):
+                with open(out + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(out + ".tmp", out)
+            variants.append({"format": fmt, "width": w, "height": h, "bytes": len(data), "quality": quality,
+                             "src": PUBLIC_PREFIX + filename})
+    return {
+        "source": os.path.relpath(path, ROOT_DIR),
+        "source_sha256": source_hash,
+        "source_bytes": os.path.getsize(path),
+        "width": w0,
+        "height": h0,
+        "variants": variants,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build hashed, size-bounded variants of the examiner images")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the source is unchanged")
+    args = parser.parse_args()
+
+    try:
+        formats = available_formats()
+    except ImportError:
+        sys.stderr.write("[ERROR] Pillow is required: pip install pillow\n")
+        return 2
+
+    try:
+        with open(MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    settings = _settings_key()
+    if manifest.get("settings") != settings or manifest.get("formats") != formats:
+        manifest = {}  # encoder settings changed: every entry is stale
+    old_images = manifest.get("images", {})
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    images, built, skipped = {}, 0, 0
+    t0 = time.perf_counter()
+    for fn in sorted(os.listdir(SRC_DIR)):
+        path = os.path.join(SRC_DIR, fn)
+        if not (os.path.isfile(path) and fn.lower().endswith(SOURCE_EXTS)):
+            continue
+        name = os.path.splitext(fn)[0].lower()
+        with open(path, "rb") as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        prev = old_images.get(name)
+        if (not args.force and prev and prev.get("source_sha256") == source_hash
+                and all(os.path.exists(os.path.join(OUT_DIR, os.path.basename(v["src"]))) for v in prev["variants"])):
+            images[name] = prev
+            skipped += 1
+            continue
+        t1 = time.perf_counter()
+        images[name] = build_one(path, name, source_hash, formats)
+        built += 1
+        variants = images[name]["variants"]
+        print(f"{fn}: {images[name]['source_bytes'] / 1024:.0f} KB -> {len(variants)} variants, "
+              f"{min(v['bytes'] for v in variants) / 1024:.0f}-{max(v['bytes'] for v in variants) / 1024:.0f} KB "
+              f"({(time.perf_counter() - t1) * 1000:.0f} ms)")
+
+    # 删除不再被引用的旧变体（源图更新或删除后遗留的）
+    referenced = {os.path.basename(v["src"]) for img in images.values() for v in img["variants"]}
+    removed = 0
+    for fn in os.listdir(OUT_DIR):
+        if fn not in referenced:
+            os.remove(os.path.join(OUT_DIR, fn))
+            removed += 1
+
+    manifest = {"settings": settings, "formats": formats, "images": images}
+    tmp = MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, MANIFEST)
+
+    total_src = sum(img["source_bytes"] for img in images.values())
+    sys.stderr.write(f"[STATS] images={len(images)} built={built} skipped={skipped} removed={removed} "
+                     f"formats={','.join(formats)} source_kb={total_src / 1024:.0f} "
+                     f"wall_ms={(time.perf_counter() - t0) * 1000:.0f}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
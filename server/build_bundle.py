@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Build a precompiled, zip-importable bundle of the server scripts.
+
+The bundle contains .pyc files for every runtime script in server/ plus the
+pure-Python packages they depend on (from requirements.txt, resolved
+recursively). Packages that ship extension modules or data files stay in
+site-packages, because zipimport can't load those; they are precompiled in
+place instead, so nothing is compiled at request time once the build image
+is deployed read-only.
+
+Usage:
+  python3 server/build_bundle.py                  # -> build/server-bundle.zip
+  python3 server/build_bundle.py --bench          # build, then compare startup via -X importtime
+  PY_BUNDLE=build/server-bundle.zip npm run dev:server
+"""
+import argparse
+import compileall
+import importlib.metadata as md
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+DEFAULT_OUT = os.path.join(ROOT_DIR, "build", "server-bundle.zip")
+
+# 每个入口脚本在运行时真正需要的（延迟）导入，用于启动基准
+ENTRYPOINTS = {
+    "qwen_llm_examiner_stream": ["dashscope"],
+    "qwen_llm_feedback": ["dashscope"],
+    "qwen_tts_stream": ["dashscope.audio.qwen_tts_realtime"],
+    "qwen_asr_realtime_bridge": ["websocket"],
+    "qwen_asr_realtime_ws": ["dashscope.audio.qwen_omni"],
+    "qwen_asr_stream": ["dashscope"],
+}
+
+_PURE_SUFFIXES = (".py", ".pyi", "py.typed")
+
+
+def _server_scripts():
+    for name in sorted(os.listdir(SERVER_DIR)):
+        if not name.endswith(".py"):
+            continue
+        if name.startswith(("test_", "bench_", "diagnose_")) or name == os.path.basename(__file__):
+            continue
+        yield os.path.join(SERVER_DIR, name)
+
+
+def _requirement_names(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            yield re.split(r"[\s<>=!~\[;]", line, 1)[0]
+
+
+def _resolve_distributions(names):
+    """Walk requirements recursively; skip ones that are not installed or only apply to other platforms."""
+    seen = {}
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        key = name.lower().replace("_", "-")
+        if key in seen:
+            continue
+        try:
+            dist = md.distribution(name)
+        except md.PackageNotFoundError:
+            sys.stderr.write(f"[bundle] not installed, skipped: {name}\n")
+            seen[key] = None
+            continue
+        seen[key] = dist
+        for req in dist.requires or []:
+            if "extra ==" in req:
+                continue
+            req_name = re.split(r"[\s<>=!~\[;(]", req, 1)[0]
+            marker = req.split(";", 1)[1] if ";" in req else ""
+            if marker and not _marker_ok(marker):
+                continue
+            stack.append(req_name)
+    return [d for d in seen.values() if d is not None]
+
+
+def _marker_ok(marker: str) -> bool:
+    try:
+        from packaging.markers import Marker
+    except ImportError:
+        return True
+    try:
+        return Marker(marker).evaluate()
+    except Exception:
+        return True
+
+
+def _top_level_entries(dist):
+    """Return {top_level_name: is_pure} for a distribution's importable files."""
+    entries = {}
+    for f in dist.files or []:
+        parts = f.parts
+        if not parts or parts[0].endswith((".dist-info", ".egg-info", ".data")) or parts[0] == "..":
+            continue
+        if "__pycache__" in parts:
+            continue
+        top = parts[0][:-3] if len(parts) == 1 and parts[0].endswith(".py") else parts[0]
+        if len(parts) == 1 and not parts[0].endswith(".py"):
+            # top-level extension module / stray file
+            entries[top.split(".", 1)[0]] = False
+            continue
+        pure = entries.get(top, True) and f.name.endswith(_PURE_SUFFIXES)
+        entries[top] = pure
+    return entries
+
+
+def build(out_path: str, optimize: int = 0) -> dict:
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    report = {"scripts": [], "packages": [], "skipped": []}
+
+    with zipfile.PyZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, optimize=optimize) as zf:
+        for script in _server_scripts():
+            zf.writepy(script)
+            report["scripts"].append(os.path.basename(script))
+
+        dists = _resolve_distributions(_requirement_names(os.path.join(SERVER_DIR, "requirements.txt")))
+        for dist in dists:
+            for top, pure in sorted(_top_level_entries(dist).items()):
+                src = dist.locate_file(top)
+                if not pure:
+                    report["skipped"].append(top)
+                    if os.path.isdir(str(src)):
+                        compileall.compile_dir(str(src), quiet=1, optimize=optimize)
+                    continue
+                if os.path.isdir(str(src)) and os.path.isfile(os.path.join(str(src), "__init__.py")):
+                    zf.writepy(str(src))
+                elif os.path.isfile(str(src) + ".py"):
+                    zf.writepy(str(src) + ".py")
+                else:
+                    # namespace package or nothing importable
+                    report["skipped"].append(top)
+                    continue
+                report["packages"].append(top)
+
+    os.replace(tmp_path, out_path)
+    report["size"] = os.path.getsize(out_path)
+    return report
+
+
+def _import_time_us(stderr: str) -> int:
+    """Sum cumulative import time of top-level imports from `-X importtime` output."""
+    total = 0
+    for line in stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if m and not m.group(3):
+            total += int(m.group(2))
+    return total
+
+
+def _run_startup(module: str, extra: list, sys_path: list, env_extra: list) -> tuple:
+    code = "import sys; sys.path[:0] = %r; import %s" % (sys_path, ", ".join([module] + extra))
+    cmd = [sys.executable] + env_extra + ["-X", "importtime", "-c", code]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{module}: {proc.stderr.strip().splitlines()[-1:]}")
+    return _import_time_us(proc.stderr) / 1000, wall_ms
+
+
+def bench(bundle: str, runs: int) -> None:
+    empty_cache = tempfile.mkdtemp(prefix="pycache-empty-")
+    modes = [
+        # 无预编译：模拟只读部署（无 __pycache__ 可用，也写不进去）
+        ("source (no pyc)", [SERVER_DIR], ["-B", "-X", f"pycache_prefix={empty_cache}"]),
+        ("source (warm pyc)", [SERVER_DIR], []),
+        ("bundle", [bundle], ["-B"]),
+    ]
+    print(f"{'script':28} " + " ".join(f"{name:>22}" for name, _, _ in modes))
+    print(f"{'':28} " + " ".join(f"{'import ms / wall ms':>22}" for _ in modes))
+    for module, extra in ENTRYPOINTS.items():
+        cols = []
+        for _, path, flags in modes:
+            samples = [_run_startup(module, extra, path, flags) for _ in range(runs)]
+            imp = statistics.median(s[0] for s in samples)
+            wall = statistics.median(s[1] for s in samples)
+            cols.append(f"{imp:>10.1f} / {wall:>9.1f}")
+        print(f"{module:28} " + " ".join(f"{c:>22}" for c in cols))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build a precompiled zip bundle of the Python bridges")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--optimize", type=int, default=0, choices=[0, 1, 2])
+    parser.add_argument("--bench", action="store_true", help="Compare startup import time after building")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report = build(args.out, optimize=args.optimize)
+    print(f"[bundle] wrote {args.out} ({report['size'] / 1024:.0f} KB)")
+    print(f"[bundle] scripts: {', '.join(report['scripts'])}")
+    print(f"[bundle] packages: {', '.join(report['packages']) or '-'}")
+    if report["skipped"]:
+        print(f"[bundle] left in site-packages (native code / data files): {', '.join(sorted(set(report['skipped'])))}")
+
+    if args.bench:
+        bench(args.out, max(1, args.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Server-held examiner conversations (session mode of qwen_llm_examiner_stream.py).
+
+The frontend sends its exam `sessionId` and only the new user message; the
+normalized message list (DashScope role/content shape, no system prompt)
+and the exam state (part, questionCount) are kept here. A turn appends its
+new rows; nothing already stored is read back, re-parsed or rewritten.
+
+Two layers:
+  - the BFF (server/index.js) keeps recent sessions in an in-memory LRU and
+    passes the cached history on stdin, so a turn normally reads nothing;
+  - this SQLite file (CONVERSATION_DB, default server/.conversations.db, WAL)
+    is the durable copy every turn writes through to, and the fallback when
+    the BFF restarted or evicted the session.
+
+Tables:
+  conversations(session_id, part, question_count, messages, updated_at)
+  conversation_messages(session_id, seq, role, content)   content = JSON
+"""
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".conversations.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    session_id TEXT PRIMARY KEY,
+    part INTEGER NOT NULL DEFAULT 0,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def db_file() -> str:
+    return os.getenv("CONVERSATION_DB", "") or DEFAULT_FILE
+
+
+class ConversationStore:
+    def __init__(self, path: str = ""):
+        self.path = path or db_file()
+        self._db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # WAL: 崩溃时最多丢最后一次提交，不会损坏
+        self._db.executescript(SCHEMA)
+
+    def state(self, session_id: str):
+        """{"part", "questionCount", "messages"} or None for an unknown session."""
+        row = self._db.execute(
+            "SELECT part, question_count, messages FROM conversations WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"part": row[0], "questionCount": row[1], "messages": row[2]}
+
+    def load(self, session_id: str):
+        """The stored message list, or None for an unknown session."""
+        if self.state(session_id) is None:
+            return None
+        return [
+            {"role": role, "content": json.loads(content)}
+            for role, content in self._db.execute(
+                "SELECT role, content FROM conversation_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            )
+        ]
+
+    def append(self, session_id: str, start: int, messages, part: int, question_count: int, replace: bool = False) -> None:
+        """
+        Write `messages` as rows start, start+1, ... and update the state row.
+        `replace` drops what was stored first (the client re-sent the whole history).
+        """
+        rows = [(session_id, start + i, m["role"], json.dumps(m["content"], ensure_ascii=False)) for i, m in enumerate(messages)]
+        with self._tx():
+            if replace:
+                self._db.execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversation_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.execute(
+                "INSERT INTO conversations (session_id, part, question_count, messages, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET part = excluded.part, question_count = excluded.question_count, "
+                "messages = excluded.messages, updated_at = excluded.updated_at",
+                (session_id, part, question_count, start + len(rows), time.time()),
+            )
+
+    def _tx(self):
+        return _Transaction(self._db)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class _Transaction:
+    __slots__ = ("_db",)
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the DashScope services the bridges talk to, for load and
+latency tests without network access or API cost.
+
+  POST /api/v1/services/aigc/text-generation/generation   Generation.call (SSE stream or JSON)
+  WS   /api-ws/v1/realtime?model=qwen3-asr-flash-realtime  realtime ASR (raw websocket protocol)
+  WS   /api-ws/v1/realtime?model=qwen3-tts-flash-realtime  realtime TTS (QwenTtsRealtime protocol)
+  POST /api/v1/uploads                                    file upload (multipart, read as a stream)
+  POST /api/v1/services/aigc/image2video/face-detect      wan2.2-s2v-detect (passes JPEG/PNG >= 10 KB)
+
+Replies are canned but shaped like the real ones (examiner stage from the
+system prompt, rater JSON for feedback, growing ASR stash, PCM16 24 kHz TTS
+audio with a short leading silence). Latencies are configurable;
+--stall-rate makes that share of LLM streams and TTS responses hold their
+first chunk back for --stall-ms (tail-latency / hedging tests).
+
+Point the scripts at it with:
+  DASHSCOPE_BASE_HTTP_API_URL=http://127.0.0.1:<port>/api/v1
+  DASHSCOPE_ASR_WS_URL=ws://127.0.0.1:<port>/api-ws/v1/realtime
+  DASHSCOPE_TTS_WS_URL=ws://127.0.0.1:<port>/api-ws/v1/realtime
+
+Usage:
+  python3 server/dashscope_standin.py [--port 18080] [--llm-ttft-ms 300] [--asr-final-ms 250] [--asr-final-ms-per-s 0]
+                                     [--asr-drop-after-ms 4000]
+                                     [--detect-ms 400] [--ws-delay-ms 0] [--stall-rate 0.05 --stall-ms 6000]
+                                     [--llm-model-ttft qwen-turbo=1500 ...]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import struct
+import sys
+import uuid
+
+from aiohttp import WSMsgType, web
+
+EXAMINER_REPLIES = {
+    "Introduction": "Good morning. My name is Alex and I will be your examiner today. Could you tell me your full name, please?",
+    "Part 1": "Thank you. Let's talk about your hometown. What do you like most about the place where you grew up?",
+    "Part 2": (
+        "Now I'm going to give you a topic, and I'd like you to talk about it for one to two minutes. "
+        "Describe a memorable journey you have made. You should say where you went, who you went with, "
+        "what you did there, and explain why this journey was memorable. You have one minute to think "
+        "about what you're going to say. You can make notes if you wish."
+    ),
+    "Part 3": "Let's consider travel more generally. Why do you think people today travel more than in the past?",
+    "Exam Conclusion": "Thank you. That is the end of the speaking test.",
+}
+
+FEEDBACK_REPORT = {
+    "reportVersion": "v1",
+    "score": 6.5,
+    "fluency": 6.5,
+    "vocabulary": 6.0,
+    "grammar": 6.5,
+    "pronunciation": 7.0,
+    "strengths": ["回答完整，能围绕话题展开。"],
+    "improvements": ["可以使用更多连接词，减少停顿。"],
+    "comment": "（本地 stand-in 生成的示例报告）",
+}
+
+ANSWER_WORDS = (
+    "well i grew up in a small coastal town and what i like most is that everyone knows each other "
+    "we often went to the harbour at weekends and watched the boats coming back in the evening"
+).split()
+
+
+def _system_text(messages) -> str:
+    for m in messages or []:
+        if m.get("role") == "system":
+            content = m.get("content")
+            if isinstance(content, list):
+                return " ".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+            return str(content or "")
+    return ""
+
+
+def _reply_for(system: str) -> str:
+    if "IELTS Speaking Rater" in system:
+        return json.dumps(FEEDBACK_REPORT, ensure_ascii=False)
+    for stage, text in EXAMINER_REPLIES.items():
+        if f"CURRENT STAGE: {stage}" in system:
+            return text
+    return EXAMINER_REPLIES["Part 1"]
+
+
+def _tokens(text: str):
+    # roughly LLM-sized pieces: words with their leading space
+    out = []
+    for i, w in enumerate(text.split(" ")):
+        out.append(w if i == 0 else " " + w)
+    return out
+
+
+def _tone(samples: int, rate: int = 24000) -> bytes:
+    return b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 180 * i / rate))) for i in range(samples))
+
+
+# 2 s of tone, sliced per chunk (chunks are < 1 s) so synthesis costs the stand-in almost no CPU
+_TONE = _tone(48000)
+
+
+class StandIn:
+    def __init__(self, args):
+        self.args = args
+        self.stats = {"llm": 0, "asr": 0, "asr_bytes": 0, "tts": 0, "uploads": 0, "upload_bytes": 0, "detect": 0,
+                      "stalls": 0}
+        self.uploads = {}  # upload id -> (size, magic bytes)
+        self._rng = random.Random(args.seed)
+        self.model_ttft_ms = {}
+        for spec in args.llm_model_ttft:
+            name, _, ms = spec.partition("=")
+            self.model_ttft_ms[name] = int(ms)
+
+    def _stall_s(self) -> float:
+        """Extra first-chunk delay: --stall-ms for a --stall-rate share of responses, else 0."""
+        if self.args.stall_rate <= 0 or self._rng.random() >= self.args.stall_rate:
+            return 0.0
+        self.stats["stalls"] += 1
+        return self.args.stall_ms / 1000
+
+    # ---- HTTP: Generation.call ----
+    async def generation(self, request: web.Request):
+        self.stats["llm"] += 1
+        body = await request.json()
+        messages = (body.get("input") or {}).get("messages") or []
+        params = body.get("parameters") or {}
+        text = _reply_for(_system_text(messages))
+        request_id = uuid.uuid4().hex
+        stream = request.headers.get("X-DashScope-SSE", "").lower() == "enable"
+        incremental = bool(params.get("incremental_output"))
+
+        ttft_ms = self.model_ttft_ms.get(body.get("model", ""), self.args.llm_ttft_ms)
+        await asyncio.sleep(ttft_ms / 1000 + self._stall_s())
+        if params.get("max_tokens"):
+            text = "".join(_tokens(text)[:int(params["max_tokens"])])
+        if not stream:
+            return web.json_response({
+                "request_id": request_id,
+                "output": {"choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": text}}]},
+                "usage": {"input_tokens": 100, "output_tokens": len(_tokens(text)), "total_tokens": 100 + len(_tokens(text))},
+            })
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream;charset=UTF-8"})
+        await resp.prepare(request)
+        toks = _tokens(text)
+        sent = ""
+        for i, tok in enumerate(toks):
+            if i:
+                await asyncio.sleep(self.args.llm_token_ms / 1000)
+            sent += tok
+            last = i == len(toks) - 1
+            msg = {
+                "output": {"choices": [{
+                    "message": {"role": "assistant", "content": tok if incremental else sent},
+                    "finish_reason": "stop" if last else "null",
+                }]},
+                "usage": {"input_tokens": 100, "output_tokens": i + 1, "total_tokens": 101 + i},
+                "request_id": request_id,
+            }
+            await resp.write(f"id:{i + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{json.dumps(msg)}\n\n".encode("utf-8"))
+        await resp.write_eof()
+        return resp
+
+    # ---- WebSocket: realtime ASR / TTS ----
+    async def realtime(self, request: web.Request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        # --ws-delay-ms: a farther region (handshake and session.created each take one extra delay)
+        await asyncio.sleep(self.args.ws_delay_ms / 1000)
+        await ws.prepare(request)
+        await asyncio.sleep(self.args.ws_delay_ms / 1000)
+        model = request.query.get("model", "")
+        if "tts" in model:
+            await self._tts(ws)
+        else:
+            await self._asr(ws)
+        return ws
+
+    async def _send(self, ws, obj: dict) -> None:
+        obj.setdefault("event_id", "event_" + uuid.uuid4().hex[:20])
+        await ws.send_str(json.dumps(obj))
+
+    async def _asr(self, ws) -> None:
+        self.stats["asr"] += 1
+        # --asr-drop-after-ms: the first ASR connection is cut after that much audio (reconnect tests)
+        drop_at = self.args.asr_drop_after_ms * 32 if self.stats["asr"] == 1 else 0
+        total_bytes = 0
+        await self._send(ws, {"type": "session.created", "session": {"id": "sess_" + uuid.uuid4().hex[:16]}})
+        audio_bytes = 0
+        words = 0
+        item = "item_" + uuid.uuid4().hex[:16]
+        pending = set()
+        loop = asyncio.get_running_loop()
+        busy_until = [0.0]  # committed segments are recognized one after another
+
+        async def finalize(n_words: int, item_id: str, seconds: float):
+            start = max(loop.time(), busy_until[0])
+            busy_until[0] = start + (self.args.asr_final_ms + self.args.asr_final_ms_per_s * seconds) / 1000
+            await asyncio.sleep(busy_until[0] - loop.time())
+            text = " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(max(1, n_words)))
+            if not ws.closed:
+                await self._send(ws, {"type": "conversation.item.input_audio_transcription.completed",
+                                      "item_id": item_id, "content_index": 0, "transcript": text})
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            t = data.get("type")
+            if t == "session.update":
+                await self._send(ws, {"type": "session.updated", "session": data.get("session") or {}})
+            elif t == "input_audio_buffer.append":
+                b64 = data.get("audio", "")
+                n = len(b64) * 3 // 4 - b64[-2:].count("=")
+                audio_bytes += n
+                total_bytes += n
+                self.stats["asr_bytes"] += n
+                if drop_at and total_bytes >= drop_at:
+                    await ws.close(code=1011, message=b"standin: dropped")
+                    break
+                # ~2.5 words per second of 16 kHz PCM16 audio
+                target = int(audio_bytes / 32000 * 2.5)
+                if target > words:
+                    words = target
+                    stash = " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(words))
+                    await self._send(ws, {"type": "conversation.item.input_audio_transcription.text",
+                                          "item_id": item, "content_index": 0, "text": "", "stash": stash})
+            elif t == "input_audio_buffer.commit":
+                await self._send(ws, {"type": "input_audio_buffer.committed", "item_id": item})
+                task = asyncio.ensure_future(finalize(words, item, audio_bytes / 32000))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                audio_bytes, words = 0, 0
+                item = "item_" + uuid.uuid4().hex[:16]
+            elif t == "session.finish":
+                break
+        for task in list(pending):
+            task.cancel()
+
+    async def _tts(self, ws) -> None:
+        self.stats["tts"] += 1
+        await self._send(ws, {"type": "session.created", "session": {"id": "sess_" + uuid.uuid4().hex[:16]}})
+        text = []
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            t = data.get("type")
+            if t == "session.update":
+                await self._send(ws, {"type": "session.updated", "session": data.get("session") or {}})
+            elif t == "input_text_buffer.append":
+                text.append(data.get("text", ""))
+            elif t in ("input_text_buffer.commit", "session.finish"):
+                await self._synthesize(ws, " ".join(text))
+                text = []
+                if t == "session.finish":
+                    await self._send(ws, {"type": "session.finished"})
+                    break
+        await ws.close()
+
+    async def _synthesize(self, ws, text: str) -> None:
+        if not text.strip():
+            return
+        rid = "resp_" + uuid.uuid4().hex[:16]
+        await self._send(ws, {"type": "response.created", "response": {"id": rid}})
+        await asyncio.sleep(self.args.tts_ttfa_ms / 1000 + self._stall_s())
+        # ~150 wpm speech, 24 kHz PCM16, 100 ms chunks, delivered at `tts_rtf` x realtime
+        total = int(len(text.split()) / 2.5 * 24000)
+        lead = 24000 * self.args.tts_lead_silence_ms // 1000
+        chunk = 2400
+        pos = 0
+        while pos < total:
+            n = min(chunk, total - pos)
+            if pos + n <= lead:
+                pcm = bytes(2 * n)
+            else:
+                off = pos % 24000
+                pcm = _TONE[off * 2:(off + n) * 2]
+            await self._send(ws, {"type": "response.audio.delta", "response_id": rid,
+                                  "delta": base64.b64encode(pcm).decode("ascii")})
+            pos += n
+            await asyncio.sleep(n / 24000 * self.args.tts_rtf)
+        await self._send(ws, {"type": "response.audio.done", "response_id": rid})
+        await self._send(ws, {"type": "response.done", "response": {"id": rid, "status": "completed"}})
+
+    # ---- HTTP: file upload + face detect (avatar checks) ----
+    async def upload(self, request: web.Request):
+        reader = await request.multipart()
+        part = await reader.next()
+        while part is not None and part.name != "file":
+            part = await reader.next()
+        if part is None:
+            return web.json_response({"code": "InvalidParameter", "message": "missing file field"}, status=400)
+        size, magic = 0, b""
+        while True:
+            block = await part.read_chunk(64 * 1024)
+            if not block:
+                break
+            if len(magic) < 8:
+                magic += block[:8 - len(magic)]
+            size += len(block)
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = (size, magic)
+        self.stats["uploads"] += 1
+        self.stats["upload_bytes"] += size
+        host = request.headers.get("Host", f"{self.args.host}:{self.args.port}")
+        return web.json_response({
+            "request_id": uuid.uuid4().hex,
+            "output": {"url": f"http://{host}/uploads/{upload_id}/{part.filename or 'file'}"},
+        })
+
+    async def face_detect(self, request: web.Request):
+        self.stats["detect"] += 1
+        body = await request.json()
+        url = ((body.get("input") or {}).get("image_url")) or ""
+        await asyncio.sleep(self.args.detect_ms / 1000)
+        parts = url.split("/uploads/", 1)
+        upload = self.uploads.get(parts[1].split("/", 1)[0]) if len(parts) == 2 else None
+        if upload is None:
+            return web.json_response({"code": "InvalidParameter", "message": "image_url not found"}, status=400)
+        size, magic = upload
+        is_image = magic.startswith(b"\xff\xd8\xff") or magic.startswith(b"\x89PNG")
+        ok = is_image and size >= 10 * 1024
+        return web.json_response({
+            "request_id": uuid.uuid4().hex,
+            "output": {"check_pass": ok, "humanoid": ok, "message": "" if ok else "no clear face found in the image"},
+            "usage": {"image_count": 1},
+        })
+
+    async def health(self, request: web.Request):
+        return web.json_response({"ok": True, **self.stats})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local DashScope stand-in (LLM / realtime ASR / realtime TTS / face detect)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--llm-ttft-ms", type=int, default=300)
+    parser.add_argument("--llm-token-ms", type=int, default=15)
+    parser.add_argument("--llm-model-ttft", action="append", default=[], metavar="MODEL=MS",
+                        help="Per-model time to first token (repeatable; others use --llm-ttft-ms)")
+    parser.add_argument("--asr-final-ms", type=int, default=250)
+    parser.add_argument("--asr-final-ms-per-s", type=float, default=0.0,
+                        help="Extra final latency per second of committed audio (long-turn tests)")
+    parser.add_argument("--asr-drop-after-ms", type=int, default=0, help="Cut the first ASR connection after this much audio")
+    parser.add_argument("--tts-ttfa-ms", type=int, default=200)
+    parser.add_argument("--tts-rtf", type=float, default=0.2, help="Audio delivery time / audio duration")
+    parser.add_argument("--tts-lead-silence-ms", type=int, default=150)
+    parser.add_argument("--detect-ms", type=int, default=400, help="face-detect latency")
+    parser.add_argument("--ws-delay-ms", type=int, default=0, help="Extra realtime handshake / session.created delay")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Share of LLM streams / TTS responses that stall")
+    parser.add_argument("--stall-ms", type=int, default=5000, help="How long a stalled first chunk is held back")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the stall draws")
+    args = parser.parse_args()
+
+    standin = StandIn(args)
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/api/v1/services/aigc/text-generation/generation", standin.generation)
+    app.router.add_get("/api-ws/v1/realtime", standin.realtime)
+    app.router.add_post("/api/v1/uploads", standin.upload)
+    app.router.add_post("/api/v1/services/aigc/image2video/face-detect", standin.face_detect)
+    app.router.add_get("/health", standin.health)
+    sys.stderr.write(f"[STANDIN] listening on http://{args.host}:{args.port}\n")
+    sys.stderr.flush()
+    web.run_app(app, host=args.host, port=args.port, print=None, access_log=None)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
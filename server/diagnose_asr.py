@@ -7,10 +7,8 @@ import sys
 import time
 import json
 import threading
-import dashscope
-from dashscope.audio.asr import Recognition, RecognitionCallback
 
-class DiagnosticCallback(RecognitionCallback):
+class DiagnosticCallback:  # RecognitionCallback compatible (duck-typing)
     def __init__(self):
         self.connected = False
         self.session_created = False
@@ -57,6 +55,9 @@ def test_asr_websocket(url: str, api_key: str) -> bool:
     print(f"\nTesting: {url}")
     print("-" * 60)
     
+    import dashscope
+    from dashscope.audio.asr import Recognition
+
     dashscope.api_key = api_key
     callback = DiagnosticCallback()
     
@@ -5,10 +5,8 @@ WebSocket connectivity diagnostic script for DashScope TTS
 import os
 import sys
 import time
-import dashscope
-from dashscope.audio.qwen_tts_realtime import QwenTtsRealtime, QwenTtsRealtimeCallback, AudioFormat
 
-class DiagnosticCallback(QwenTtsRealtimeCallback):
+class DiagnosticCallback:  # QwenTtsRealtimeCallback compatible (duck-typing)
     def __init__(self):
         self.connected = False
         self.session_created = False
@@ -31,6 +29,9 @@ def test_websocket_url(url: str, api_key: str) -> bool:
     print(f"\nTesting: {url}")
     print("-" * 60)
     
+    import dashscope
+    from dashscope.audio.qwen_tts_realtime import QwenTtsRealtime
+
     dashscope.api_key = api_key
     callback = DiagnosticCallback()
     
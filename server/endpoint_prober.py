@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Background latency prober for the DashScope realtime endpoints (ASR and TTS).
+
+The successor of diagnose_asr.py / diagnose_websocket.py: instead of one
+manual connect with ✓/✗ output, every --interval-s it runs a short session
+against each candidate endpoint for both services, over the raw realtime
+protocol the bridges speak, and measures (ms from the start of the probe):
+  connect_ms        TCP + TLS + websocket handshake
+  session_ms        session.created received
+  first_result_ms   after session.created: ASR = 0.5 s of audio + commit until
+                    the first transcription / committed event;
+                    TTS = a short sentence + commit until the first audio delta
+
+The last --window probes per (service, endpoint) are kept as rolling samples
+(p50 / p95 and bucket histograms). After every round the ranked endpoints
+file is rewritten atomically: per service, healthy endpoints first, ordered
+by p50 session_ms + p50 first_result_ms. Health flags:
+  down    the last 2 probes failed, or less than half of the window succeeded
+  flaky   success rate below 90%
+  slow    p95 to first result more than twice the best healthy endpoint's
+
+qwen_asr_realtime_bridge.py, qwen_asr_realtime_ws.py and qwen_tts_stream.py
+read the file at startup (endpoints.py) unless a DASHSCOPE_*_WS_URL is set.
+
+Usage:
+  python3 server/endpoint_prober.py [--interval-s 60] [--once]
+      [--endpoint cn=wss://dashscope.aliyuncs.com/api-ws/v1/realtime ...]
+  # against two local stand-ins:
+  python3 server/endpoint_prober.py --once --endpoint near=ws://127.0.0.1:18080/api-ws/v1/realtime \\
+      --endpoint far=ws://127.0.0.1:18081/api-ws/v1/realtime
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from endpoints import endpoints_file
+
+DEFAULT_ENDPOINTS = (
+    ("cn", "wss://dashscope.aliyuncs.com/api-ws/v1/realtime"),
+    ("intl", "wss://dashscope-intl.aliyuncs.com/api-ws/v1/realtime"),
+)
+MODELS = {"asr": "qwen3-asr-flash-realtime", "tts": "qwen3-tts-flash-realtime"}
+METRICS = ("connect_ms", "session_ms", "first_result_ms")
+HIST_BUCKETS_MS = (50, 100, 200, 400, 800, 1600, 3200)
+ASR_RESULT_EVENTS = (
+    "conversation.item.input_audio_transcription.text",
+    "conversation.item.input_audio_transcription.completed",
+    "input_audio_buffer.committed",
+)
+PROBE_AUDIO_B64 = base64.b64encode(bytes(16000)).decode("ascii")  # 0.5 s of 16 kHz PCM16 silence
+PROBE_TEXT = "Hello, this is a latency probe."
+
+
+def _recv_until(ws, deadline: float, wanted) -> dict:
+    while True:
+        left = deadline - time.perf_counter()
+        if left <= 0:
+            raise TimeoutError("timed out")
+        ws.settimeout(left)
+        raw = ws.recv()
+        if not raw:
+            raise ConnectionError("connection closed")
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            continue
+        t = data.get("type", "")
+        if t == "error":
+            raise ConnectionError(str(data.get("error") or data)[:200])
+        if t in wanted:
+            return data
+
+
+def probe(service: str, base_url: str, api_key: str, timeout_s: float) -> dict:
+    """One probe session; returns {"ok", metrics..., "error"}."""
+    import websocket
+
+    url = f"{base_url}?model={MODELS[service]}"
+    headers = [f"Authorization: Bearer {api_key}", "OpenAI-Beta: realtime=v1"]
+    t0 = time.perf_counter()
+    deadline = t0 + timeout_s
+
+    def ms():
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+    out = {"ok": False}
+    ws = None
+    stage = "connect"
+    try:
+        ws = websocket.create_connection(url, header=headers, timeout=timeout_s, enable_multithread=True)
+        out["connect_ms"] = ms()
+        stage = "session"
+        _recv_until(ws, deadline, ("session.created",))
+        out["session_ms"] = ms()
+        stage = "first_result"
+        t1 = time.perf_counter()
+        if service == "asr":
+            ws.send(json.dumps({"type": "session.update", "session": {
+                "modalities": ["text"], "input_audio_format": "pcm", "sample_rate": 16000,
+                "input_audio_transcription": {"language": "en"}, "turn_detection": None}}))
+            ws.send(json.dumps({"type": "input_audio_buffer.append", "audio": PROBE_AUDIO_B64}))
+            ws.send(json.dumps({"type": "input_audio_buffer.commit"}))
+            _recv_until(ws, deadline, ASR_RESULT_EVENTS)
+        else:
+            ws.send(json.dumps({"type": "session.update", "session": {
+                "voice": "Cherry", "response_format": "pcm", "sample_rate": 24000, "mode": "commit"}}))
+            ws.send(json.dumps({"type": "input_text_buffer.append", "text": PROBE_TEXT}))
+            ws.send(json.dumps({"type": "input_text_buffer.commit"}))
+            _recv_until(ws, deadline, ("response.audio.delta",))
+        out["first_result_ms"] = round((time.perf_counter() - t1) * 1000, 1)
+        out["ok"] = True
+    except Exception as e:
+        out["error"] = f"{stage}: {str(e) or type(e).__name__}"
+    finally:
+        if ws is not None:
+            try:
+                ws.send(json.dumps({"type": "session.finish"}))
+                ws.close(timeout=0.2)
+            except Exception:
+                pass
+    return out
+
+
+def _pct(sorted_vals, q: float):
+    if not sorted_vals:
+        return None
+    return round(sorted_vals[min(len(sorted_vals) - 1, int(q / 100 * len(sorted_vals)))], 1)
+
+
+class RollingStats:
+    """Last `window` probes of one (service, endpoint)."""
+
+    def __init__(self, window: int):
+        self.ok = deque(maxlen=window)
+        self.samples = {m: deque(maxlen=window) for m in METRICS}
+        self.last_error = ""
+        self.last_probe_at = 0.0
+
+    def add(self, result: dict) -> None:
+        self.ok.append(bool(result.get("ok")))
+        self.last_probe_at = time.time()
+        if result.get("ok"):
+            for m in METRICS:
+                self.samples[m].append(result[m])
+        else:
+            self.last_error = result.get("error", "")
+
+    def success_rate(self) -> float:
+        return sum(self.ok) / len(self.ok) if self.ok else 0.0
+
+    def summary(self) -> dict:
+        out = {}
+        for m in METRICS:
+            vals = sorted(self.samples[m])
+            hist = [0] * (len(HIST_BUCKETS_MS) + 1)
+            for v in vals:
+                hist[next((i for i, b in enumerate(HIST_BUCKETS_MS) if v <= b), len(HIST_BUCKETS_MS))] += 1
+            out[m] = {"p50": _pct(vals, 50), "p95": _pct(vals, 95), "hist": hist}
+        return out
+
+
+def rank(stats: dict, names: dict) -> list:
+    rows = []
+    for url, st in stats.items():
+        s = st.summary()
+        rate = st.success_rate()
+        recent_fail = len(st.ok) >= 2 and not st.ok[-1] and not st.ok[-2]
+        down = not st.ok or recent_fail or rate < 0.5 or s["session_ms"]["p50"] is None
+        flags = []
+        if down:
+            flags.append("down")
+        elif rate < 0.9:
+            flags.append("flaky")
+        score = None if down else round(s["session_ms"]["p50"] + s["first_result_ms"]["p50"], 1)
+        rows.append({
+            "name": names[url], "url": url, "healthy": not down, "flags": flags, "score_ms": score,
+            "samples": len(st.ok), "success_rate": round(rate, 3), "last_error": st.last_error,
+            "last_probe_at": round(st.last_probe_at, 1), **s,
+        })
+    healthy_p95 = [r["first_result_ms"]["p95"] for r in rows if r["healthy"] and r["first_result_ms"]["p95"] is not None]
+    best = min(healthy_p95) if healthy_p95 else None
+    for r in rows:
+        p95 = r["first_result_ms"]["p95"]
+        if r["healthy"] and best and p95 is not None and p95 > 2 * best:
+            r["flags"].append("slow")
+    rows.sort(key=lambda r: (not r["healthy"], r["score_ms"] if r["score_ms"] is not None else float("inf")))
+    return rows
+
+
+def write_file(path: str, services: dict, interval_s: float) -> None:
+    data = {"updated_at": round(time.time(), 1), "interval_s": interval_s, "services": services}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Probe realtime ASR/TTS endpoints and publish a ranked endpoints file")
+    parser.add_argument("--endpoint", action="append", default=[], metavar="NAME=URL",
+                        help="Candidate realtime base URL (repeatable; default: cn and intl)")
+    parser.add_argument("--services", default="asr,tts")
+    parser.add_argument("--interval-s", type=float, default=60.0)
+    parser.add_argument("--window", type=int, default=30, help="Probes kept per endpoint")
+    parser.add_argument("--timeout-s", type=float, default=10.0)
+    parser.add_argument("--once", action="store_true", help="One round, then exit")
+    parser.add_argument("--out", default="", help="Endpoints file (default: DASHSCOPE_ENDPOINTS_FILE or server/.endpoints.json)")
+    args = parser.parse_args()
+
+    api_key = os.getenv("DASHSCOPE_API_KEY", "")
+    if not api_key:
+        sys.stderr.write("[ERROR] DASHSCOPE_API_KEY is not set\n")
+        return 2
+
+    endpoints = []
+    for spec in args.endpoint:
+        name, sep, url = spec.partition("=")
+        if not sep or not url:
+            sys.stderr.write(f"[ERROR] --endpoint expects NAME=URL, got {spec!r}\n")
+            return 2
+        endpoints.append((name, url.rstrip("/")))
+    endpoints = endpoints or list(DEFAULT_ENDPOINTS)
+    names = {url: name for name, url in endpoints}
+    services = [s for s in args.services.split(",") if s in MODELS]
+    out_path = args.out or endpoints_file()
+    stats = {s: {url: RollingStats(args.window) for _, url in endpoints} for s in services}
+
+    sys.stderr.write(f"[DEBUG] Probing {len(endpoints)} endpoints x {services} every {args.interval_s:.0f}s -> {out_path}\n")
+    sys.stderr.flush()
+    while True:
+        t_round = time.monotonic()
+        results = {}
+
+        def run(service, url):
+            results[(service, url)] = probe(service, url, api_key, args.timeout_s)
+
+        # 各端点并发探测，一轮耗时约等于最慢的那个（或超时）
+        threads = [threading.Thread(target=run, args=(s, url), daemon=True) for s in services for _, url in endpoints]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(args.timeout_s + 2)
+
+        ranked = {}
+        for s in services:
+            for _, url in endpoints:
+                stats[s][url].add(results.get((s, url), {"ok": False, "error": "probe: no result"}))
+            ranked[s] = rank(stats[s], names)
+        try:
+            write_file(out_path, ranked, args.interval_s)
+        except OSError as e:
+            sys.stderr.write(f"[ERROR] Cannot write {out_path}: {e}\n")
+
+        for s in services:
+            line = " ".join(
+                f"{r['name']}={'DOWN' if not r['healthy'] else round(r['score_ms'])}" + (f"({','.join(r['flags'])})" if r["flags"] and r["healthy"] else "")
+                for r in ranked[s]
+            )
+            sys.stderr.write(f"[STATS] {s}: {line}\n")
+        sys.stderr.flush()
+
+        if args.once:
+            return 0 if all(any(r["healthy"] for r in ranked[s]) for s in services) else 1
+        time.sleep(max(0.0, args.interval_s - (time.monotonic() - t_round)))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
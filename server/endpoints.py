@@ -0,0 +1,37 @@
+"""
+Ranked realtime endpoints published by server/endpoint_prober.py.
+
+The bridges and the TTS script call `ranked_ws_urls()` once at startup: it
+returns the healthy endpoints for the service, fastest first, followed by
+the script's own defaults as a fallback. A missing, unreadable or stale file
+(older than DASHSCOPE_ENDPOINTS_MAX_AGE_S, default 15 min) means the defaults
+are used unchanged. An explicit DASHSCOPE_*_WS_URL still wins; callers check
+it before calling this.
+"""
+import json
+import os
+import time
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".endpoints.json")
+DEFAULT_MAX_AGE_S = 900
+
+
+def endpoints_file() -> str:
+    return os.getenv("DASHSCOPE_ENDPOINTS_FILE", "") or DEFAULT_FILE
+
+
+def ranked_ws_urls(service: str, defaults) -> list:
+    """Healthy probed endpoints for `service` ("asr" | "tts"), best first, then `defaults`."""
+    urls = []
+    try:
+        max_age = float(os.getenv("DASHSCOPE_ENDPOINTS_MAX_AGE_S", str(DEFAULT_MAX_AGE_S)))
+        with open(endpoints_file(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if time.time() - float(data.get("updated_at", 0)) <= max_age:
+            urls = [e["url"] for e in data.get("services", {}).get(service, []) if e.get("healthy") and e.get("url")]
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        urls = []
+    for url in defaults:
+        if url not in urls:
+            urls.append(url)
+    return urls
@@ -0,0 +1,126 @@
+"""
+Shared stdout writer for the JSON-lines protocol between the Python scripts
+and the Node BFF.
+
+- Encoding goes through orjson when it is installed (a few times faster than
+  json.dumps for the small event dicts the bridges emit), otherwise through
+  the stdlib (byte-identical to the old json.dumps output). orjson writes
+  compact UTF-8 instead of ", " separators and \\u escapes; Node reads the
+  pipe as UTF-8, so both forms parse the same.
+- Events that never change (speech_start, session_updated, ...) can be
+  encoded once at import time with `frame()` and written as bytes.
+- `EventWriter` is safe to share between threads: a line is always written
+  whole, under one lock, and lines from one thread keep their order.
+- `with writer.batch():` collects everything the current thread emits until
+  the block ends and writes it with a single write + flush, e.g. `final` and
+  `turn_end` from one websocket callback. Other threads are not held up by an
+  open batch; their events go out immediately.
+
+Usage:
+  from event_writer import EventWriter, frame
+  SPEECH_START = frame({"event": "speech_start"})
+  out = EventWriter()
+  out.emit(SPEECH_START)
+  with out.batch():
+      out.emit({"event": "final", "text": text})
+      out.emit({"event": "turn_end", "text": text})
+"""
+import json
+import sys
+import threading
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def encode(obj) -> bytes:
+    """One event as a newline-terminated UTF-8 line."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # 非常规类型（大整数、自定义对象等）交给标准库兜底
+    return (json.dumps(obj) + "\n").encode("ascii")
+
+
+class Frame(bytes):
+    """A pre-encoded event line; `event` names it for the byte counters."""
+
+    event = ""
+
+
+def frame(obj: dict) -> Frame:
+    f = Frame(encode(obj))
+    f.event = obj.get("event") or obj.get("type") or ""
+    return f
+
+
+class _Local(threading.local):
+    pending = None  # list of (line, name) while this thread is inside batch()
+
+
+class _Batch:
+    __slots__ = ("_writer", "_nested")
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def __enter__(self):
+        local = self._writer._local
+        self._nested = local.pending is not None
+        if not self._nested:
+            local.pending = []
+
+    def __exit__(self, *exc):
+        if not self._nested:
+            local = self._writer._local
+            pending, local.pending = local.pending, None
+            if pending:
+                self._writer._write(pending)
+        return False
+
+
+class EventWriter:
+    """Thread-safe JSON-lines writer on a binary stream (default: the current sys.stdout)."""
+
+    def __init__(self, stream=None, counters: bool = False):
+        if stream is None:
+            stream = getattr(sys.stdout, "buffer", sys.stdout)
+        self._out = stream
+        self._lock = threading.Lock()
+        self._local = _Local()
+        self.bytes_out = {} if counters else None  # event name -> bytes written
+        self.events = 0
+        self.writes = 0
+
+    def emit(self, obj) -> None:
+        """Write one event: a dict, or a Frame from `frame()`."""
+        if isinstance(obj, bytes):
+            line, name = obj, getattr(obj, "event", "")
+        else:
+            line = encode(obj)
+            name = obj.get("event") or obj.get("type") or ""
+        pending = self._local.pending
+        if pending is not None:
+            pending.append((line, name))
+            return
+        self._write(((line, name),))
+
+    def batch(self):
+        """Coalesce this thread's events until the block exits (nested blocks join the outer one)."""
+        return _Batch(self)
+
+    def _write(self, items) -> None:
+        data = items[0][0] if len(items) == 1 else b"".join(line for line, _ in items)
+        with self._lock:
+            if self.bytes_out is not None:
+                for line, name in items:
+                    self.bytes_out[name] = self.bytes_out.get(name, 0) + len(line)
+            self.events += len(items)
+            self.writes += 1
+            self._out.write(data)
+            self._out.flush()
@@ -0,0 +1,139 @@
+"""
+Hedged requests for the examiner LLM stream and the TTS session.
+
+A request that has not produced its first delta / audio chunk within the
+hedge threshold gets a duplicate sent to the alternate endpoint or model;
+whichever produces first output wins and the other is cancelled. The
+threshold adapts: it is the p95 of recent first-byte latencies of that
+service, clamped to [HEDGE_MIN_MS, HEDGE_MAX_MS] (HEDGE_DEFAULT_MS until
+HEDGE_MIN_SAMPLES samples exist), so roughly the slowest 5% get hedged.
+HEDGE_BUDGET_PER_MIN caps the hedges per service per minute, so a provider
+that is slow for everyone does not get twice the load.
+
+Every script run is a separate process, so the samples and the hedge
+timestamps live in a small JSON file (HEDGE_STATE_FILE, default
+server/.hedge_state.json) that is read and rewritten under an flock.
+
+Off unless HEDGE_REQUESTS=1.
+
+Usage:
+  policy = HedgePolicy("llm")
+  after_ms = policy.threshold_ms()        # None when hedging is off
+  ... no first byte after `after_ms` ...
+  if policy.try_acquire():                 # budget left this minute
+      start the duplicate
+  policy.record(first_byte_ms)             # the primary's (or elapsed when it lost)
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, last writer wins
+    fcntl = None
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".hedge_state.json")
+WINDOW = 200  # first-byte samples kept per service
+
+
+def enabled() -> bool:
+    return os.getenv("HEDGE_REQUESTS", "0") == "1"
+
+
+def state_file() -> str:
+    return os.getenv("HEDGE_STATE_FILE", "") or DEFAULT_FILE
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _pct(sorted_vals, q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q / 100 * len(sorted_vals)))]
+
+
+@contextmanager
+def locked_state(path: str):
+    """
+    Yield the JSON state dict in `path` under an exclusive lock; it is written
+    back when the block exits. Also used by model_router.py for its stats.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+", encoding="utf-8") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            state = json.loads(f.read() or "{}")
+            if not isinstance(state, dict):
+                state = {}
+        except ValueError:
+            state = {}  # 文件损坏就从空状态重新积累
+        yield state
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state, separators=(",", ":")))
+
+
+class HedgePolicy:
+    """Threshold, budget and latency samples of one service ("llm" | "tts")."""
+
+    def __init__(self, service: str, path: str = ""):
+        self.service = service
+        self.path = path or state_file()
+        self.enabled = enabled()
+        self.min_ms = _env_num("HEDGE_MIN_MS", 300)
+        self.max_ms = _env_num("HEDGE_MAX_MS", 4000)
+        self.default_ms = _env_num("HEDGE_DEFAULT_MS", 1500)
+        self.min_samples = int(_env_num("HEDGE_MIN_SAMPLES", 20))
+        self.budget_per_min = int(_env_num("HEDGE_BUDGET_PER_MIN", 10))
+
+    def _entry(self, state: dict) -> dict:
+        entry = state.setdefault(self.service, {})
+        entry.setdefault("samples", [])
+        entry.setdefault("hedges", [])
+        return entry
+
+    def threshold_ms(self):
+        """Hedge after this many ms without a first byte; None when hedging is off."""
+        if not self.enabled:
+            return None
+        try:
+            with locked_state(self.path) as state:
+                samples = sorted(self._entry(state)["samples"])
+        except OSError:
+            samples = []
+        if len(samples) < self.min_samples:
+            return self.default_ms
+        return min(self.max_ms, max(self.min_ms, _pct(samples, 95)))
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from this minute's budget; False when it is used up."""
+        if not self.enabled or self.budget_per_min <= 0:
+            return False
+        now = time.time()
+        try:
+            with locked_state(self.path) as state:
+                entry = self._entry(state)
+                entry["hedges"] = [t for t in entry["hedges"] if now - t < 60]
+                if len(entry["hedges"]) >= self.budget_per_min:
+                    return False
+                entry["hedges"].append(round(now, 3))
+                return True
+        except OSError:
+            return False
+
+    def record(self, first_byte_ms: float) -> None:
+        """Add one first-byte latency sample (ms since the primary request started)."""
+        if not self.enabled:
+            return
+        try:
+            with locked_state(self.path) as state:
+                entry = self._entry(state)
+                entry["samples"] = (entry["samples"] + [round(first_byte_ms, 1)])[-WINDOW:]
+        except OSError:
+            pass
@@ -0,0 +1,141 @@
+"""
+Vectorized IMA-ADPCM (4 bits/sample) for the TTS downlink.
+
+IMA-ADPCM is a recursive coder, so samples inside a block must be coded in
+order. Blocks are independent though (each header carries its own
+predictor and step index), so the encoder walks the sample positions once
+and codes every block of the chunk in parallel with numpy.
+
+Block layout (little endian), `block_samples` samples per block:
+  int16  first sample (stored verbatim, also the initial predictor)
+  uint8  initial step index (0..88)
+  uint8  reserved (0)
+  ceil((n - 1) / 2) bytes of 4-bit codes, low nibble first
+The last block of a chunk may be short; the decoder is told the total
+sample count of the chunk.
+
+Matching decoder for the browser: services/imaAdpcm.ts
+"""
+import numpy as np
+
+DEFAULT_BLOCK_SAMPLES = 65  # 4 + 32 bytes per 65 samples -> ~3.6:1; see bench_adpcm.py for the size/CPU trade-off
+
+STEP_TABLE = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+], dtype=np.int32)
+
+INDEX_TABLE = np.array([-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8], dtype=np.int32)
+
+_HEADER_BYTES = 4
+
+
+def _build_tables():
+    """(89, 16) lookup tables: signed predictor delta and next step index for every (index, code)."""
+    step = STEP_TABLE[:, None]
+    code = np.arange(16, dtype=np.int32)[None, :]
+    mag = (step >> 3) + (code >> 2 & 1) * step + (code >> 1 & 1) * (step >> 1) + (code & 1) * (step >> 2)
+    delta = np.where(code & 8, -mag, mag).astype(np.int32)
+    nxt = np.clip(np.arange(89, dtype=np.int32)[:, None] + INDEX_TABLE[None, :], 0, 88).astype(np.int32)
+    return delta, nxt
+
+
+_DELTA, _NEXT_INDEX = _build_tables()
+
+
+def _initial_index(blocks: np.ndarray) -> np.ndarray:
+    """Pick a starting step per block from its first few sample deltas (blocks are coded independently)."""
+    head = blocks[:, : min(9, blocks.shape[1])]
+    if head.shape[1] < 2:
+        return np.zeros(blocks.shape[0], dtype=np.int32)
+    est = np.abs(np.diff(head, axis=1)).mean(axis=1)
+    return np.clip(np.searchsorted(STEP_TABLE, est) - 1, 0, 88).astype(np.int32)
+
+
+def encoded_size(num_samples: int, block_samples: int = DEFAULT_BLOCK_SAMPLES) -> int:
+    full, rem = divmod(num_samples, block_samples)
+    size = full * (_HEADER_BYTES + (block_samples - 1) // 2)
+    if rem:
+        size += _HEADER_BYTES + rem // 2
+    return size
+
+
+def encode(pcm: np.ndarray, block_samples: int = DEFAULT_BLOCK_SAMPLES) -> bytes:
+    """Encode int16 mono PCM into IMA-ADPCM blocks."""
+    n = int(pcm.shape[0])
+    if n == 0:
+        return b""
+    if block_samples < 3 or block_samples % 2 == 0:
+        raise ValueError("block_samples must be odd and >= 3")
+
+    nblocks = -(-n // block_samples)
+    padded = np.empty(nblocks * block_samples, dtype=np.int32)
+    padded[:n] = pcm
+    padded[n:] = pcm[-1]
+    x = padded.reshape(nblocks, block_samples)
+
+    pred = x[:, 0].copy()
+    idx = _initial_index(x)
+    idx0 = idx.copy()
+    codes = np.empty((nblocks, block_samples - 1), dtype=np.uint8)
+
+    for j in range(1, block_samples):
+        step = STEP_TABLE[idx]
+        diff = x[:, j] - pred
+        sign = diff < 0
+        diff = np.abs(diff)
+
+        # Successive approximation, same rounding as the reference IMA encoder
+        b4 = diff >= step
+        diff -= step * b4
+        half = step >> 1
+        b2 = diff >= half
+        diff -= half * b2
+        b1 = diff >= (step >> 2)
+
+        code = (sign << 3) | (b4 << 2) | (b2 << 1) | b1
+        codes[:, j - 1] = code
+        pred = np.clip(pred + _DELTA[idx, code], -32768, 32767)
+        idx = _NEXT_INDEX[idx, code]
+
+    packed = codes[:, 0::2] | (codes[:, 1::2] << 4)
+    header = np.zeros((nblocks, _HEADER_BYTES), dtype=np.uint8)
+    header[:, 0:2] = x[:, 0].astype("<i2").view(np.uint8).reshape(nblocks, 2)
+    header[:, 2] = idx0
+    out = np.hstack([header, packed]).tobytes()
+
+    # Trim the short last block: header + ceil((rem - 1) / 2) code bytes
+    return out[: encoded_size(n, block_samples)]
+
+
+def decode(data: bytes, num_samples: int, block_samples: int = DEFAULT_BLOCK_SAMPLES) -> np.ndarray:
+    """Decode IMA-ADPCM blocks back to int16 PCM (used by the benchmark; the browser has its own decoder)."""
+    if num_samples <= 0:
+        return np.zeros(0, dtype=np.int16)
+    block_bytes = _HEADER_BYTES + (block_samples - 1) // 2
+    nblocks = -(-num_samples // block_samples)
+    buf = np.zeros(nblocks * block_bytes, dtype=np.uint8)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    buf[: raw.shape[0]] = raw[: buf.shape[0]]
+    blocks = buf.reshape(nblocks, block_bytes)
+
+    pred = blocks[:, 0:2].copy().view("<i2").reshape(nblocks).astype(np.int32)
+    idx = blocks[:, 2].astype(np.int32)
+    nib = blocks[:, _HEADER_BYTES:]
+    codes = np.empty((nblocks, block_samples - 1), dtype=np.int32)
+    codes[:, 0::2] = nib & 0x0F
+    codes[:, 1::2] = nib >> 4
+
+    out = np.empty((nblocks, block_samples), dtype=np.int32)
+    out[:, 0] = pred
+    for j in range(1, block_samples):
+        code = codes[:, j - 1]
+        pred = np.clip(pred + _DELTA[idx, code], -32768, 32767)
+        out[:, j] = pred
+        idx = _NEXT_INDEX[idx, code]
+    return out.reshape(-1)[:num_samples].astype(np.int16)
@@ -1,6 +1,13 @@
 import http from 'node:http';
+import net from 'node:net';
+import os from 'node:os';
+import crypto from 'node:crypto';
 import { spawn } from 'node:child_process';
+import { EventEmitter } from 'node:events';
+import { PassThrough } from 'node:stream';
+import { StringDecoder } from 'node:string_decoder';
 import fs from 'node:fs';
+import path from 'node:path';
 import { URL } from 'node:url';
 import { WebSocketServer } from 'ws';
 
@@ -21,6 +28,145 @@ const PYTHON_BIN =
   process.env.PYTHON ||
   (fs.existsSync(`${process.cwd()}/.venv/bin/python3`) ? `${process.cwd()}/.venv/bin/python3` : 'python3');
 
+// 预编译 bundle（npm run build:server 生成）：设置 PY_BUNDLE 后以 `python -m <module>` 从 zip 启动，
+// 入口脚本与纯 Python 依赖都不再在请求时编译
+const PY_BUNDLE = process.env.PY_BUNDLE ? path.resolve(process.env.PY_BUNDLE) : '';
+
+// 端点探测结果（server/endpoint_prober.py）：桥接与 TTS 脚本启动时据此选最快的健康地域。
+// 显式给出绝对路径，bundle / zygote 模式下的子进程也能找到同一个文件
+process.env.DASHSCOPE_ENDPOINTS_FILE = process.env.DASHSCOPE_ENDPOINTS_FILE || path.resolve('server/.endpoints.json');
+const ENDPOINT_PROBE_INTERVAL_S = Number(process.env.ENDPOINT_PROBE_INTERVAL_S || 0); // >0: run the prober alongside the BFF
+
+// 对冲请求（server/hedge.py，HEDGE_REQUESTS=1 开启）：各次脚本调用共享首字节延迟样本与每分钟对冲预算
+process.env.HEDGE_STATE_FILE = process.env.HEDGE_STATE_FILE || path.resolve('server/.hedge_state.json');
+// 考官模型路由（server/model_router.py）：各模型的滚动延迟统计，决定每个 (part, action) 用哪一档模型
+process.env.ROUTER_STATE_FILE = process.env.ROUTER_STATE_FILE || path.resolve('server/.router_state.json');
+
+// 计量账本：各脚本最后输出的 usage 事件，带上考试会话 / 服务 / 部分后逐行追加；server/usage_meter.py 按会话、按天汇总
+process.env.USAGE_LEDGER = process.env.USAGE_LEDGER || path.resolve('server/.usage.jsonl');
+process.env.USAGE_ROLLUP = process.env.USAGE_ROLLUP || path.resolve('server/.usage-rollup.json');
+const USAGE_FOLLOW = process.env.USAGE_FOLLOW === '1'; // 1: run usage_meter.py --follow (budget alarms + rollup file)
+// 前端关闭 ASR 连接后留给桥接的收尾时间（发完队列、输出 usage），超时再强杀
+const ASR_CLOSE_GRACE_MS = Number(process.env.ASR_CLOSE_GRACE_MS || 3000);
+// 考官会话历史：内存 LRU 容量（会话数）与落库文件
+const CONVERSATION_CACHE_MAX = Number(process.env.CONVERSATION_CACHE_MAX || 500);
+process.env.CONVERSATION_DB = process.env.CONVERSATION_DB || path.resolve('server/.conversations.db');
+// 考试记录库（server/session_store.py）：脚本只往 spool 追加，IELTS_STORE=1 时由后台 ingest 进程批量入库
+process.env.IELTS_DB = process.env.IELTS_DB || path.resolve('server/.ielts.db');
+process.env.IELTS_SPOOL = process.env.IELTS_SPOOL || path.resolve('server/.ielts-spool.jsonl');
+const IELTS_STORE = process.env.IELTS_STORE === '1';
+// 考试记录按用户隔离：用户身份取自前置鉴权代理写入的请求头（代理必须覆盖客户端自带的同名头）。
+// 不配置时历史查询接口关闭（404），考官脚本写入的会话也不带用户
+const IELTS_USER_HEADER = (process.env.IELTS_USER_HEADER || '').toLowerCase();
+
+function requestUser(req) {
+  return IELTS_USER_HEADER ? String(req.headers[IELTS_USER_HEADER] || '').trim().slice(0, 128) : '';
+}
+
+// Pre-fork zygote（server/py_zygote.py）：设置 PY_ZYGOTE_SOCKET 后由已预加载 SDK 的进程 fork 子进程执行脚本
+const PY_ZYGOTE_SOCKET = process.env.PY_ZYGOTE_SOCKET || '';
+const SIGNAL_NAMES = Object.fromEntries(Object.entries(os.constants.signals).map(([name, num]) => [num, name]));
+
+// ChildProcess 兼容的最小外壳：stdin/stdout 走 run 连接；stderr 与 \0PID/\0EXIT 控制帧走 stderr 连接
+function spawnViaZygote(script, args, options) {
+  const child = new EventEmitter();
+  const id = crypto.randomUUID();
+  const errSock = net.createConnection({ path: PY_ZYGOTE_SOCKET });
+  const runSock = net.createConnection({ path: PY_ZYGOTE_SOCKET, allowHalfOpen: true });
+  const stderr = new PassThrough();
+  const decoder = new StringDecoder('utf8');
+  let exitCode = null;
+  let pendingKill = null;
+  let ctrl = '';
+  let openSockets = 2;
+
+  child.pid = 0;
+  child.stdin = runSock;
+  child.stdout = runSock;
+  child.stderr = stderr;
+  child.kill = (sig = 'SIGTERM') => {
+    if (!child.pid) {
+      pendingKill = sig;
+      return false;
+    }
+    try {
+      process.kill(child.pid, sig);
+      return true;
+    } catch {
+      return false;
+    }
+  };
+
+  errSock.write(JSON.stringify({ op: 'stderr', id }) + '\n');
+  runSock.write(
+    JSON.stringify({ op: 'run', id, script, argv: args, env: options.env || process.env, cwd: options.cwd || process.cwd() }) + '\n',
+  );
+  if (options.stdio && options.stdio[0] === 'ignore') runSock.end();
+
+  errSock.on('data', (chunk) => {
+    let s = ctrl + decoder.write(chunk);
+    let out = '';
+    let i;
+    ctrl = '';
+    while ((i = s.indexOf('\0')) >= 0) {
+      out += s.slice(0, i);
+      const nl = s.indexOf('\n', i);
+      if (nl < 0) {
+        ctrl = s.slice(i);
+        s = '';
+        break;
+      }
+      const frame = s.slice(i + 1, nl);
+      s = s.slice(nl + 1);
+      if (frame.startsWith('PID ')) {
+        child.pid = Number(frame.slice(4));
+        if (pendingKill) child.kill(pendingKill);
+      } else if (frame.startsWith('EXIT ')) {
+        exitCode = Number(frame.slice(5));
+      }
+    }
+    out += s;
+    if (out) stderr.write(out);
+  });
+  errSock.on('error', (err) => {
+    stderr.write(`[ZYGOTE] ${err.message}\n`);
+  });
+  runSock.on('error', () => {
+    // surfaced through errSock / exit code
+  });
+  // 子进程 stdout EOF 即已退出；我们这侧的写端（stdin）也要关掉，socket 才会 close
+  runSock.on('end', () => runSock.destroy());
+
+  const onSocketClose = () => {
+    openSockets -= 1;
+    if (openSockets > 0) return;
+    stderr.end();
+    if (exitCode === null) {
+      child.emit('close', 1, null);
+    } else if (exitCode < 0) {
+      child.emit('close', null, SIGNAL_NAMES[-exitCode] || null);
+    } else {
+      child.emit('close', exitCode, null);
+    }
+  };
+  errSock.on('close', onSocketClose);
+  runSock.on('close', onSocketClose);
+
+  return child;
+}
+
+function spawnPython(script, args, options) {
+  if (PY_ZYGOTE_SOCKET && fs.existsSync(PY_ZYGOTE_SOCKET)) {
+    return spawnViaZygote(script, args, options);
+  }
+  if (PY_BUNDLE && fs.existsSync(PY_BUNDLE)) {
+    const env = { ...(options.env || process.env) };
+    env.PYTHONPATH = env.PYTHONPATH ? `${PY_BUNDLE}${path.delimiter}${env.PYTHONPATH}` : PY_BUNDLE;
+    return spawn(PYTHON_BIN, ['-B', '-m', path.basename(script, '.py'), ...args], { ...options, env });
+  }
+  return spawn(PYTHON_BIN, [script, ...args], options);
+}
+
 function json(res, statusCode, data) {
   const body = JSON.stringify(data);
   res.writeHead(statusCode, {
@@ -57,6 +203,68 @@ function sseSend(res, data) {
   res.write(`data: ${JSON.stringify(data)}\n\n`);
 }
 
+let usageLedger = null;
+
+function recordUsage(service, session, part, evt) {
+  const { event, type, ...usage } = evt;
+  const rec = { ts: Date.now() / 1000, session: session || '', service };
+  if (part !== undefined && part !== null && part !== '') rec.part = part;
+  if (!usageLedger) {
+    usageLedger = fs.createWriteStream(process.env.USAGE_LEDGER, { flags: 'a' });
+    usageLedger.on('error', (err) => console.error(`[USAGE] ledger write failed: ${err.message}`));
+  }
+  usageLedger.write(JSON.stringify({ ...rec, ...usage }) + '\n');
+}
+
+// {"event":"usage",...} / {"type":"usage",...} 行；其余返回 null
+function parseUsage(line) {
+  if (!line.includes('"usage"')) return null;
+  try {
+    const obj = JSON.parse(line);
+    return obj && (obj.event === 'usage' || obj.type === 'usage') ? obj : null;
+  } catch {
+    return null;
+  }
+}
+
+function sessionId(value) {
+  const s = String(value || '');
+  return /^[A-Za-z0-9_-]{1,64}$/.test(s) ? s : '';
+}
+
+// 会话模式的考官对话（server/conversation_store.py 落库）：最近的会话在内存里按 LRU 缓存已规范化的历史，
+// 每轮直接随 stdin 交给脚本，不必读库；脚本以 {"type":"conversation"} 行回报本轮追加的消息
+const conversationCache = new Map(); // sessionId -> { messages, part, questionCount }；Map 按插入顺序，最旧的在前
+
+function cachedConversation(id) {
+  const entry = conversationCache.get(id);
+  if (entry) {
+    conversationCache.delete(id);
+    conversationCache.set(id, entry);
+  }
+  return entry;
+}
+
+function updateConversation(evt) {
+  const id = sessionId(evt.session);
+  if (!id) return;
+  let messages = null;
+  if (Array.isArray(evt.history)) {
+    messages = evt.history;
+  } else if (Array.isArray(evt.appended)) {
+    const prev = conversationCache.get(id);
+    if (prev && prev.messages.length + evt.appended.length === evt.messages_total) {
+      messages = prev.messages.concat(evt.appended);
+    }
+  }
+  conversationCache.delete(id);
+  if (!messages) return; // 对不上就丢掉缓存，下一轮从库里读
+  conversationCache.set(id, { messages, part: evt.part, questionCount: evt.questionCount });
+  while (conversationCache.size > CONVERSATION_CACHE_MAX) {
+    conversationCache.delete(conversationCache.keys().next().value);
+  }
+}
+
 // ...
 const server = http.createServer(async (req, res) => {
   // CORS Headers
@@ -119,12 +327,12 @@ const server = http.createServer(async (req, res) => {
       sseInit(res);
       sseSend(res, { event: 'start' });
 
-      const args = ['server/qwen_asr_stream.py', '--audio-url', audioUrl];
+      const args = ['--audio-url', audioUrl];
       if (language) args.push('--language', language);
       if (enableItN) args.push('--enable-itn', enableItN);
       if (contextText) args.push('--context', contextText);
 
-      const py = spawn(PYTHON_BIN, args, {
+      const py = spawnPython('server/qwen_asr_stream.py', args, {
         cwd: process.cwd(),
         env: process.env,
         stdio: ['ignore', 'pipe', 'pipe'],
@@ -186,24 +394,69 @@ const server = http.createServer(async (req, res) => {
         return json(res, 400, { error: 'bad_request', message: 'Body must be JSON.' });
       }
 
+      payload.user = requestUser(req); // 考试记录的归属只认鉴权身份，不认请求体
+
+      // 会话模式：前端只发新消息，历史从 LRU 带给脚本（未命中时脚本自己读库）
+      const convId = sessionId(payload.sessionId);
+      if (payload.sessionId && !convId) {
+        return json(res, 400, { error: 'bad_request', message: 'Invalid sessionId.' });
+      }
+      if (convId && !Array.isArray(payload.messages)) {
+        const cached = cachedConversation(convId);
+        if (cached) payload.history = cached.messages;
+      }
+
       sseInit(res);
       sseSend(res, { event: 'start' });
 
-      const py = spawn(PYTHON_BIN, ['server/qwen_llm_examiner_stream.py'], {
+      const py = spawnPython('server/qwen_llm_examiner_stream.py', [], {
         cwd: process.cwd(),
         env: process.env,
         stdio: ['pipe', 'pipe', 'pipe'],
       });
 
       const payloadJson = JSON.stringify(payload);
-      console.log(`[LLM] Sending payload to Python (${payloadJson.length} bytes):`, payloadJson.substring(0, 200));
+      console.log(`[LLM] Sending payload to Python (${payloadJson.length} bytes${payload.history ? `, ${payload.history.length} cached msgs` : ''}):`, payloadJson.substring(0, 200));
       py.stdin.write(payloadJson);
       py.stdin.end();
 
+      // Frames/CPU per response, to keep an eye on the delta flush policy
+      const cpuStart = process.cpuUsage();
+      let frames = 0;
+      let frameBytes = 0;
+
       let stderrBuf = '';
+      let lineBuf = '';
       py.stdout.on('data', (chunk) => {
-        const text = chunk.toString('utf8');
-        if (text) sseSend(res, { event: 'delta', text });
+        lineBuf += chunk.toString('utf8');
+        // 按整行转发；conversation 行只给 LRU，不下发前端
+        const forward = [];
+        let idx;
+        while ((idx = lineBuf.indexOf('\n')) >= 0) {
+          const line = lineBuf.slice(0, idx);
+          lineBuf = lineBuf.slice(idx + 1);
+          if (line.includes('"conversation"')) {
+            let obj = null;
+            try {
+              obj = JSON.parse(line);
+            } catch {
+              // not a whole JSON line; forward as-is
+            }
+            if (obj && obj.type === 'conversation') {
+              updateConversation(obj);
+              continue;
+            }
+          }
+          forward.push(line);
+          const usage = parseUsage(line);
+          if (usage) recordUsage('examiner', sessionId(payload.session), payload.part, usage);
+        }
+        if (forward.length) {
+          const text = forward.join('\n') + '\n';
+          frames += 1;
+          frameBytes += Buffer.byteLength(text);
+          sseSend(res, { event: 'delta', text });
+        }
       });
       py.stderr.on('data', (chunk) => {
         stderrBuf += chunk.toString('utf8');
@@ -220,6 +473,8 @@ const server = http.createServer(async (req, res) => {
       req.on('aborted', closeAll);
 
       py.on('close', (code) => {
+        const cpu = process.cpuUsage(cpuStart);
+        console.log(`[LLM] frames=${frames} bytes=${frameBytes} cpu=${((cpu.user + cpu.system) / 1000).toFixed(1)}ms`);
         if (code === 0) {
           sseSend(res, { event: 'end' });
         } else {
@@ -261,30 +516,39 @@ const server = http.createServer(async (req, res) => {
       const speechRate = payload.speech_rate != null ? String(payload.speech_rate) : '';
       const pitchRate = payload.pitch_rate != null ? String(payload.pitch_rate) : '';
       const volume = payload.volume != null ? String(payload.volume) : '';
+      const adpcmBlock = payload.adpcm_block != null ? String(payload.adpcm_block) : '';
+      // ima_adpcm_24000: Python 端把上游 PCM 重新编码为 IMA-ADPCM（每个 audio 事件带 codec/samples/block）
+      const isAdpcm = /^(ima_adpcm|ima_adpcm_24000|adpcm)$/i.test(format);
 
       sseInit(res);
-      sseSend(res, { event: 'start', format: 'pcm_s16le', sampleRate: 24000, channels: 1 });
+      sseSend(res, { event: 'start', format: isAdpcm ? 'ima_adpcm' : 'pcm_s16le', sampleRate: 24000, channels: 1 });
 
-      const args = ['server/qwen_tts_stream.py', '--text', text, '--voice', voice, '--language-type', languageType, '--mode', mode, '--format', format];
+      const args = ['--text', text, '--voice', voice, '--language-type', languageType, '--mode', mode, '--format', format];
       if (wsUrl) args.push('--ws-url', wsUrl);
       if (speechRate) args.push('--speech-rate', speechRate);
       if (pitchRate) args.push('--pitch-rate', pitchRate);
       if (volume) args.push('--volume', volume);
+      if (isAdpcm && adpcmBlock) args.push('--adpcm-block', adpcmBlock);
 
-      const py = spawn(PYTHON_BIN, args, {
+      const py = spawnPython('server/qwen_tts_stream.py', args, {
         cwd: process.cwd(),
         env: process.env,
         stdio: ['ignore', 'pipe', 'pipe'],
       });
 
       let stderrBuf = '';
+      // 一次 data 可能含多行（合并写出），也可能只有半行（大的 audio 事件跨管道读）：按行缓冲
+      let stdoutBuf = '';
       py.stdout.on('data', (chunk) => {
-        const text = chunk.toString('utf8');
-        for (const line of text.split(/\r?\n/)) {
-          const t = line.trim();
+        stdoutBuf += chunk.toString('utf8');
+        let idx;
+        while ((idx = stdoutBuf.indexOf('\n')) >= 0) {
+          const t = stdoutBuf.slice(0, idx).trim();
+          stdoutBuf = stdoutBuf.slice(idx + 1);
           if (!t) continue;
           try {
             const obj = JSON.parse(t);
+            if (obj.event === 'usage') recordUsage('tts', sessionId(payload.session), payload.part, obj);
             sseSend(res, obj);
           } catch {
             // ignore malformed line
@@ -320,6 +584,68 @@ const server = http.createServer(async (req, res) => {
       return;
     }
 
+    // 考生音频存档回放（ASR_ARCHIVE_DIR 由实时桥接写入）
+    // GET /api/v1/asr/archive?session=<id>                       -> index.json
+    // GET /api/v1/asr/archive?session=<id>&turn=2&fromMs=&toMs= -> audio/wav 片段（mmap 读取，恒定内存）
+    if (method === 'GET' && pathname === '/api/v1/asr/archive') {
+      const archiveDir = process.env.ASR_ARCHIVE_DIR || '';
+      const session = url.searchParams.get('session') || '';
+      if (!archiveDir) return json(res, 404, { error: 'archive_disabled' });
+      if (!/^[A-Za-z0-9_-]{1,64}$/.test(session)) return json(res, 400, { error: 'bad_request', message: 'Bad session.' });
+
+      const sessionDir = path.join(archiveDir, session);
+      const turn = url.searchParams.get('turn');
+      const args = turn ? ['read', sessionDir, '--turn', String(Number(turn) || 0)] : ['info', sessionDir];
+      if (turn && url.searchParams.get('fromMs')) args.push('--from-ms', String(Number(url.searchParams.get('fromMs')) || 0));
+      if (turn && url.searchParams.get('toMs')) args.push('--to-ms', String(Number(url.searchParams.get('toMs')) || 0));
+
+      const py = spawnPython('server/audio_archive.py', args, {
+        cwd: process.cwd(),
+        env: process.env,
+        stdio: ['ignore', 'pipe', 'pipe'],
+      });
+      let stderrBuf = '';
+      let started = false;
+      py.stdout.on('data', (chunk) => {
+        if (!started) {
+          started = true;
+          res.writeHead(200, { 'Content-Type': turn ? 'audio/wav' : 'application/json; charset=utf-8' });
+        }
+        res.write(chunk);
+      });
+      py.stderr.on('data', (chunk) => {
+        stderrBuf += chunk.toString('utf8');
+      });
+      req.on('close', () => {
+        try {
+          py.kill('SIGKILL');
+        } catch {
+          // ignore
+        }
+      });
+      py.on('close', (code) => {
+        if (!started) return json(res, 404, { error: 'not_found', message: stderrBuf.trim() || `exit ${code}` });
+        res.end();
+      });
+      return;
+    }
+
+    // 计量汇总（usage_meter.py --follow 维护的 rollup 文件）
+    // GET /api/v1/usage                 -> 按天 / 按服务部分 / 最近会话
+    // GET /api/v1/usage?session=<id>    -> 单场考试的花费明细
+    if (method === 'GET' && pathname === '/api/v1/usage') {
+      let rollup;
+      try {
+        rollup = JSON.parse(await fs.promises.readFile(process.env.USAGE_ROLLUP, 'utf8'));
+      } catch {
+        return json(res, 404, { error: 'usage_unavailable', message: 'No usage rollup yet (start the BFF with USAGE_FOLLOW=1).' });
+      }
+      const session = url.searchParams.get('session');
+      if (!session) return json(res, 200, rollup);
+      const entry = rollup.sessions?.[session];
+      return entry ? json(res, 200, { session, ...entry }) : json(res, 404, { error: 'not_found' });
+    }
+
     // Qwen LLM - IELTS feedback report (non-stream JSON)
     // Request: POST /api/v1/ielts/feedback { model?, transcript: [{role,text}...] }
     if (method === 'POST' && pathname === '/api/v1/ielts/feedback') {
@@ -338,7 +664,7 @@ const server = http.createServer(async (req, res) => {
         return json(res, 400, { error: 'bad_request', message: 'Body must be JSON.' });
       }
 
-      const py = spawn(PYTHON_BIN, ['server/qwen_llm_feedback.py'], {
+      const py = spawnPython('server/qwen_llm_feedback.py', [], {
         cwd: process.cwd(),
         env: process.env,
         stdio: ['pipe', 'pipe', 'pipe'],
@@ -356,6 +682,13 @@ const server = http.createServer(async (req, res) => {
       });
 
       py.on('close', (code) => {
+        // 第一行是 usage 事件，其后才是报告 JSON
+        const nl = stdoutBuf.indexOf('\n');
+        const usage = nl >= 0 ? parseUsage(stdoutBuf.slice(0, nl)) : null;
+        if (usage) {
+          recordUsage('feedback', sessionId(payload.session), 'report', usage);
+          stdoutBuf = stdoutBuf.slice(nl + 1);
+        }
         if (code !== 0) {
           return json(res, 500, { error: 'feedback_failed', message: stderrBuf || `python exited with code ${code}` });
         }
@@ -370,6 +703,53 @@ const server = http.createServer(async (req, res) => {
       return;
     }
 
+    // 考试记录查询（session_store.py，只读；只返回 IELTS_USER_HEADER 标识的用户自己的记录）
+    // GET /api/v1/ielts/sessions?sort=date|score&limit=&cursor=   -> { items, next_cursor }
+    // GET /api/v1/ielts/sessions/search?q=...&limit=               -> { items: [{ sessionId, snippet, ... }] }
+    // GET /api/v1/ielts/sessions/<id>                              -> { session, turns, report }（别人的会话 404）
+    if (method === 'GET' && pathname.startsWith('/api/v1/ielts/sessions')) {
+      if (!IELTS_USER_HEADER) return notFound(res);
+      const owner = requestUser(req);
+      if (!owner) return json(res, 401, { error: 'unauthorized', message: `Missing ${IELTS_USER_HEADER} header.` });
+      const q = url.searchParams;
+      const user = [`--user=${owner}`];
+      const limit = ['--limit', String(Number(q.get('limit')) || 20)];
+      let args;
+      if (pathname === '/api/v1/ielts/sessions') {
+        const sort = q.get('sort') === 'score' ? 'score' : 'date';
+        // 用户给的值一律用 --opt=value 形式，以 "-" 开头也不会被当成选项
+        args = ['list', '--sort', sort, ...user, ...limit, ...(q.get('cursor') ? [`--cursor=${q.get('cursor')}`] : [])];
+      } else if (pathname === '/api/v1/ielts/sessions/search') {
+        if (!q.get('q')) return json(res, 400, { error: 'bad_request', message: 'q is required.' });
+        args = ['search', ...user, ...limit, '--', q.get('q')];
+      } else {
+        const m = pathname.match(/^\/api\/v1\/ielts\/sessions\/([^/]+)$/);
+        if (!m) return notFound(res);
+        args = ['get', ...user, '--', decodeURIComponent(m[1])];
+      }
+      const py = spawnPython('server/session_store.py', args, {
+        cwd: process.cwd(),
+        env: process.env,
+        stdio: ['ignore', 'pipe', 'pipe'],
+      });
+      let stdoutBuf = '';
+      let stderrBuf = '';
+      py.stdout.on('data', (c) => (stdoutBuf += c.toString('utf8')));
+      py.stderr.on('data', (c) => (stderrBuf += c.toString('utf8')));
+      py.on('close', (code) => {
+        // 2: 库不存在或查询参数无效；3: 会话不存在
+        if (code === 3) return json(res, 404, { error: 'not_found' });
+        if (code === 2) return json(res, 400, { error: 'bad_query', message: stderrBuf.trim() });
+        if (code !== 0) return json(res, 500, { error: 'store_failed', message: stderrBuf.trim() || `exit ${code}` });
+        try {
+          return json(res, 200, JSON.parse(stdoutBuf));
+        } catch {
+          return json(res, 500, { error: 'store_failed', message: 'bad store output' });
+        }
+      });
+      return;
+    }
+
     // V1: create session (stub)
     if (method === 'POST' && pathname === '/api/v1/ielts/sessions') {
       return json(res, 200, {
@@ -449,6 +829,8 @@ server.on('upgrade', (request, socket, head) => {
   }
 });
 
+const ASR_SEND_LAG_WARN_MS = Number(process.env.ASR_SEND_LAG_WARN_MS || 500);
+
 wss.on('connection', (ws, req) => {
   console.log(`[ASR-WS] New connection from ${req.socket.remoteAddress}`);
   if (!process.env.DASHSCOPE_API_KEY) {
@@ -464,11 +846,20 @@ wss.on('connection', (ws, req) => {
   const threshold = url.searchParams.get('threshold') || '0.0';
   const corpusText = url.searchParams.get('corpus_text') || '';
   const dashWsUrl = url.searchParams.get('dashWsUrl') || process.env.DASHSCOPE_ASR_WS_URL || '';
+  // partial=delta: 只下发变化的后缀（partial_delta）；raw=0: 不再转发上游原始 asr 事件
+  const partialMode = url.searchParams.get('partial') === 'delta' ? 'delta' : 'full';
+  const forwardRaw = url.searchParams.get('raw') !== '0';
+  const sessionParam = url.searchParams.get('session') || '';
+  const archiveSession = /^[A-Za-z0-9_-]{1,64}$/.test(sessionParam) ? sessionParam : crypto.randomUUID();
+  // standby=1: 考官还在说话时预先建好并配置上游会话，空闲超时后自动关闭
+  const standbyTimeoutS = url.searchParams.get('standby') === '1' ? Number(process.env.ASR_STANDBY_TIMEOUT_S || 60) : 0;
+  // segment=1: 长回答（Part 2）在停顿处分段 commit，停止后只等最后一段的 final；不带参数时按 ASR_SEGMENT
+  const segmentParam = url.searchParams.get('segment');
 
   // python bridge reads config/audio JSON lines from stdin and outputs JSON lines to stdout
   const env = { ...process.env };
   if (dashWsUrl) env.DASHSCOPE_ASR_WS_URL = dashWsUrl;
-  const py = spawn(PYTHON_BIN, ['server/qwen_asr_realtime_bridge.py'], {
+  const py = spawnPython('server/qwen_asr_realtime_bridge.py', [], {
     cwd: process.cwd(),
     env,
     stdio: ['pipe', 'pipe', 'pipe'],
@@ -495,6 +886,12 @@ wss.on('connection', (ws, req) => {
       turn_detection_threshold: Number(threshold),
       turn_detection_silence_duration_ms: Number(silenceMs),
       corpus_text: corpusText,
+      partial_mode: partialMode,
+      forward_raw: forwardRaw,
+      // 仅在 ASR_ARCHIVE_DIR 设置时生效：同一场考试传同一个 session，轮次依次追加
+      archive_session: archiveSession,
+      standby_timeout_s: standbyTimeoutS,
+      ...(segmentParam ? { segment: segmentParam === '1' } : {}),
     }) + '\n',
   );
   // NOTE: DashScope ws url override is passed via child env above
@@ -507,6 +904,17 @@ wss.on('connection', (ws, req) => {
       const line = stdoutBuf.slice(0, idx).trim();
       stdoutBuf = stdoutBuf.slice(idx + 1);
       if (!line) continue;
+      const usage = parseUsage(line);
+      if (usage) recordUsage('asr', archiveSession, null, usage);
+      if (line.includes('"send_queue"')) {
+        // 上行发送队列报告：上游变慢时在服务端日志里可见（同时照常转发给前端）
+        try {
+          const q = JSON.parse(line);
+          if (q.send_lag_ms >= ASR_SEND_LAG_WARN_MS || q.dropped) {
+            console.warn(`[ASR-WS] upstream behind: depth=${q.queue_depth} lag=${q.send_lag_ms}ms merged=${q.merged} dropped=${q.dropped}`);
+          }
+        } catch { /* ignore */ }
+      }
       ws.send(line);
     }
   });
@@ -523,29 +931,37 @@ wss.on('connection', (ws, req) => {
       const text = typeof data === 'string' ? data : data.toString('utf8');
       // Expect JSON line from browser:
       // { "type": "audio", "audio_b64": "..." } | { "type": "commit" } | { "type": "close" }
+      // | { "type": "config", "language"?, "corpus_text"? }（会话中途切换：桥接在后台建好新会话，下一次 commit 时无缝切换）
+      // | { "type": "config", "segment": bool }（复用 standby 会话时按当前 Part 开关分段 commit）
       sendToPython(text.trim() + '\n');
     } catch {
       // ignore
     }
   });
 
+  let killTimer = null;
   const cleanup = () => {
+    if (killTimer) return;
     try {
       sendToPython(JSON.stringify({ type: 'close' }) + '\n');
     } catch {
       // ignore
     }
-    try {
-      py.kill('SIGKILL');
-    } catch {
-      // ignore
-    }
+    // 桥接收到 close 会发完队列、输出 usage 后自行退出；超时才强杀
+    killTimer = setTimeout(() => {
+      try {
+        py.kill('SIGKILL');
+      } catch {
+        // ignore
+      }
+    }, ASR_CLOSE_GRACE_MS);
   };
 
   ws.on('close', cleanup);
   ws.on('error', cleanup);
 
   py.on('close', (code) => {
+    if (killTimer) clearTimeout(killTimer);
     if (code !== 0) {
       ws.send(JSON.stringify({ event: 'error', message: stderrBuf || `python exited with code ${code}` }));
     }
@@ -553,6 +969,89 @@ wss.on('connection', (ws, req) => {
   });
 });
 
+function startEndpointProber() {
+  const prober = spawnPython('server/endpoint_prober.py', ['--interval-s', String(ENDPOINT_PROBE_INTERVAL_S)], {
+    env: process.env,
+    stdio: ['ignore', 'ignore', 'pipe'],
+  });
+  let buf = '';
+  prober.stderr.on('data', (d) => {
+    buf += d.toString('utf8');
+    let idx;
+    while ((idx = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, idx);
+      buf = buf.slice(idx + 1);
+      // eslint-disable-next-line no-console
+      if (line.startsWith('[STATS]') || line.startsWith('[ERROR]')) console.log(`[endpoint-prober] ${line}`);
+    }
+  });
+  prober.on('close', (code) => {
+    // eslint-disable-next-line no-console
+    console.warn(`[endpoint-prober] exited with code ${code}`);
+  });
+  process.on('exit', () => {
+    try { prober.kill(); } catch { /* ignore */ }
+  });
+}
+
+if (ENDPOINT_PROBE_INTERVAL_S > 0) startEndpointProber();
+
+function startUsageMeter() {
+  const meter = spawnPython('server/usage_meter.py', ['--follow'], {
+    env: process.env,
+    stdio: ['ignore', 'ignore', 'pipe'],
+  });
+  let buf = '';
+  meter.stderr.on('data', (d) => {
+    buf += d.toString('utf8');
+    let idx;
+    while ((idx = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, idx);
+      buf = buf.slice(idx + 1);
+      // eslint-disable-next-line no-console
+      if (line.startsWith('[ALARM]')) console.warn(`[usage] ${line}`);
+      // eslint-disable-next-line no-console
+      else if (line.startsWith('[STATS]') || line.startsWith('[ERROR]')) console.log(`[usage] ${line}`);
+    }
+  });
+  meter.on('close', (code) => {
+    // eslint-disable-next-line no-console
+    console.warn(`[usage] meter exited with code ${code}`);
+  });
+  process.on('exit', () => {
+    try { meter.kill(); } catch { /* ignore */ }
+  });
+}
+
+if (USAGE_FOLLOW) startUsageMeter();
+
+function startSessionStore() {
+  const ingester = spawnPython('server/session_store.py', ['ingest', '--follow'], {
+    env: process.env,
+    stdio: ['ignore', 'ignore', 'pipe'],
+  });
+  let buf = '';
+  ingester.stderr.on('data', (d) => {
+    buf += d.toString('utf8');
+    let idx;
+    while ((idx = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, idx);
+      buf = buf.slice(idx + 1);
+      // eslint-disable-next-line no-console
+      if (line.startsWith('[ERROR]')) console.warn(`[ielts-store] ${line}`);
+    }
+  });
+  ingester.on('close', (code) => {
+    // eslint-disable-next-line no-console
+    console.warn(`[ielts-store] ingester exited with code ${code}`);
+  });
+  process.on('exit', () => {
+    try { ingester.kill(); } catch { /* ignore */ }
+  });
+}
+
+if (IELTS_STORE) startSessionStore();
+
 server.listen(PORT, '0.0.0.0', () => {
   // eslint-disable-next-line no-console
   console.log(`[smartalk-bff] listening on http://0.0.0.0:${PORT}`);
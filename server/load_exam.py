@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+End-to-end load generator: N complete IELTS exams in parallel through the real scripts.
+
+Each simulated candidate runs the same sequence the frontend drives:
+  greeting TTS -> for every turn:
+    answer audio into qwen_asr_realtime_bridge.py (paced like the mic, then commit)
+    qwen_llm_examiner_stream.py with the growing history and part / questionCount
+    qwen_tts_stream.py for the examiner reply (then "listens" for its duration)
+  -> qwen_llm_feedback.py on the whole transcript
+
+Everything runs against server/dashscope_standin.py (started automatically
+unless --standin-url is given), so only this box's CPU is being measured.
+
+Turn latency = commit -> ASR final + examiner (spawn -> final) + TTS (spawn -> first audio),
+i.e. what a candidate waits between "stop" and hearing the next question.
+
+Per load level it reports turn latency p50/p95/p99, CPU seconds per session
+(children rusage), peak RSS per session (sampled from /proc), box CPU use,
+and finally the saturation point: the largest level whose p95 stays within
+--slo-factor of the single-session p95 while CPU stays below --cpu-limit.
+
+Usage:
+  python3 server/load_exam.py --levels 1,2,4,8 --answer-scale 0.25 --audio-speed 2
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+import asr_replay  # noqa: E402
+
+# (part, questionCount) sent with each examiner call, and the candidate answer (seconds) that precedes it.
+# Mirrors the intended exam: name -> Part 1 x4 -> cue card -> long turn -> Part 3 x3 -> conclusion.
+EXAM_PLAN = [
+    (1, 0, 3), (1, 1, 6), (1, 2, 6), (1, 3, 6),
+    (2, 0, 6),
+    (3, 0, 60), (3, 1, 12), (3, 2, 12),
+    (4, 0, 12),
+]
+GREETING = "Good morning. My name is Alex and I will be your examiner today. Could you tell me your full name, please?"
+
+
+def _pct(values, p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _answer_pcm(seconds: float, seed: int) -> bytes:
+    """Speech-like 16 kHz PCM16: syllable-rate bursts of a pitched buzz with pauses (no numpy needed)."""
+    import array
+
+    rng = random.Random(seed)
+    n = int(seconds * asr_replay.TARGET_RATE)
+    out = array.array("h", bytes(2 * n))
+    pos = 0
+    while pos < n:
+        seg = int(rng.uniform(0.12, 0.3) * asr_replay.TARGET_RATE)
+        if rng.random() < 0.8:
+            f0 = rng.uniform(100, 220)
+            amp = rng.uniform(2000, 8000)
+            for i in range(pos, min(n, pos + seg)):
+                env = math.sin(math.pi * (i - pos) / seg)
+                out[i] = int(amp * env * (math.sin(2 * math.pi * f0 * i / 16000) + 0.3 * rng.uniform(-1, 1)))
+        pos += seg
+    if sys.byteorder == "big":
+        out.byteswap()
+    return out.tobytes()
+
+
+def _run_lines(args, stdin: bytes, env: dict, on_line=None):
+    """Run a script, timestamp stdout JSON lines; returns (lines_with_t_ms, exit_code, wall_ms)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=ROOT_DIR, env=env, stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if stdin is not None:
+        try:
+            proc.stdin.write(stdin)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    lines = []
+    for raw in proc.stdout:
+        t_ms = (time.perf_counter() - t0) * 1000
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            obj = {"_raw": raw.decode("utf-8", errors="replace")}
+        lines.append((t_ms, obj))
+        if on_line:
+            on_line(t_ms, obj)
+    code = proc.wait()
+    return lines, code, (time.perf_counter() - t0) * 1000
+
+
+class ExamSession:
+    def __init__(self, idx: int, env: dict, answer_scale: float, audio_speed: float, listen: bool,
+                 pin_model: str = ""):
+        self.idx = idx
+        self.env = env
+        self.answer_scale = answer_scale
+        self.audio_speed = audio_speed
+        self.listen = listen
+        self.pin_model = pin_model
+        self.turns = []
+        self.errors = []
+        self.feedback_ms = None
+
+    def _tts(self, text: str):
+        first = [None]
+
+        def on_line(t_ms, obj):
+            if obj.get("event") == "audio" and first[0] is None:
+                first[0] = t_ms
+
+        lines, code, wall = _run_lines([sys.executable, "server/qwen_tts_stream.py", "--text", text], None, self.env, on_line)
+        duration = next((o.get("duration_ms") for _, o in lines if o.get("event") == "response_done"), None)
+        if code != 0 or first[0] is None:
+            self.errors.append(f"tts exit={code}")
+        return first[0], duration or 0.0, wall
+
+    def _examiner(self, history, part: int, qc: int):
+        # 和前端一样不指定模型，走 model_router 的分档与 SLO 降级；--pin-model 时才固定
+        payload = {"messages": history, "part": part, "questionCount": qc}
+        if self.pin_model:
+            payload["model"] = self.pin_model
+        first = [None]
+
+        def on_line(t_ms, obj):
+            if obj.get("type") == "delta" and first[0] is None:
+                first[0] = t_ms
+
+        lines, code, wall = _run_lines([sys.executable, "server/qwen_llm_examiner_stream.py"],
+                                       json.dumps(payload).encode("utf-8"), self.env, on_line)
+        final = next((o for _, o in lines if o.get("type") == "final"), None)
+        if code != 0 or final is None:
+            self.errors.append(f"examiner exit={code}")
+            return None, first[0], wall
+        return final.get("text", ""), first[0], wall
+
+    def _listen(self, duration_ms: float) -> None:
+        if self.listen and duration_ms:
+            time.sleep(duration_ms / 1000 / max(self.audio_speed, 1e-3))
+
+    def run(self) -> None:
+        history = [{"role": "assistant", "text": GREETING}]
+        _, dur, _ = self._tts(GREETING)
+        self._listen(dur)
+
+        for turn_no, (part, qc, answer_s) in enumerate(EXAM_PLAN, 1):
+            pcm = _answer_pcm(max(0.5, answer_s * self.answer_scale), seed=self.idx * 100 + turn_no)
+            res = asr_replay.replay(pcm, "bridge", self.audio_speed, asr_replay.DEFAULT_CHUNK_MS, [], 15.0, "en", self.env)
+            asr_ms = res["commits"][-1]["final_ms"] if res["commits"] else None
+            final = next((e["msg"]["text"] for e in res["events"] if e["dir"] == "in" and e["msg"].get("event") == "final"), "")
+            if asr_ms is None:
+                self.errors.append(f"asr turn {turn_no}: no final")
+                continue
+            history.append({"role": "user", "text": final})
+
+            text, llm_first_ms, llm_ms = self._examiner(history, part, qc)
+            if text is None:
+                continue
+            history.append({"role": "assistant", "text": text})
+
+            tts_first_ms, dur, _ = self._tts(text)
+            if tts_first_ms is None:
+                continue
+            self.turns.append({
+                "turn": turn_no, "part": part,
+                "asr_final_ms": asr_ms, "llm_first_ms": llm_first_ms, "llm_ms": llm_ms, "tts_first_ms": tts_first_ms,
+                "turn_ms": asr_ms + llm_ms + tts_first_ms,
+            })
+            self._listen(dur)
+
+        transcript = [{"role": "examiner" if m["role"] == "assistant" else "candidate", "text": m["text"]} for m in history]
+        lines, code, wall = _run_lines([sys.executable, "server/qwen_llm_feedback.py"],
+                                       json.dumps({"transcript": transcript}).encode("utf-8"), self.env)
+        self.feedback_ms = wall if code == 0 else None
+        if code != 0:
+            self.errors.append(f"feedback exit={code}")
+
+
+class RssSampler:
+    """Peak of the summed RSS of our child processes (Linux /proc), sampled periodically."""
+
+    def __init__(self, exclude=(), interval: float = 0.2):
+        self.exclude = set(exclude)
+        self.interval = interval
+        self.peak_kb = 0
+        self.peak_procs = 0
+        self._stop = threading.Event()
+        self._page_kb = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _children(self):
+        me = os.getpid()
+        for name in os.listdir("/proc"):
+            if not name.isdigit() or int(name) in self.exclude:
+                continue
+            try:
+                with open(f"/proc/{name}/stat", "rb") as f:
+                    stat = f.read()
+                ppid = int(stat[stat.rfind(b")") + 2:].split()[1])
+                if ppid != me:
+                    continue
+                with open(f"/proc/{name}/statm", "rb") as f:
+                    yield int(f.read().split()[1]) * self._page_kb
+            except (OSError, ValueError, IndexError):
+                continue
+
+    def _run(self):
+        if not os.path.isdir("/proc"):
+            return
+        while not self._stop.wait(self.interval):
+            rss = list(self._children())
+            total = sum(rss)
+            if total > self.peak_kb:
+                self.peak_kb = total
+                self.peak_procs = len(rss)
+
+
+def run_level(n: int, env: dict, args, standin_pid: int) -> dict:
+    sessions = [ExamSession(i, env, args.answer_scale, args.audio_speed, not args.no_listen, args.pin_model)
+                for i in range(n)]
+    ru0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    sampler = RssSampler(exclude=[standin_pid] if standin_pid else ()).start()
+    t0 = time.perf_counter()
+
+    def start(s: ExamSession):
+        time.sleep(random.uniform(0, args.stagger_s))
+        s.run()
+
+    threads = [threading.Thread(target=start, args=(s,), daemon=True) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    sampler.stop()
+    ru1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu_s = (ru1.ru_utime - ru0.ru_utime) + (ru1.ru_stime - ru0.ru_stime)
+    turns = [t for s in sessions for t in s.turns]
+    turn_ms = [t["turn_ms"] for t in turns]
+    return {
+        "sessions": n,
+        "wall_s": wall,
+        "turns": len(turns),
+        "errors": sum(len(s.errors) for s in sessions),
+        "p50": _pct(turn_ms, 50), "p95": _pct(turn_ms, 95), "p99": _pct(turn_ms, 99),
+        "asr_p95": _pct([t["asr_final_ms"] for t in turns], 95),
+        "llm_p95": _pct([t["llm_ms"] for t in turns], 95),
+        "tts_p95": _pct([t["tts_first_ms"] for t in turns], 95),
+        "feedback_p95": _pct([s.feedback_ms for s in sessions if s.feedback_ms], 95),
+        "cpu_s_per_session": cpu_s / n,
+        "rss_mb_per_session": sampler.peak_kb / 1024 / n,
+        "peak_procs": sampler.peak_procs,
+        "cpu_util": cpu_s / (wall * (os.cpu_count() or 1)),
+    }
+
+
+def _wait_port(host: str, port: int, timeout: float = 20.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent end-to-end exam load generator (against the local stand-in)")
+    parser.add_argument("--levels", default="1,2,4,8", help="Concurrent sessions per step")
+    parser.add_argument("--answer-scale", type=float, default=1.0, help="Scale candidate answer lengths (Part 2 = 60 s x scale)")
+    parser.add_argument("--audio-speed", type=float, default=1.0, help="Mic pacing / listening speed-up (1 = realtime)")
+    parser.add_argument("--no-listen", action="store_true", help="Do not wait for the examiner audio to 'play'")
+    parser.add_argument("--pin-model", default="", help="Send this examiner model (bypasses the model router)")
+    parser.add_argument("--stagger-s", type=float, default=2.0, help="Random start offset per session")
+    parser.add_argument("--slo-factor", type=float, default=1.5, help="Saturated once p95 exceeds this x the 1-session p95")
+    parser.add_argument("--cpu-limit", type=float, default=0.85, help="Saturated once box CPU use exceeds this")
+    parser.add_argument("--standin-url", default="", help="Use a running stand-in, e.g. http://127.0.0.1:18080")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--json", default="", help="Also write the per-level results here")
+    args = parser.parse_args()
+
+    levels = sorted({int(x) for x in args.levels.split(",") if x.strip()})
+    standin = None
+    if args.standin_url:
+        base = args.standin_url.rstrip("/")
+    else:
+        base = f"http://127.0.0.1:{args.port}"
+        standin = subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "dashscope_standin.py"), "--port", str(args.port)],
+                                   stderr=subprocess.DEVNULL)
+        if not _wait_port("127.0.0.1", args.port):
+            sys.stderr.write("[ERROR] stand-in did not start\n")
+            standin.kill()
+            return 1
+
+    ws_base = base.replace("http", "ws", 1) + "/api-ws/v1/realtime"
+    env = dict(os.environ)
+    env.update({
+        "DASHSCOPE_API_KEY": env.get("DASHSCOPE_API_KEY") or "standin",
+        "DASHSCOPE_BASE_HTTP_API_URL": base + "/api/v1",
+        "DASHSCOPE_ASR_WS_URL": ws_base,
+        "DASHSCOPE_TTS_WS_URL": ws_base,
+    })
+    env.pop("ASR_ARCHIVE_DIR", None)
+
+    cores = os.cpu_count() or 1
+    results = []
+    try:
+        print(f"cores={cores} answer_scale={args.answer_scale} audio_speed={args.audio_speed} plan={len(EXAM_PLAN)} turns/exam "
+              f"model={args.pin_model or 'routed'}")
+        print(f"{'sessions':>8} {'turns':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'asr95':>7} {'llm95':>7} {'tts95':>7} {'cpu s/sess':>10} {'rss MB/sess':>11} {'box cpu':>8} {'wall s':>7}")
+        for n in levels:
+            r = run_level(n, env, args, standin.pid if standin else 0)
+            results.append(r)
+            print(f"{n:8d} {r['turns']:6d} {r['errors']:4d} {r['p50']:8.0f} {r['p95']:8.0f} {r['p99']:8.0f} "
+                  f"{r['asr_p95']:7.0f} {r['llm_p95']:7.0f} {r['tts_p95']:7.0f} {r['cpu_s_per_session']:10.2f} "
+                  f"{r['rss_mb_per_session']:11.1f} {r['cpu_util'] * 100:7.0f}% {r['wall_s']:7.1f}")
+            sys.stdout.flush()
+    finally:
+        if standin:
+            standin.terminate()
+            standin.wait()
+
+    base_p95 = results[0]["p95"] if results else float("nan")
+    ok = [r for r in results if r["errors"] == 0 and r["p95"] <= base_p95 * args.slo_factor and r["cpu_util"] < args.cpu_limit]
+    knee = max((r["sessions"] for r in ok), default=0)
+    print(f"saturation: {knee} concurrent sessions within p95 <= {args.slo_factor}x{base_p95:.0f}ms "
+          f"and CPU < {args.cpu_limit:.0%} -> {knee / cores:.2f} sessions/core"
+          + (" (not reached; try higher --levels)" if results and knee == results[-1]["sessions"] else ""))
+    if results:
+        # CPU-bound ceiling: how many exams the cores could sustain if latency did not matter
+        r = results[0]
+        print(f"cpu-bound ceiling: {cores * r['wall_s'] / max(r['cpu_s_per_session'], 1e-6):.1f} sessions "
+              f"({r['wall_s'] / max(r['cpu_s_per_session'], 1e-6):.1f}/core at {r['cpu_s_per_session']:.2f} cpu-s over {r['wall_s']:.0f}s)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cores": cores, "levels": results, "saturation_sessions": knee}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Server-side model routing for the examiner turns.
+
+Every turn maps to a route "<part>/<action>" (the same part / questionCount
+that pick the system prompt). Each route has a policy: model tiers in order
+of preference, an output cap (max_tokens) and latency SLOs for the p95 time
+to first token and the p95 total stream time. The router takes the first
+tier that meets both SLOs over the last ROUTER_WINDOW_S seconds and falls
+through to the next (faster) tier when it does not. A model with fewer than
+ROUTER_MIN_SAMPLES recent samples counts as healthy, so traffic drifts back
+to the preferred tier once its breached samples age out.
+
+TTFT is kept per model; total time depends on how long the route's replies
+are, so it is kept per (model, route). Every examiner run is its own
+process, so the samples live in ROUTER_STATE_FILE (default
+server/.router_state.json), read and rewritten under an flock like the
+hedge state. ROUTER_POLICY_FILE (JSON, same shape as ROUTES) replaces
+individual routes.
+
+A `model` in the request payload pins the model for that turn (reason
+"pinned"); the frontend no longer sends one.
+"""
+import json
+import os
+import time
+
+from hedge import locked_state
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".router_state.json")
+MAX_SAMPLES = 200  # per model (ttft) and per (model, route) (total)
+
+ROUTES = {
+    "0/greet": {"tiers": ["qwen-turbo", "qwen-flash"], "max_tokens": 60, "slo_ttft_ms": 800, "slo_total_ms": 1500},
+    "1/ask": {"tiers": ["qwen-turbo", "qwen-flash"], "max_tokens": 60, "slo_ttft_ms": 800, "slo_total_ms": 1500},
+    "1/transition": {"tiers": ["qwen-plus", "qwen-turbo"], "max_tokens": 250, "slo_ttft_ms": 1200, "slo_total_ms": 5000},
+    "2/cue_card": {"tiers": ["qwen-plus", "qwen-turbo"], "max_tokens": 250, "slo_ttft_ms": 1200, "slo_total_ms": 5000},
+    "3/discuss": {"tiers": ["qwen-plus", "qwen-turbo"], "max_tokens": 120, "slo_ttft_ms": 1200, "slo_total_ms": 3000},
+    "3/wrap_up": {"tiers": ["qwen-plus", "qwen-turbo"], "max_tokens": 120, "slo_ttft_ms": 1200, "slo_total_ms": 3000},
+    "4/end": {"tiers": ["qwen-turbo", "qwen-flash"], "max_tokens": 40, "slo_ttft_ms": 800, "slo_total_ms": 1200},
+}
+
+
+def state_file() -> str:
+    return os.getenv("ROUTER_STATE_FILE", "") or DEFAULT_FILE
+
+
+def turn_action(part: int, question_count: int) -> str:
+    """What the examiner is about to do; mirrors build_system_prompt_for_part."""
+    if part == 0:
+        return "greet"
+    if part == 1:
+        return "transition" if question_count >= 4 else "ask"
+    if part == 2:
+        return "cue_card"
+    if part == 3:
+        return "wrap_up" if question_count >= 3 else "discuss"
+    return "end"
+
+
+def load_routes() -> dict:
+    routes = dict(ROUTES)
+    path = os.getenv("ROUTER_POLICY_FILE", "")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            routes.update(json.load(f))
+    return routes
+
+
+def _p95(vals):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(0.95 * len(vals)))]
+
+
+class ModelRouter:
+    def __init__(self, path: str = "", routes: dict = None):
+        self.path = path or state_file()
+        self.routes = routes if routes is not None else load_routes()
+        self.window_s = float(os.getenv("ROUTER_WINDOW_S", "600"))
+        self.min_samples = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+
+    def _recent(self, samples, now: float):
+        return [ms for t, ms in samples if now - t <= self.window_s]
+
+    def route(self, part: int, question_count: int, pinned: str = "") -> dict:
+        """{"key", "model", "tier", "reason", "max_tokens"} for this turn."""
+        key = f"{part}/{turn_action(part, question_count)}"
+        policy = self.routes.get(key) or self.routes["1/ask"]
+        out = {"key": key, "max_tokens": policy.get("max_tokens")}
+        if pinned:
+            return {**out, "model": pinned, "tier": None, "reason": "pinned"}
+
+        now = time.time()
+        try:
+            with locked_state(self.path) as state:
+                models = state.get("models", {})
+        except OSError:
+            models = {}
+
+        breaches = []
+        fastest = None  # (ttft p95, tier) over tiers that all breach
+        for tier, model in enumerate(policy["tiers"]):
+            stats = models.get(model, {})
+            ttft = self._recent(stats.get("ttft", []), now)
+            total = self._recent(stats.get("total", {}).get(key, []), now)
+            p95_ttft = _p95(ttft) if len(ttft) >= self.min_samples else None
+            p95_total = _p95(total) if len(total) >= self.min_samples else None
+            if p95_ttft is not None and p95_ttft > policy["slo_ttft_ms"]:
+                breaches.append(f"{model} ttft p95 {p95_ttft:.0f}ms > {policy['slo_ttft_ms']}ms")
+            elif p95_total is not None and p95_total > policy["slo_total_ms"]:
+                breaches.append(f"{model} total p95 {p95_total:.0f}ms > {policy['slo_total_ms']}ms")
+            else:
+                reason = "policy" if not tier else "slo: " + "; ".join(breaches)
+                return {**out, "model": model, "tier": tier, "reason": reason}
+            if fastest is None or (p95_ttft or 0) < fastest[0]:
+                fastest = (p95_ttft or 0, tier)
+        # 所有档位都超 SLO：选首 token 最快的那个
+        tier = fastest[1]
+        return {**out, "model": policy["tiers"][tier], "tier": tier, "reason": "slo (all tiers): " + "; ".join(breaches)}
+
+    def record(self, route: dict, model: str, ttft_ms: float, total_ms: float) -> None:
+        """Add one completed turn's latencies for `model` on `route`."""
+        now = round(time.time(), 1)
+        try:
+            with locked_state(self.path) as state:
+                stats = state.setdefault("models", {}).setdefault(model, {"ttft": [], "total": {}})
+                stats["ttft"] = (stats["ttft"] + [[now, round(ttft_ms, 1)]])[-MAX_SAMPLES:]
+                totals = stats.setdefault("total", {})
+                totals[route["key"]] = (totals.get(route["key"], []) + [[now, round(total_ms, 1)]])[-MAX_SAMPLES:]
+        except OSError:
+            pass
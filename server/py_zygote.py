@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Pre-fork zygote for the one-shot Python bridges.
+
+The zygote imports dashscope / websocket and the SDK submodules once, then
+listens on a local Unix socket. Each "run script X" request forks a child
+that already has everything loaded; the child gets the client's sockets as
+its stdio, so the scripts keep working unchanged (they still just read
+stdin and write JSON lines to stdout).
+
+Protocol (one JSON header line per connection, then raw bytes):
+  conn A: {"op": "run", "id": "<token>", "script": "server/x.py", "argv": [...], "env": {...}, "cwd": "..."}
+          -> becomes the child's stdin (client -> zygote) and stdout (zygote -> client)
+  conn B: {"op": "stderr", "id": "<token>"}
+          -> becomes the child's stderr; the zygote also writes control frames on it:
+             b"\\0PID <pid>\\n" after fork and b"\\0EXIT <code>\\n" after the child exits
+             (negative code = killed by signal)
+
+Note: the SDK reads some env vars at import time, so start the zygote with
+the same environment as the Node server.
+
+Usage:
+  python3 server/py_zygote.py [--socket /tmp/smartalk-pyzygote.sock]
+  PY_ZYGOTE_SOCKET=/tmp/smartalk-pyzygote.sock npm run dev:server
+"""
+import argparse
+import builtins
+import io
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+import traceback
+import uuid
+
+DEFAULT_SOCKET = "/tmp/smartalk-pyzygote.sock"
+HEADER_LIMIT = 1 << 20
+PENDING_TIMEOUT_S = 10.0
+
+# 预加载：所有桥接脚本共用的重模块（导入失败只记录，不影响其余脚本）
+PRELOAD = (
+    "json",
+    "base64",
+    "threading",
+    "argparse",
+    "orjson",
+    "websocket",
+    "dashscope",
+    "dashscope.audio.qwen_tts_realtime",
+    "dashscope.audio.qwen_omni",
+)
+
+
+def _preload() -> None:
+    for name in PRELOAD:
+        t0 = time.perf_counter()
+        try:
+            __import__(name)
+        except Exception as e:
+            sys.stderr.write(f"[ZYGOTE] preload {name} failed: {e}\n")
+            continue
+        sys.stderr.write(f"[ZYGOTE] preloaded {name} in {(time.perf_counter() - t0) * 1000:.1f}ms\n")
+    sys.stderr.flush()
+
+
+class _CodeCache:
+    """Compiled script code objects, keyed by path and invalidated by mtime."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, path: str):
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._entries.get(path)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        with open(path, "rb") as f:
+            code = compile(f.read(), path, "exec")
+        self._entries[path] = (mtime, code)
+        return code
+
+
+def _read_header(conn: socket.socket):
+    """Read one header line without consuming any payload bytes that follow it."""
+    data = conn.recv(HEADER_LIMIT, socket.MSG_PEEK)
+    if not data:
+        raise ConnectionError("closed before header")
+    idx = data.find(b"\n")
+    if idx < 0:
+        if len(data) >= HEADER_LIMIT:
+            raise ValueError("header too large")
+        return None
+    conn.recv(idx + 1)
+    return json.loads(data[:idx])
+
+
+def _run_child(run_conn: socket.socket, err_conn: socket.socket, req: dict, code) -> None:
+    """Runs in the forked child; never returns."""
+    exit_code = 1
+    try:
+        os.dup2(run_conn.fileno(), 0)
+        os.dup2(run_conn.fileno(), 1)
+        os.dup2(err_conn.fileno(), 2)
+        run_conn.close()
+        err_conn.close()
+
+        sys.stdin = io.open(0, "r", encoding="utf-8", closefd=False)
+        sys.stdout = io.open(1, "w", encoding="utf-8", closefd=False)
+        sys.stderr = io.open(2, "w", encoding="utf-8", errors="backslashreplace", buffering=1, closefd=False)
+
+        script = req["script"]
+        if req.get("cwd"):
+            os.chdir(req["cwd"])
+        if isinstance(req.get("env"), dict):
+            os.environ.clear()
+            os.environ.update({str(k): str(v) for k, v in req["env"].items()})
+        sys.argv = [script] + [str(a) for a in req.get("argv") or []]
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+
+        g = {"__name__": "__main__", "__file__": script, "__builtins__": builtins}
+        try:
+            exec(code, g)
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                sys.stderr.write(f"{e.code}\n")
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(exit_code & 0xFF)
+
+
+class Zygote:
+    def __init__(self, path: str):
+        self.path = path
+        self.codes = _CodeCache()
+        self.sel = selectors.DefaultSelector()
+        self.pending = {}  # id -> {"run": (conn, req), "stderr": conn, "since": t}
+        self.children = {}  # pid -> stderr conn
+        self._wake_r, self._wake_w = socket.socketpair()
+
+    def serve(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        old_umask = os.umask(0o177)
+        try:
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        signal.set_wakeup_fd(self._wake_w.fileno())
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+
+        self.sel.register(self.listener, selectors.EVENT_READ, "accept")
+        self.sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        sys.stderr.write(f"[ZYGOTE] listening on {self.path} (pid={os.getpid()})\n")
+        sys.stderr.flush()
+
+        while True:
+            for key, _ in self.sel.select(timeout=1.0):
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wake":
+                    try:
+                        while self._wake_r.recv(512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._on_header(key.fileobj)
+            self._reap()
+            self._expire_pending()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except BlockingIOError:
+                return
+            conn.setblocking(False)
+            self.sel.register(conn, selectors.EVENT_READ, time.monotonic())
+
+    def _on_header(self, conn: socket.socket) -> None:
+        try:
+            req = _read_header(conn)
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            sys.stderr.write(f"[ZYGOTE] bad connection: {e}\n")
+            self.sel.unregister(conn)
+            conn.close()
+            return
+        if req is None:
+            return
+        self.sel.unregister(conn)
+        conn.setblocking(True)
+
+        op = req.get("op")
+        rid = str(req.get("id") or "")
+        if op not in ("run", "stderr") or not rid:
+            conn.close()
+            return
+        slot = self.pending.setdefault(rid, {"since": time.monotonic()})
+        slot["run" if op == "run" else "stderr"] = (conn, req) if op == "run" else conn
+        if "run" in slot and "stderr" in slot:
+            del self.pending[rid]
+            self._fork(slot["run"][0], slot["stderr"], slot["run"][1])
+
+    def _fork(self, run_conn: socket.socket, err_conn: socket.socket, req: dict) -> None:
+        try:
+            code = self.codes.get(req["script"] if os.path.isabs(req["script"])
+                                  else os.path.join(req.get("cwd") or os.getcwd(), req["script"]))
+        except Exception as e:
+            err_conn.sendall(f"[ZYGOTE] cannot load {req.get('script')}: {e}\n\0EXIT 1\n".encode("utf-8"))
+            run_conn.close()
+            err_conn.close()
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self.sel.close()
+            self.listener.close()
+            self._wake_r.close()
+            self._wake_w.close()
+            for slot in self.pending.values():
+                for item in (slot.get("run"), slot.get("stderr")):
+                    if item:
+                        (item[0] if isinstance(item, tuple) else item).close()
+            for conn in self.children.values():
+                conn.close()
+            _run_child(run_conn, err_conn, req, code)
+
+        run_conn.close()
+        self.children[pid] = err_conn
+        try:
+            err_conn.sendall(f"\0PID {pid}\n".encode("ascii"))
+        except OSError:
+            pass
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            try:
+                conn.sendall(f"\0EXIT {code}\n".encode("ascii"))
+            except OSError:
+                pass
+            conn.close()
+
+    def _expire_pending(self) -> None:
+        now = time.monotonic()
+        for rid in [r for r, s in self.pending.items() if now - s["since"] > PENDING_TIMEOUT_S]:
+            slot = self.pending.pop(rid)
+            for item in (slot.get("run"), slot.get("stderr")):
+                if item:
+                    (item[0] if isinstance(item, tuple) else item).close()
+
+
+def connect_and_run(sock_path: str, script: str, argv=(), env=None, cwd=None):
+    """
+    Client helper: ask the zygote to run `script`.
+    Returns (stdio_sock, stderr_sock); write stdin to / read stdout from the first,
+    read stderr and the \\0PID/\\0EXIT control frames from the second.
+    """
+    rid = uuid.uuid4().hex
+    err = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    err.connect(sock_path)
+    err.sendall((json.dumps({"op": "stderr", "id": rid}) + "\n").encode("utf-8"))
+    run = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    run.connect(sock_path)
+    header = {
+        "op": "run",
+        "id": rid,
+        "script": script,
+        "argv": list(argv),
+        "env": dict(os.environ if env is None else env),
+        "cwd": cwd or os.getcwd(),
+    }
+    run.sendall((json.dumps(header) + "\n").encode("utf-8"))
+    return run, err
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-fork zygote for the Python bridges")
+    parser.add_argument("--socket", default=os.getenv("PY_ZYGOTE_SOCKET", DEFAULT_SOCKET))
+    args = parser.parse_args()
+
+    _preload()
+    zygote = Zygote(args.socket)
+    try:
+        zygote.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,31 +3,449 @@ import json
 import os
 import sys
 import threading
+import time
+from collections import deque
+
 import websocket
 
+from event_writer import EventWriter, frame
+
+DEFAULT_RESYNC_EVERY = 20
+# 断线重连时可重放的最近音频（秒）；覆盖一段 Part 2 长回答的未提交部分
+DEFAULT_RING_SECONDS = 30.0
+DEFAULT_RECONNECT_ATTEMPTS = 5
+RECONNECT_BACKOFF_S = (0.2, 0.5, 1.0, 2.0, 3.0)
+RECONNECT_HANDSHAKE_TIMEOUT_S = 10.0
+# 上行发送队列：约 64 x 85ms ≈ 5.4s 音频；满了以后按策略处理
+DEFAULT_SEND_QUEUE = 64
+SEND_POLICIES = ("block", "merge", "drop_oldest")
+DEFAULT_SEND_POLICY = "merge"
+MERGE_MAX_BYTES = 32000  # merge 模式下单条 append 最多 1s 音频
+DEFAULT_QUEUE_REPORT_MS = 1000
+# 会话中途改配置：新会话在后台握手，旧会话在交出最后一个 final 后关闭（最多等这么久）
+RETIRE_TIMEOUT_S = 10.0
+# 分段模式（Part 2 长回答）：开放段至少这么长后，遇到这么长的停顿就自动 commit；再长也不超过 max
+DEFAULT_SEGMENT_PAUSE_MS = 500
+DEFAULT_SEGMENT_MIN_S = 4.0
+DEFAULT_SEGMENT_MAX_S = 15.0
+SEGMENT_FLOOR_WINDOW = 96  # chunk levels kept for the noise floor (~8 s of 85 ms chunks)
+SEGMENT_ABOVE_FLOOR_DB = 10.0
+SEGMENT_MIN_SPEECH_DBFS = -55.0
+
+# 固定内容的下行事件：启动时编码一次
+OPEN = frame({"event": "open"})
+SESSION_UPDATED = frame({"event": "session_updated"})
+SPEECH_START = frame({"event": "speech_start"})
+SPEECH_STOP = frame({"event": "speech_stop"})
+
+
+class PartialDeltaEncoder:
+    """
+    Turn successive partial transcripts into small deltas.
+
+    Each delta says "keep the first `keep` characters of the previous text,
+    then append `text`". Every `resync_every` updates (and whenever the delta
+    would not be smaller) the full text is sent instead, so a client that
+    missed something recovers quickly. `seq` increases by one per update.
+    """
+
+    def __init__(self, resync_every: int = DEFAULT_RESYNC_EVERY):
+        self.resync_every = max(1, resync_every)
+        self.reset()
+
+    def reset(self) -> None:
+        self._last = ""
+        self._seq = 0
+        self._since_full = 0
+
+    def encode(self, text: str):
+        if text == self._last:
+            return None
+        keep = len(os.path.commonprefix([self._last, text]))
+        suffix = text[keep:]
+        self._seq += 1
+        self._since_full += 1
+        self._last = text
+        if self._seq == 1 or self._since_full >= self.resync_every or len(suffix) >= len(text):
+            self._since_full = 0
+            return {"event": "partial", "text": text, "seq": self._seq}
+        return {"event": "partial_delta", "keep": keep, "text": suffix, "seq": self._seq}
+
+
+class PauseSegmenter:
+    """
+    Where to cut a long answer into separately committed segments.
+
+    Each chunk is speech when its level is SEGMENT_ABOVE_FLOOR_DB over the
+    noise floor (10th percentile of recent chunk levels) and above
+    SEGMENT_MIN_SPEECH_DBFS. `feed()` returns "pause" once the open segment
+    is at least `min_s` long, has had speech, and ends in `pause_ms` of
+    silence; "max" when it reaches `max_s` regardless; otherwise None.
+    A cut starts a new segment.
+    """
+
+    def __init__(self, sample_rate: int = 16000, pause_ms: int = DEFAULT_SEGMENT_PAUSE_MS,
+                 min_s: float = DEFAULT_SEGMENT_MIN_S, max_s: float = DEFAULT_SEGMENT_MAX_S):
+        import numpy as np
+
+        self._np = np
+        self.sample_rate = sample_rate
+        self.pause_ms = max(100, pause_ms)
+        self.min_ms = max(0.0, min_s * 1000)
+        self.max_ms = max(self.min_ms + 1000, max_s * 1000)
+        self._levels = deque(maxlen=SEGMENT_FLOOR_WINDOW)
+        self.cuts = {"pause": 0, "max": 0}
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new segment (the noise floor is kept)."""
+        self._seg_ms = 0.0
+        self._silence_ms = 0.0
+        self._speech = False
+
+    def feed(self, pcm: bytes):
+        np = self._np
+        x = np.frombuffer(pcm[: len(pcm) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+        if not len(x):
+            return None
+        ms = len(x) * 1000 / self.sample_rate
+        level = 10.0 * np.log10(float(np.mean(x * x)) + 1e-10)
+        self._levels.append(level)
+        floor = float(np.percentile(self._levels, 10))
+        self._seg_ms += ms
+        if level > max(floor + SEGMENT_ABOVE_FLOOR_DB, SEGMENT_MIN_SPEECH_DBFS):
+            self._speech = True
+            self._silence_ms = 0.0
+        else:
+            self._silence_ms += ms
+        reason = None
+        if self._seg_ms >= self.max_ms:
+            reason = "max"
+        elif self._speech and self._seg_ms >= self.min_ms and self._silence_ms >= self.pause_ms:
+            reason = "pause"
+        if reason:
+            self.cuts[reason] += 1
+            self.reset()
+        return reason
+
+
+class AudioRing:
+    """
+    Audio the upstream may not have turned into a final yet, bounded to
+    `max_seconds`, kept as the original base64 chunks so replay costs no
+    re-encoding.
+
+    Audio is grouped into segments: the open (uncommitted) one, plus any
+    committed segments still waiting for their final. A final drops the
+    oldest committed segment. When the bound is hit the oldest audio goes
+    first; replay reports how much of the unfinalized audio that cost.
+    """
+
+    def __init__(self, max_seconds: float = DEFAULT_RING_SECONDS, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+        self.max_bytes = max(0, int(max_seconds * sample_rate)) * 2
+        self._segments = deque()  # {"chunks": deque[(b64, nbytes)], "bytes", "lost", "committed"}
+        self._bytes = 0
+        self._evicted_commits = 0  # committed segments fully evicted before their final arrived
+        self._evicted_lost = 0
+        self._lock = threading.Lock()
+
+    def append(self, b64: str, nbytes: int) -> None:
+        with self._lock:
+            if not self._segments or self._segments[-1]["committed"]:
+                self._segments.append({"chunks": deque(), "bytes": 0, "lost": 0, "committed": False})
+            seg = self._segments[-1]
+            seg["chunks"].append((b64, nbytes))
+            seg["bytes"] += nbytes
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._segments:
+                head = self._segments[0]
+                _, n = head["chunks"].popleft()
+                head["bytes"] -= n
+                head["lost"] += n
+                self._bytes -= n
+                if not head["chunks"]:
+                    self._segments.popleft()
+                    if head["committed"]:
+                        self._evicted_commits += 1
+                        self._evicted_lost += head["lost"]
+                    else:
+                        seg["lost"] += head["lost"]
+
+    def mark_commit(self) -> None:
+        with self._lock:
+            if self._segments and not self._segments[-1]["committed"]:
+                self._segments[-1]["committed"] = True
+
+    def on_final(self) -> None:
+        with self._lock:
+            if self._evicted_commits:
+                self._evicted_commits -= 1
+                if not self._evicted_commits:
+                    self._evicted_lost = 0
+                return
+            if self._segments and self._segments[0]["committed"]:
+                self._bytes -= self._segments.popleft()["bytes"]
+
+    def snapshot(self):
+        """[(chunks, committed)] in order, and how many bytes of unfinalized audio the bound has dropped."""
+        with self._lock:
+            out = [(list(seg["chunks"]), seg["committed"]) for seg in self._segments]
+            return out, self._evicted_lost + sum(seg["lost"] for seg in self._segments)
+
+    def has_pending_commit(self) -> bool:
+        with self._lock:
+            return any(seg["committed"] for seg in self._segments)
+
+    def pending_commits(self) -> int:
+        """Committed turns whose final has not arrived yet."""
+        with self._lock:
+            return self._evicted_commits + sum(1 for seg in self._segments if seg["committed"])
+
+    def at_commit_boundary(self) -> bool:
+        """No audio has been appended since the last commit."""
+        with self._lock:
+            return not self._segments or self._segments[-1]["committed"]
+
+    def bytes_to_ms(self, n: int) -> float:
+        return round(n / 2 * 1000 / self.sample_rate, 1)
+
+    def buffered_ms(self) -> float:
+        with self._lock:
+            return self.bytes_to_ms(self._bytes)
+
+
+class UpstreamSender:
+    """
+    Sends upstream messages from a dedicated thread, so a slow upstream no
+    longer stalls the stdin loop (and, behind it, the pipe from Node).
+
+    The queue is bounded to `max_items`; when it is full, `policy` decides:
+      block        wait for room (stdin stalls, nothing is lost)
+      merge        fold the new audio into the last queued append (up to
+                   MERGE_MAX_BYTES), else block; fewer, larger frames
+      drop_oldest  discard the oldest queued audio of the open (uncommitted)
+                   turn and count it, else block
+
+    The put_* calls never block, so they are safe under the session's
+    _send_lock (which the sender thread may need for a queued call); the
+    writer waits for room with wait_room() after letting go of its locks.
+
+    While anything is queued or sending, a {"event":"send_queue"} report
+    with queue depth and send lag goes out every `report_ms`.
+    """
+
+    def __init__(self, send_fn, emit_fn, max_items: int = DEFAULT_SEND_QUEUE,
+                 policy: str = DEFAULT_SEND_POLICY, report_ms: int = DEFAULT_QUEUE_REPORT_MS):
+        self._send = send_fn
+        self._emit = emit_fn
+        self.max_items = max(1, max_items)
+        self.policy = policy if policy in SEND_POLICIES else DEFAULT_SEND_POLICY
+        self.report_s = max(0.05, report_ms / 1000)
+        self._q = deque()  # [kind, payload, nbytes, enqueued_at]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sending = False
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.merged = 0
+        self.sent_bytes = 0  # audio handed to the socket, replays included (billed per second sent)
+        self.sent_commits = 0
+        self.max_lag_ms = 0.0
+        self._window_lag_ms = 0.0
+        self._window_sent = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put_audio(self, b64: str, nbytes: int, force: bool = False) -> None:
+        with self._cond:
+            if not force and len(self._q) >= self.max_items and not self._make_room(b64, nbytes):
+                return
+            self._q.append(["audio", b64, nbytes, time.monotonic()])
+            self._cond.notify_all()
+
+    def put_commit(self) -> None:
+        with self._cond:
+            self._q.append(["commit", None, 0, time.monotonic()])
+            self._cond.notify_all()
+
+    def wait_room(self) -> None:
+        """Wait until the queue is back within `max_items` (a put may overshoot it by one)."""
+        with self._cond:
+            while len(self._q) > self.max_items and not self._closed:
+                self._cond.wait()
+
+    def put_call(self, fn) -> None:
+        """Run `fn` on the sender thread once everything queued before it has been sent."""
+        with self._cond:
+            self._q.append(["call", fn, 0, time.monotonic()])
+            self._cond.notify_all()
+
+    def _make_room(self, b64: str, nbytes: int) -> bool:
+        """Called with the queue full. False = the audio was absorbed (merged) and needs no new item."""
+        if self.policy == "drop_oldest":
+            # 只丢还没 commit 的这一轮的音频：已 commit 的轮次少了音频，final 会悄悄缺词
+            start = 0
+            for i in range(len(self._q) - 1, -1, -1):
+                if self._q[i][0] == "commit":
+                    start = i + 1
+                    break
+            for i in range(start, len(self._q)):
+                item = self._q[i]
+                if item[0] == "audio":
+                    del self._q[i]
+                    self.dropped += 1
+                    self.dropped_bytes += item[2]
+                    return True
+        elif self.policy == "merge":
+            last = self._q[-1]
+            if last[0] == "audio" and last[2] + nbytes <= MERGE_MAX_BYTES:
+                last[1] = base64.b64encode(base64.b64decode(last[1]) + base64.b64decode(b64)).decode("ascii")
+                last[2] += nbytes
+                self.merged += 1
+                return False
+        # block (or nothing to drop / merge into): queue it anyway, the writer waits in wait_room()
+        return True
+
+    def clear(self) -> None:
+        """The socket is gone: drop what is queued (the ring keeps it for replay) and unblock writers."""
+        with self._cond:
+            self._q.clear()
+            self._cond.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait until everything queued has been handed to the socket."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._q or self._sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._q)
+
+    def _run(self) -> None:
+        next_report = time.monotonic() + self.report_s
+        while True:
+            with self._cond:
+                while not self._q and not self._closed:
+                    if not self._cond.wait(timeout=max(0.0, next_report - time.monotonic())):
+                        break
+                if self._closed and not self._q:
+                    return
+                item = self._q.popleft() if self._q else None
+                depth = len(self._q)
+                self._sending = item is not None
+                self._cond.notify_all()
+            if item is not None:
+                kind, payload, nbytes, enqueued_at = item
+                event = {"type": "input_audio_buffer.append", "audio": payload} if kind == "audio" \
+                    else {"type": "input_audio_buffer.commit"}
+                try:
+                    if kind == "call":
+                        payload()
+                    else:
+                        self._send(event)
+                        if kind == "audio":
+                            self.sent_bytes += nbytes
+                        else:
+                            self.sent_commits += 1
+                except Exception as e:
+                    # 掉线的瞬间：音频还在 ring 里，重连后会重放
+                    sys.stderr.write(f"[ERROR] Failed to send {kind}: {e}\n")
+                    sys.stderr.flush()
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()
+                if kind != "call":
+                    lag_ms = (time.monotonic() - enqueued_at) * 1000
+                    self._window_lag_ms = max(self._window_lag_ms, lag_ms)
+                    self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+                    self._window_sent += 1
+            now = time.monotonic()
+            if now >= next_report:
+                if self._window_sent or depth:
+                    self._emit({
+                        "event": "send_queue",
+                        "queue_depth": depth,
+                        "send_lag_ms": round(self._window_lag_ms, 1),
+                        "sent": self._window_sent,
+                        "dropped": self.dropped,
+                        "merged": self.merged,
+                    })
+                self._window_lag_ms = 0.0
+                self._window_sent = 0
+                next_report = now + self.report_s
+
+    def stats(self) -> str:
+        return (f"send_policy={self.policy} max_lag_ms={self.max_lag_ms:.0f} merged={self.merged} "
+                f"dropped={self.dropped} dropped_bytes={self.dropped_bytes}")
+
 
 class BridgeCallback:
-    def __init__(self, send_session_update_fn):
+    def __init__(self, send_session_update_fn, partial_mode: str = "full", forward_raw: bool = True):
         self._closed = threading.Event()
         self._ready = threading.Event()  # Set when session.updated is received
         self._buf = ""
         self._send_session_update = send_session_update_fn
         self._session_configured = False
+        # partial_mode: "full" = 每次发完整 stash；"delta" = 只发变化的后缀（定期全量重同步）
+        self.partial_mode = partial_mode
+        self.forward_raw = forward_raw
+        self.partials = PartialDeltaEncoder()
+        self.archiver = None  # audio_archive.TurnArchiver when ASR_ARCHIVE_DIR is set
+        self.ring = None  # AudioRing of audio not yet finalized, replayed after a reconnect
+        # stdout is written from the ws, sender and stdin threads; counts bytes per event name
+        self.out = EventWriter(counters=True)
+        # 重连钩子（UpstreamSession 设置）：on_ready 在每次 session.updated 时调用；
+        # on_drop(code, msg) 返回 True 表示会原地重连，此时不向下游报 close / error
+        self.on_ready = None
+        self.on_drop = None
+        self.reconnecting = False
+        self._opened = False
+        self._resume_floor = 0  # 重连后上游从头重新识别，stash 追上之前的长度前不下发 partial
+        # 已 commit、final 还没齐的段：{"item", "text"(final 前是最后的 stash), "final", "last"}；
+        # last = 考生点了停止的那一段。一轮的 final 是到 last 为止各段文本的拼接
+        self._segs = []
+        self._seg_lock = threading.Lock()
+        self._open_item = None  # 当前开放段（未 commit）的上游 item_id
+        self._last_partial = None
+
+    def _emit(self, obj) -> None:
+        self.out.emit(obj)
 
     def on_open(self, ws):
-        sys.stdout.write(json.dumps({"event": "open"}) + "\n")
-        sys.stdout.flush()
+        if not self._opened:
+            self._opened = True
+            self._emit(OPEN)
         sys.stderr.write("[DEBUG] WebSocket opened\n")
         sys.stderr.flush()
 
     def on_close(self, ws, close_status_code, close_msg):
-        sys.stdout.write(json.dumps({"event": "close", "code": close_status_code, "msg": close_msg}) + "\n")
-        sys.stdout.flush()
+        if self.on_drop is not None and self.on_drop(close_status_code, close_msg):
+            sys.stderr.write(f"[DEBUG] WebSocket dropped: {close_status_code} - {close_msg}, reconnecting\n")
+            sys.stderr.flush()
+            return
+        self._emit({"event": "close", "code": close_status_code, "msg": close_msg})
         sys.stderr.write(f"[DEBUG] WebSocket closed: {close_status_code} - {close_msg}\n")
         sys.stderr.flush()
         self._closed.set()
 
     def on_message(self, ws, message):
+        # 一条上游消息产生的所有下行事件（asr 原文 + partial，final + turn_end）合并成一次写
+        with self.out.batch():
+            self._handle_message(ws, message)
+
+    def _handle_message(self, ws, message):
         try:
             data = json.loads(message)
             event_type = data.get("type", "unknown")
@@ -36,9 +454,9 @@ class BridgeCallback:
             sys.stderr.write(f"[DEBUG] Received event: {event_type}, session_configured={self._session_configured}\n")
             sys.stderr.flush()
             
-            # Forward all events
-            sys.stdout.write(json.dumps({"event": "asr", "message": data}) + "\n")
-            sys.stdout.flush()
+            # Forward all events (raw envelope; can be switched off via config forward_raw=false)
+            if self.forward_raw:
+                self._emit({"event": "asr", "message": data})
             
             # Send session.update when we receive session.created
             if event_type == "session.created":
@@ -56,48 +474,460 @@ class BridgeCallback:
             elif event_type == "session.updated":
                 sys.stderr.write("[DEBUG] Session updated, ready to receive audio\n")
                 sys.stderr.flush()
+                if self.on_ready is not None:
+                    self.on_ready()
                 self._ready.set()
             
             # Handle specific event types per official docs
             elif event_type == "conversation.item.input_audio_transcription.text":
                 # Partial/stash text
-                stash = data.get("stash", "")
-                if stash:
-                    self._buf = stash
-                    sys.stdout.write(json.dumps({"event": "partial", "text": stash}) + "\n")
-                    sys.stdout.flush()
+                self._on_stash(data.get("item_id"), data.get("stash", ""))
             
             elif event_type == "conversation.item.input_audio_transcription.completed":
-                # Final recognized text
-                transcript = data.get("transcript", "")
-                if transcript:
-                    self._buf = transcript
-                    sys.stdout.write(json.dumps({"event": "final", "text": transcript}) + "\n")
-                    sys.stdout.write(json.dumps({"event": "turn_end", "text": transcript}) + "\n")
-                    sys.stdout.flush()
-                    self._buf = ""
+                # Final recognized text (of one committed segment)
+                self._on_completed(data.get("item_id"), data.get("transcript", ""))
             
             elif event_type == "input_audio_buffer.speech_started":
-                sys.stdout.write(json.dumps({"event": "speech_start"}) + "\n")
-                sys.stdout.flush()
+                self._emit(SPEECH_START)
             
             elif event_type == "input_audio_buffer.speech_stopped":
-                sys.stdout.write(json.dumps({"event": "speech_stop"}) + "\n")
-                sys.stdout.flush()
+                self._emit(SPEECH_STOP)
                 
         except Exception as e:
             sys.stderr.write(f"[ERROR] on_message: {e}\n")
             sys.stderr.flush()
 
+    def on_commit(self, auto: bool = False, empty: bool = False) -> None:
+        """
+        The open segment was committed: by the segmenter (`auto`) or by the
+        candidate's stop. `empty`: the stop came right after an auto-commit, so
+        nothing new was committed upstream and the turn ends with the segments
+        already sent (immediately, if their finals are all in).
+        """
+        with self._seg_lock:
+            if not empty:
+                self._segs.append({"item": self._open_item, "text": self._buf, "final": False, "last": False})
+                self._buf = ""
+                self._open_item = None
+            if not auto and self._segs:
+                self._segs[-1]["last"] = True
+            turns = self._take_turns_locked()
+        for text in turns:
+            self._emit_final(text)
+
+    def has_open_segments(self) -> bool:
+        """Auto-committed segments that belong to the turn still being spoken."""
+        with self._seg_lock:
+            return bool(self._segs) and not self._segs[-1]["last"]
+
+    def _take_turns_locked(self):
+        """Texts of the turns whose segments all have their finals, oldest first; removes those segments."""
+        out = []
+        while True:
+            end = next((i for i, seg in enumerate(self._segs) if seg["last"]), None)
+            if end is None or not all(seg["final"] for seg in self._segs[: end + 1]):
+                return out
+            out.append(" ".join(seg["text"].strip() for seg in self._segs[: end + 1] if seg["text"].strip()))
+            del self._segs[: end + 1]
+
+    def _compose_locked(self) -> str:
+        """Text of the turn being spoken: its committed segments, then the open segment's stash."""
+        start = next((i + 1 for i in range(len(self._segs) - 1, -1, -1) if self._segs[i]["last"]), 0)
+        parts = [seg["text"].strip() for seg in self._segs[start:]] + [self._buf]
+        return " ".join(p for p in parts if p)
+
+    def _on_stash(self, item_id, stash: str) -> None:
+        with self._seg_lock:
+            seg = next((g for g in self._segs if item_id and g["item"] == item_id and not g["final"]), None)
+            if seg is not None:
+                # 已 commit 的段还在继续出 stash：更新它的暂定文本
+                if stash:
+                    seg["text"] = stash
+            else:
+                if stash and len(stash) < self._resume_floor:
+                    # 重放中：上游还没追上断线前的进度，保持前端已显示的文本
+                    stash = ""
+                if not stash:
+                    return
+                self._resume_floor = 0
+                self._buf = stash
+                self._open_item = item_id
+            text = self._compose_locked()
+            if not text or text == self._last_partial:
+                return
+            self._last_partial = text
+        if self.partial_mode == "delta":
+            evt = self.partials.encode(text)
+            if evt:
+                self._emit(evt)
+        else:
+            self._emit({"event": "partial", "text": text})
+
+    def _on_completed(self, item_id, transcript: str) -> None:
+        if self.ring is not None:
+            self.ring.on_final()
+        with self._seg_lock:
+            pending = [g for g in self._segs if not g["final"]]
+            seg = next((g for g in pending if item_id and g["item"] == item_id), pending[0] if pending else None)
+            if seg is None:
+                # 没有记录在案的 commit（例如服务端 VAD 自己断句）：直接作为一轮的 final
+                turns = [transcript] if transcript else []
+                index = None
+            else:
+                seg["text"] = transcript
+                seg["final"] = True
+                index = self._segs.index(seg)
+                turns = self._take_turns_locked()
+        if not turns and transcript and index is not None:
+            self._emit({"event": "segment", "index": index, "text": transcript})
+        for text in turns:
+            self._emit_final(text)
+
+    def _emit_final(self, text: str) -> None:
+        with self._seg_lock:
+            self._resume_floor = 0
+            self._last_partial = None
+            if not self._segs:
+                self.partials.reset()
+        if not text:
+            return
+        self._emit({"event": "final", "text": text})
+        self._emit({"event": "turn_end", "text": text})
+        if self.archiver is not None:
+            self.archiver.on_final(text)
+
     def on_error(self, ws, error):
         sys.stderr.write(f"[ERROR] WebSocket error: {error}\n")
         sys.stderr.flush()
-        sys.stdout.write(json.dumps({"event": "error", "message": str(error)}) + "\n")
-        sys.stdout.flush()
+        if self.reconnecting or (self.on_drop is not None and self._ready.is_set()):
+            # 掉线会走 on_close -> 原地重连；这里不通知前端，否则它会直接结束录音
+            return
+        self._emit({"event": "error", "message": str(error)})
 
     def wait_closed(self):
         self._closed.wait()
 
+    def stats_line(self) -> str:
+        parts = " ".join(f"{k}={v}" for k, v in sorted(self.out.bytes_out.items()))
+        return (f"[STATS] partial_mode={self.partial_mode} forward_raw={self.forward_raw} bytes_out: {parts} "
+                f"events={self.out.events} writes={self.out.writes}")
+
+
+class UpstreamSession:
+    """
+    The upstream realtime socket, reconnected in place when it drops.
+
+    Every audio chunk goes through the ring first and is queued on the sender
+    only while the session is live, all under one lock, so after a reconnect
+    the replayed audio and the live audio reach the new session in their
+    original order. A commit sent while reconnecting is recorded in the ring
+    and replayed too.
+
+    `reconfigure()` changes language / corpus mid-session without a gap: a
+    second socket is opened and configured in the background while audio
+    keeps flowing to the current one. At the next commit boundary new audio
+    is switched to it (in queue order, behind the old session's audio and
+    commit); the old socket stays open until it has delivered the finals it
+    owes, then is closed.
+    """
+
+    def __init__(self, url: str, headers, cb: BridgeCallback, ring: AudioRing,
+                 max_attempts: int = DEFAULT_RECONNECT_ATTEMPTS, sender_opts=None):
+        self.url = url
+        self.headers = headers
+        self.cb = cb
+        self.ring = ring
+        self.max_attempts = max(0, max_attempts)
+        self.ws = None
+        self.closing = False
+        self.reconnects = 0
+        self._live = False
+        self._send_lock = threading.Lock()
+        self._attempt = 0
+        self._attempt_ready = None
+        self._dropped_at = 0.0
+        self._tx_ws = None  # socket the sender thread writes to (lags self.ws by the queue during a switch)
+        self._next = None  # reconfigured socket being prepared: {"ws", "ready", "t0", "update"}
+        self._retiring = {}  # old socket -> finals it still owes after a switch
+        self._deferred_update = None  # reconfigure() before the first session.updated
+        self.reconfigures = 0
+        self.sender = UpstreamSender(self.send, cb._emit, **(sender_opts or {}))
+        cb.ring = ring
+        cb.on_ready = self._on_ready
+        cb.on_drop = self._on_drop
+
+    def connect(self) -> None:
+        """Open a new socket (callbacks from sockets we have replaced are ignored)."""
+        cb = self.cb
+
+        def routed(fn):
+            return lambda ws, *a: fn(ws, *a) if ws is self.ws else None
+
+        self.ws = websocket.WebSocketApp(
+            self.url,
+            header=self.headers,
+            on_open=routed(cb.on_open),
+            on_message=routed(cb.on_message),
+            on_error=routed(cb.on_error),
+            on_close=routed(cb.on_close),
+        )
+        self._tx_ws = self.ws
+        t = threading.Thread(target=self.ws.run_forever)
+        t.daemon = True
+        t.start()
+        self._thread = t
+
+    def send(self, event: dict) -> None:
+        self._tx_ws.send(json.dumps(event))
+
+    def send_audio(self, b64: str, nbytes: int) -> None:
+        with self._send_lock:
+            self.ring.append(b64, nbytes)
+            if self._live:
+                self.sender.put_audio(b64, nbytes)
+        # 等队列腾位置时不能持有 _send_lock：发送线程执行 put_call（_retire）时要拿这把锁
+        self.sender.wait_room()
+
+    def commit(self) -> None:
+        with self._send_lock:
+            self.ring.mark_commit()
+            if self._live:
+                self.sender.put_commit()
+                if self._next is not None and self._next["ready"]:
+                    self._switch_locked()
+        self.sender.wait_room()
+
+    def close(self) -> None:
+        self.closing = True
+        # 先把队列里已收下的音频/commit 发完，再关连接
+        if self._live:
+            self.sender.drain(2.0)
+        self.sender.close()
+        with self._send_lock:
+            self._cancel_next_locked()
+            others = list(self._retiring)
+            self._retiring.clear()
+        for ws in [self.ws] + others:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    # ---- mid-session reconfiguration ----
+
+    def reconfigure(self, build_update) -> None:
+        """Prepare a socket configured with `build_update()` (a session.update event) and switch to it."""
+        with self._send_lock:
+            self._cancel_next_locked()
+            if self.closing or self.ws is None:
+                return
+            if not self._live:
+                # 握手/重连中：session.update 还没发就直接带上新配置；已按旧配置发出则就绪后再切
+                if self.cb._session_configured:
+                    self._deferred_update = build_update
+                return
+            nxt = {"ws": None, "ready": False, "t0": time.monotonic(), "update": build_update}
+            self._next = nxt
+
+        def on_message(ws, message):
+            if self._next is not nxt:
+                return
+            try:
+                data = json.loads(message)
+            except ValueError:
+                return
+            t = data.get("type")
+            if t == "session.created":
+                ws.send(json.dumps(build_update()))
+            elif t == "session.updated":
+                self._on_next_ready(nxt)
+            elif t == "error":
+                sys.stderr.write(f"[ERROR] Reconfigure session: {data.get('error') or data}\n")
+                sys.stderr.flush()
+
+        def on_close(ws, code, msg):
+            with self._send_lock:
+                if self._next is not nxt:
+                    return
+                self._next = None
+            # 新会话没建起来：继续用旧会话，不影响考生
+            sys.stderr.write(f"[ERROR] Reconfigure session closed before switch: {code} {msg}\n")
+            sys.stderr.flush()
+            self.cb._emit({"event": "reconfigure_failed", "code": code, "msg": msg})
+
+        nxt["ws"] = websocket.WebSocketApp(
+            self.url,
+            header=self.headers,
+            on_message=on_message,
+            on_error=lambda ws, e: sys.stderr.write(f"[ERROR] Reconfigure session error: {e}\n"),
+            on_close=on_close,
+        )
+        threading.Thread(target=nxt["ws"].run_forever, daemon=True).start()
+
+    def _on_next_ready(self, nxt: dict) -> None:
+        with self._send_lock:
+            if self._next is not nxt:
+                return
+            nxt["ready"] = True
+            nxt["handshake_ms"] = round((time.monotonic() - nxt["t0"]) * 1000, 1)
+            if self._live and self.ring.at_commit_boundary():
+                self._switch_locked()  # 两轮之间（没有未提交音频）：立即切换
+
+    def _switch_locked(self) -> None:
+        """At a commit boundary, with _send_lock held: new audio goes to the prepared socket."""
+        nxt, self._next = self._next, None
+        old, new = self.ws, nxt["ws"]
+        owed = self.ring.pending_commits()
+        self._retiring[old] = owed
+        # 事件路由立即切到新会话；发送端在队列里旧会话的音频/commit 发完后再切
+        self.ws = new
+        self._rewire(new)
+        self.sender.put_call(lambda: setattr(self, "_tx_ws", new))
+        if not owed:
+            self.sender.put_call(lambda: self._retire(old))
+        else:
+            timer = threading.Timer(RETIRE_TIMEOUT_S, self._retire, args=(old,))
+            timer.daemon = True
+            timer.start()
+        self.reconfigures += 1
+        self.cb._emit({
+            "event": "reconfigured",
+            "handshake_ms": nxt.get("handshake_ms"),
+            "switch_ms": round((time.monotonic() - nxt["t0"]) * 1000, 1),
+            "pending_finals": owed,
+        })
+
+    def _rewire(self, new) -> None:
+        """Route the switched-in socket's callbacks like connect() does, and the old one's finals to cb."""
+        cb = self.cb
+
+        def on_message(ws, message):
+            if ws is self.ws:
+                cb.on_message(ws, message)
+            elif ws in self._retiring:
+                cb.on_message(ws, message)
+                if '"conversation.item.input_audio_transcription.completed"' in message:
+                    with self._send_lock:
+                        owed = self._retiring.get(ws, 0) - 1
+                        if ws in self._retiring:
+                            self._retiring[ws] = owed
+                    if owed <= 0:
+                        self._retire(ws)
+
+        def on_close(ws, code, msg):
+            if ws is self.ws:
+                cb.on_close(ws, code, msg)
+                return
+            with self._send_lock:
+                owed = self._retiring.pop(ws, 0)
+            if owed > 0 and not self.closing:
+                # 旧会话没交完 final 就断了：这些轮次不会再有 final，ring 里也不再重放它们
+                sys.stderr.write(f"[ERROR] Retired ASR session closed owing {owed} final(s)\n")
+                sys.stderr.flush()
+                for _ in range(owed):
+                    self.ring.on_final()
+
+        for ws in (new, *self._retiring):
+            ws.on_message = on_message
+            ws.on_close = on_close
+            ws.on_error = lambda ws, e: cb.on_error(ws, e) if ws is self.ws else None
+
+    def _retire(self, ws) -> None:
+        with self._send_lock:
+            self._retiring.pop(ws, None)
+        try:
+            ws.close()
+        except Exception:
+            pass
+
+    def _cancel_next_locked(self) -> None:
+        self._deferred_update = None
+        nxt, self._next = self._next, None
+        if nxt is not None and nxt["ws"] is not None:
+            threading.Thread(target=nxt["ws"].close, daemon=True).start()
+
+    def _on_ready(self) -> None:
+        """session.updated on the current socket: replay what the upstream has not finalized, then go live."""
+        with self._send_lock:
+            segments, lost = self.ring.snapshot()
+            replayed = 0
+            # 重放绕过队列上限：这些都是新会话必须收到的音频
+            for chunks, committed in segments:
+                for b64, n in chunks:
+                    self.sender.put_audio(b64, n, force=True)
+                    replayed += n
+                if committed:
+                    self.sender.put_commit()
+            self._live = True
+            deferred, self._deferred_update = self._deferred_update, None
+        if deferred is not None:
+            self.reconfigure(deferred)
+        ready = self._attempt_ready
+        if ready is None:
+            # 首次连接：握手期间收到的音频已经补发；standby 模式下前端据此知道会话已就绪
+            self.cb._emit({"event": "ready", "buffered_ms": self.ring.bytes_to_ms(replayed)})
+            return
+        self.reconnects += 1
+        self.cb._emit({
+            "event": "resumed",
+            "attempt": self._attempt,
+            "replayed_ms": self.ring.bytes_to_ms(replayed),
+            "lost_ms": self.ring.bytes_to_ms(lost),
+            "downtime_ms": round((time.monotonic() - self._dropped_at) * 1000, 1),
+        })
+        ready.set()
+
+    def _on_drop(self, code, msg) -> bool:
+        """on_close of the current socket. True = we reconnect in place and the close stays internal."""
+        self.sender.clear()
+        with self._send_lock:
+            self._live = False
+            # 重连会用当前（已更新的）配置重新握手，准备中的新会话不再需要
+            self._cancel_next_locked()
+        if self.closing or self.cb.reconnecting or self.max_attempts == 0 or not self.cb._ready.is_set():
+            # 主动关闭、首次连接就失败、或重连线程已在处理：按原样报 close
+            return self.cb.reconnecting and not self.closing
+        self.cb.reconnecting = True
+        self.cb._ready.clear()
+        self._dropped_at = time.monotonic()
+        # 上游会从重放的音频重新识别当前这一轮：stash 没追上之前不下发，避免前端文本回退
+        if not self.ring.has_pending_commit():
+            self.cb._resume_floor = len(self.cb._buf)
+        threading.Thread(target=self._reconnect_loop, args=(code, msg), daemon=True).start()
+        return True
+
+    def _reconnect_loop(self, code, msg) -> None:
+        cb = self.cb
+        for attempt in range(1, self.max_attempts + 1):
+            if self.closing:
+                break
+            self._attempt = attempt
+            cb._emit({"event": "reconnecting", "attempt": attempt, "code": code,
+                      "buffered_ms": self.ring.buffered_ms()})
+            time.sleep(RECONNECT_BACKOFF_S[min(attempt, len(RECONNECT_BACKOFF_S)) - 1])
+            ready = threading.Event()
+            self._attempt_ready = ready
+            cb._session_configured = False  # 新连接要重新走 session.created -> session.update
+            self.connect()
+            deadline = time.monotonic() + RECONNECT_HANDSHAKE_TIMEOUT_S
+            while not ready.wait(0.05):
+                if self.closing or not self._thread.is_alive() or time.monotonic() > deadline:
+                    break
+            if ready.is_set():
+                cb.reconnecting = False
+                return
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+        cb.reconnecting = False
+        if self.closing:
+            cb._closed.set()
+            return
+        cb._emit({"event": "error", "message": f"ASR upstream lost after {self.max_attempts} reconnect attempts"})
+        cb._emit({"event": "close", "code": code, "msg": msg})
+        cb._closed.set()
+
 
 def _read_stdin_lines():
     for line in sys.stdin:
@@ -128,7 +958,10 @@ def main() -> int:
     if ws_url_override:
         base_url = ws_url_override
     else:
-        base_url = "wss://dashscope.aliyuncs.com/api-ws/v1/realtime"
+        # 最快的健康地域（server/endpoint_prober.py 发布）；没有探测结果时仍是 CN
+        from endpoints import ranked_ws_urls
+
+        base_url = ranked_ws_urls("asr", ["wss://dashscope.aliyuncs.com/api-ws/v1/realtime"])[0]
     
     model = "qwen3-asr-flash-realtime"
     url = f"{base_url}?model={model}"
@@ -142,10 +975,10 @@ def main() -> int:
         "OpenAI-Beta: realtime=v1"
     ]
     
-    ws = None  # Will be set after WebSocketApp is created
+    upstream = None  # Will be set after the callback is created
     
-    def send_session_update():
-        """Send session.update event per official docs"""
+    def session_update_event() -> dict:
+        """session.update for the current language / corpus (also used for mid-session reconfiguration)"""
         event = {
             "type": "session.update",
             "session": {
@@ -173,15 +1006,19 @@ def main() -> int:
             }
         else:
             event["session"]["turn_detection"] = None
-        
+        return event
+
+    def send_session_update():
+        """Send session.update event per official docs"""
+        event = session_update_event()
         sys.stderr.write(f"[DEBUG] Sending session.update: {json.dumps(event, indent=2)}\n")
         sys.stderr.flush()
         
         try:
+            ws = upstream.ws if upstream else None
             if ws and ws.sock and ws.sock.connected:
                 ws.send(json.dumps(event))
-                sys.stdout.write(json.dumps({"event": "session_updated"}) + "\n")
-                sys.stdout.flush()
+                cb._emit(SESSION_UPDATED)
                 sys.stderr.write("[DEBUG] session.update sent successfully\n")
                 sys.stderr.flush()
             else:
@@ -191,26 +1028,70 @@ def main() -> int:
             sys.stderr.write(f"[ERROR] Failed to send session.update: {e}\n")
             sys.stderr.flush()
     
-    cb = BridgeCallback(send_session_update_fn=send_session_update)
-    
-    # Create WebSocket connection per official docs
-    ws = websocket.WebSocketApp(
+    # 可选：把考生音频按轮次存档（WAV + index.json），供历史回放与离线分析
+    archive_dir = os.getenv("ASR_ARCHIVE_DIR", "")
+    archive_session = os.getenv("ASR_ARCHIVE_SESSION", "")
+
+    # 考生作答的声学特征（响度稳定性、音高、清浊比、语速），每轮 commit 时输出给评分；ASR_ACOUSTIC=0 关闭
+    acoustic_enabled = os.getenv("ASR_ACOUSTIC", "1") != "0"
+    analyzer = None
+    acoustic_turn = 0
+
+    # 分段模式：长回答在停顿处（或最长 segment_max_s）自动 commit，停止时只剩最后一小段要等 final；
+    # 前端收到的仍是一个拼好的 final（中间段以 segment 事件下发）。ASR_SEGMENT=1 或 config segment=true 开启
+    segment_opts = {
+        "pause_ms": int(os.getenv("ASR_SEGMENT_PAUSE_MS", str(DEFAULT_SEGMENT_PAUSE_MS))),
+        "min_s": float(os.getenv("ASR_SEGMENT_MIN_S", str(DEFAULT_SEGMENT_MIN_S))),
+        "max_s": float(os.getenv("ASR_SEGMENT_MAX_S", str(DEFAULT_SEGMENT_MAX_S))),
+    }
+    segment_enabled = os.getenv("ASR_SEGMENT", "0") == "1"
+    segmenter = None
+
+    cb = BridgeCallback(
+        send_session_update_fn=send_session_update,
+        partial_mode=os.getenv("ASR_PARTIAL_MODE", "full"),
+        forward_raw=os.getenv("ASR_FORWARD_RAW", "1") != "0",
+    )
+
+    # 上游断线时原地重连：重新握手并重放 ring 里尚未出 final 的音频（ASR_RECONNECT_ATTEMPTS=0 关闭）
+    upstream = UpstreamSession(
         url,
-        header=headers,
-        on_open=cb.on_open,
-        on_message=cb.on_message,
-        on_error=cb.on_error,
-        on_close=cb.on_close
+        headers,
+        cb,
+        AudioRing(float(os.getenv("ASR_RING_SECONDS", str(DEFAULT_RING_SECONDS))), sample_rate),
+        max_attempts=int(os.getenv("ASR_RECONNECT_ATTEMPTS", str(DEFAULT_RECONNECT_ATTEMPTS))),
+        # 上行发送队列：慢上游不再阻塞 stdin；block | merge | drop_oldest
+        sender_opts={
+            "max_items": int(os.getenv("ASR_SEND_QUEUE", str(DEFAULT_SEND_QUEUE))),
+            "policy": os.getenv("ASR_SEND_POLICY", DEFAULT_SEND_POLICY),
+            "report_ms": int(os.getenv("ASR_QUEUE_REPORT_MS", str(DEFAULT_QUEUE_REPORT_MS))),
+        },
     )
     
-    # Start WebSocket in background thread
-    ws_thread = threading.Thread(target=ws.run_forever)
-    ws_thread.daemon = True
-    ws_thread.start()
+    # Standby: the frontend opens the bridge while the examiner is still speaking;
+    # the session is configured and held idle until audio arrives or the timer fires.
+    standby_timer = None
+    got_audio = False
+    input_bytes = 0  # 前端送来的音频（不含重连重放）
+    commits = 0
+    auto_commits = 0  # segment cuts (segmented mode)
+
+    def expire_standby(timeout_s: float):
+        if got_audio:
+            return
+        sys.stderr.write(f"[DEBUG] Standby idle for {timeout_s:.0f}s, closing upstream\n")
+        sys.stderr.flush()
+        cb._emit({"event": "standby_expired", "idle_ms": round(timeout_s * 1000)})
+        upstream.close()
+
+    def ensure_connected():
+        # Create WebSocket connection per official docs (runs in a background thread).
+        # Deferred until the first stdin line so session.update carries the config's language/corpus.
+        if upstream.ws is None:
+            upstream.connect()
     
     # Output status
-    sys.stdout.write(json.dumps({"event": "ws_url", "url": url}) + "\n")
-    sys.stdout.flush()
+    cb._emit({"event": "ws_url", "url": url})
     
     sys.stderr.write("[DEBUG] Entering main loop\n")
     sys.stderr.flush()
@@ -225,56 +1106,173 @@ def main() -> int:
         t = msg.get("type")
         
         if t == "config":
-            # Update config (for future sessions, not current one)
-            # Note: session.update can only be sent once, so we just log this
+            # language / corpus_text 变了且会话已建立：session.update 只能发一次，
+            # 所以在后台另开一个按新配置握手的会话，到下一个 commit 边界无缝切过去
+            prev_session = (language, corpus_text)
             language = msg.get("language", language)
             corpus_text = msg.get("corpus_text", corpus_text) or ""
-            sys.stderr.write(f"[DEBUG] Config received: language={language}, but session already configured\n")
+            if upstream.ws is not None and (language, corpus_text) != prev_session:
+                upstream.reconfigure(session_update_event)
+            if msg.get("archive_session") and cb.archiver is None:
+                archive_session = str(msg["archive_session"])
+            # 下行格式可以随时切换，对后续事件立即生效
+            if msg.get("partial_mode") in ("full", "delta"):
+                cb.partial_mode = msg["partial_mode"]
+                cb.partials.reset()
+            if "forward_raw" in msg:
+                cb.forward_raw = bool(msg["forward_raw"])
+            if msg.get("send_policy") in SEND_POLICIES:
+                upstream.sender.policy = msg["send_policy"]
+            if "acoustic" in msg:
+                acoustic_enabled = bool(msg["acoustic"])
+            if "segment" in msg:
+                segment_enabled = bool(msg["segment"])
+                if not segment_enabled:
+                    segmenter = None
+            for key, conv in (("pause_ms", int), ("min_s", float), ("max_s", float)):
+                if msg.get(f"segment_{key}") is not None:
+                    try:
+                        segment_opts[key] = conv(msg[f"segment_{key}"])
+                    except (TypeError, ValueError):
+                        pass
+            if msg.get("resync_every"):
+                try:
+                    cb.partials.resync_every = max(1, int(msg["resync_every"]))
+                except (TypeError, ValueError):
+                    pass
+            if msg.get("standby_timeout_s") and standby_timer is None and not got_audio:
+                try:
+                    timeout_s = max(1.0, float(msg["standby_timeout_s"]))
+                    standby_timer = threading.Timer(timeout_s, expire_standby, args=(timeout_s,))
+                    standby_timer.daemon = True
+                    standby_timer.start()
+                except (TypeError, ValueError):
+                    pass
+            sys.stderr.write(
+                f"[DEBUG] Config received: language={language}, partial_mode={cb.partial_mode}, "
+                f"forward_raw={cb.forward_raw}, standby={standby_timer is not None}, segment={segment_enabled}\n"
+            )
             sys.stderr.flush()
+            ensure_connected()
             continue
+
+        if t != "close":
+            ensure_connected()
         
         if t == "audio":
             b64 = msg.get("audio_b64", "")
             if not b64:
                 continue
             
-            # Wait for session to be ready before sending audio
-            if not cb._ready.wait(timeout=5.0):
-                sys.stderr.write("[ERROR] Session not ready, dropping audio\n")
-                sys.stderr.flush()
-                continue
-            
-            # Send audio per official docs
-            event = {
-                "type": "input_audio_buffer.append",
-                "audio": b64
-            }
-            
-            try:
-                ws.send(json.dumps(event))
-            except Exception as e:
-                sys.stderr.write(f"[ERROR] Failed to send audio: {e}\n")
-                sys.stderr.flush()
+            if not got_audio:
+                got_audio = True
+                if standby_timer is not None:
+                    standby_timer.cancel()
+
+            # Send audio per official docs. Before session.updated (and while
+            # reconnecting) it is only buffered in the ring and sent on ready.
+            nbytes = len(b64) * 3 // 4 - b64[-2:].count("=")
+            input_bytes += nbytes
+            upstream.send_audio(b64, nbytes)
+
+            pcm = base64.b64decode(b64) if (archive_dir or acoustic_enabled or segment_enabled) else b""
+            if segment_enabled:
+                try:
+                    if segmenter is None:
+                        segmenter = PauseSegmenter(sample_rate, **segment_opts)
+                    cut = segmenter.feed(pcm)
+                except Exception as e:
+                    sys.stderr.write(f"[ERROR] Segmented commits disabled: {e}\n")
+                    sys.stderr.flush()
+                    segment_enabled = False
+                    segmenter = None
+                    cut = None
+                if cut:
+                    # 段要先登记再 commit：final 可能很快回来
+                    cb.on_commit(auto=True)
+                    upstream.commit()
+                    auto_commits += 1
+                    sys.stderr.write(f"[DEBUG] Auto-commit ({cut}) at {input_bytes / (2 * sample_rate):.1f}s\n")
+                    sys.stderr.flush()
+            if acoustic_enabled:
+                try:
+                    if analyzer is None:
+                        from acoustic_features import StreamingAcousticAnalyzer
+
+                        analyzer = StreamingAcousticAnalyzer(sample_rate)
+                    analyzer.feed(pcm)
+                except Exception as e:
+                    sys.stderr.write(f"[ERROR] Acoustic features disabled: {e}\n")
+                    sys.stderr.flush()
+                    acoustic_enabled = False
+                    analyzer = None
+
+            if archive_dir:
+                try:
+                    if cb.archiver is None:
+                        import uuid
+                        from audio_archive import TurnArchiver
+
+                        cb.archiver = TurnArchiver(archive_dir, archive_session or uuid.uuid4().hex, sample_rate)
+                    cb.archiver.append(pcm)
+                except Exception as e:
+                    sys.stderr.write(f"[ERROR] Archive disabled: {e}\n")
+                    sys.stderr.flush()
+                    archive_dir = ""
             continue
         
         if t == "commit":
-            # Commit audio buffer (non-VAD mode)
-            event = {
-                "type": "input_audio_buffer.commit"
-            }
-            try:
-                ws.send(json.dumps(event))
-            except Exception:
-                pass
+            # Commit audio buffer (non-VAD mode). Right after an auto-commit there is
+            # nothing new to commit: the turn ends with the segments already sent.
+            empty = segmenter is not None and upstream.ring.at_commit_boundary() and cb.has_open_segments()
+            if not empty:
+                cb.on_commit()
+                upstream.commit()
+            if segmenter is not None:
+                segmenter.reset()
+            commits += 1
+            with cb.out.batch():
+                if analyzer is not None:
+                    acoustic_turn += 1
+                    cb._emit({"event": "acoustic", "turn": acoustic_turn, "features": analyzer.finish()})
+                if cb.archiver is not None:
+                    turn = cb.archiver.commit()
+                    if turn:
+                        cb._emit({
+                            "event": "archived",
+                            "session": cb.archiver.session_id,
+                            "turn": turn["turn"],
+                            "duration_ms": turn["duration_ms"],
+                        })
+            if empty:
+                cb.on_commit(empty=True)  # after the acoustic event, which the frontend expects before the final
             continue
         
         if t == "close":
-            try:
-                ws.close()
-            except Exception:
-                pass
+            upstream.close()
             break
     
+    if standby_timer is not None:
+        standby_timer.cancel()
+    if cb.archiver is not None:
+        cb.archiver.close()
+    # 计量：按秒计费的是实际发给上游的音频（断线重放会再计一次），每个上游会话单独建连
+    sender = upstream.sender
+    cb._emit({
+        "event": "usage",
+        "model": model,
+        "audio_s": round(sender.sent_bytes / (2 * sample_rate), 2),
+        "input_audio_s": round(input_bytes / (2 * sample_rate), 2),
+        "commits": commits,
+        "auto_commits": auto_commits,  # 分段模式下桥自己发给上游的 commit
+        "sessions": (1 + upstream.reconnects + upstream.reconfigures) if upstream.ws is not None else 0,
+    })
+    acoustic_stats = f" acoustic_cpu_ms={analyzer.cpu_s * 1000:.0f}" if analyzer is not None else ""
+    if segmenter is not None:
+        acoustic_stats += f" auto_commits={auto_commits} (pause={segmenter.cuts['pause']} max={segmenter.cuts['max']})"
+    sys.stderr.write(cb.stats_line() + f" reconnects={upstream.reconnects} reconfigures={upstream.reconfigures} "
+                     f"{upstream.sender.stats()}{acoustic_stats}\n")
+    sys.stderr.flush()
     return 0
 
 
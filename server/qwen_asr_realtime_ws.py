@@ -4,7 +4,9 @@ import os
 import sys
 import threading
 
-import dashscope
+from event_writer import EventWriter, frame
+
+OPEN = frame({"event": "open"})
 
 
 def _extract_text(evt: dict) -> str:
@@ -28,17 +30,21 @@ def _extract_text(evt: dict) -> str:
 class Callback:  # OmniRealtimeCallback compatible (duck-typing)
     def __init__(self):
         self.closed = threading.Event()
+        self.out = EventWriter()
 
     def on_open(self) -> None:
-        sys.stdout.write(json.dumps({"event": "open"}) + "\n")
-        sys.stdout.flush()
+        self.out.emit(OPEN)
 
     def on_close(self, close_status_code, close_msg) -> None:
-        sys.stdout.write(json.dumps({"event": "close", "code": close_status_code, "msg": close_msg}) + "\n")
-        sys.stdout.flush()
+        self.out.emit({"event": "close", "code": close_status_code, "msg": close_msg})
         self.closed.set()
 
     def on_event(self, message: dict) -> None:
+        # 文本和 turn_end 同一次回调产生，合并成一次写
+        with self.out.batch():
+            self._handle_event(message)
+
+    def _handle_event(self, message: dict) -> None:
         try:
             t = message.get("type", "")
             text = _extract_text(message)
@@ -51,16 +57,13 @@ class Callback:  # OmniRealtimeCallback compatible (duck-typing)
                     kind = "final"
                 if "delta" in lt:
                     kind = "partial"
-                sys.stdout.write(json.dumps({"event": kind, "text": text, "type": t}) + "\n")
-                sys.stdout.flush()
+                self.out.emit({"event": kind, "text": text, "type": t})
 
             # Also forward turn boundary if provided
             if t and ("turn" in t.lower() and ("end" in t.lower() or "done" in t.lower())):
-                sys.stdout.write(json.dumps({"event": "turn_end", "type": t}) + "\n")
-                sys.stdout.flush()
+                self.out.emit({"event": "turn_end", "type": t})
         except Exception as e:
-            sys.stdout.write(json.dumps({"event": "error", "message": str(e)}) + "\n")
-            sys.stdout.flush()
+            self.out.emit({"event": "error", "message": str(e)})
 
 
 def main() -> int:
@@ -78,13 +81,17 @@ def main() -> int:
         sys.stderr.write("DASHSCOPE_API_KEY is not set\n")
         sys.stderr.flush()
         return 2
+
+    import dashscope
+
     dashscope.api_key = api_key
 
-    ws_url = (
-        args.ws_url
-        or os.getenv("DASHSCOPE_ASR_WS_URL", "")
-        or "wss://dashscope.aliyuncs.com/api-ws/v1/realtime"
-    )
+    ws_url = args.ws_url or os.getenv("DASHSCOPE_ASR_WS_URL", "")
+    if not ws_url:
+        # 最快的健康地域（server/endpoint_prober.py 发布）；没有探测结果时仍是 CN
+        from endpoints import ranked_ws_urls
+
+        ws_url = ranked_ws_urls("asr", ["wss://dashscope.aliyuncs.com/api-ws/v1/realtime"])[0]
 
     try:
         # Delayed import because module path may change across versions
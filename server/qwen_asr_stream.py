@@ -2,8 +2,6 @@ import argparse
 import os
 import sys
 
-import dashscope
-
 
 def main():
     parser = argparse.ArgumentParser(description="DashScope Qwen3 ASR stream helper")
@@ -13,14 +11,16 @@ def main():
     parser.add_argument("--context", default="", help="Optional context prompt for customization")
     args = parser.parse_args()
 
-    base_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", "https://dashscope.aliyuncs.com/api/v1")
-    dashscope.base_http_api_url = base_url
-
     api_key = os.getenv("DASHSCOPE_API_KEY", "")
     if not api_key:
         print("DASHSCOPE_API_KEY is not set", flush=True)
         return 2
 
+    import dashscope
+    from dashscope import MultiModalConversation
+
+    dashscope.base_http_api_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", "https://dashscope.aliyuncs.com/api/v1")
+
     system_text = args.context or ""
 
     messages = [
@@ -35,7 +35,7 @@ def main():
         asr_options["enable_itn"] = args.enable_itn.lower() == "true"
 
     # Stream ASR deltas
-    responses = dashscope.MultiModalConversation.call(
+    responses = MultiModalConversation.call(
         api_key=api_key,
         model="qwen3-asr-flash",
         messages=messages,
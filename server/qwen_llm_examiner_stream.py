@@ -1,8 +1,20 @@
 import json
 import os
+import queue
 import sys
+import threading
+import time
 
-import dashscope
+from event_writer import EventWriter
+from hedge import HedgePolicy
+from model_router import ModelRouter
+from session_store import spool
+
+
+# Delta 合并策略：满足任一条件即 flush（句末标点 / 距上次 flush 超过 N ms / 缓冲超过 M 字节）
+DEFAULT_FLUSH_MS = 120
+DEFAULT_FLUSH_BYTES = 256
+_SENTENCE_ENDINGS = (".", "?", "!", "。", "？", "！")
 
 
 def build_system_prompt_for_part(part: int, question_count: int = 0) -> str:
@@ -108,6 +120,183 @@ def extract_delta(resp) -> str:
     return ""
 
 
+def extract_usage(resp) -> dict:
+    """Token usage block of a DashScope response ({} if absent). Stream chunks carry running totals."""
+    try:
+        usage = resp["usage"]
+    except Exception:
+        usage = getattr(resp, "usage", None)
+    if not usage:
+        return {}
+    out = {}
+    for key in ("input_tokens", "output_tokens", "total_tokens"):
+        try:
+            value = usage[key]
+        except Exception:
+            value = getattr(usage, key, None)
+        if isinstance(value, int):
+            out[key] = value
+    return out
+
+
+class DeltaCoalescer:
+    """
+    Buffer token-sized deltas and emit them as fewer, larger JSONL lines.
+    A flush happens at a sentence boundary, after `flush_ms` since the last
+    flush, or once `flush_bytes` are buffered - whichever comes first.
+    The first delta is always flushed immediately to keep time-to-first-text low.
+    `out` is an event_writer.EventWriter.
+    """
+
+    def __init__(self, out, flush_ms: int = DEFAULT_FLUSH_MS, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 sentence: bool = True):
+        self._out = out
+        self._flush_s = max(0, flush_ms) / 1000.0
+        self._flush_bytes = max(1, flush_bytes)
+        self._sentence = sentence
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = 0.0
+        self._flushed_once = False
+        self.frames = 0
+
+    def push(self, delta: str) -> None:
+        self._pending.append(delta)
+        self._pending_bytes += len(delta.encode("utf-8"))
+        now = time.monotonic()
+        if (
+            not self._flushed_once
+            or self._pending_bytes >= self._flush_bytes
+            or now - self._last_flush >= self._flush_s
+            or (self._sentence and delta.rstrip().endswith(_SENTENCE_ENDINGS))
+        ):
+            self.flush(now)
+
+    def flush(self, now: float = 0.0) -> None:
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        self._out.emit({"type": "delta", "text": text})
+        self._last_flush = now or time.monotonic()
+        self._flushed_once = True
+        self.frames += 1
+
+
+class _StreamRace:
+    """
+    One or more Generation.call streams of the same prompt, each read by its
+    own thread into `events` as (attempt, chunk | None at end | Exception).
+    The first attempt to produce a delta is claimed as the winner; the others
+    stop reading and their connections are dropped.
+    """
+
+    def __init__(self, generation):
+        self._generation = generation
+        self.events = queue.Queue()
+        self.models = []
+        self.alive = 0
+        self.winner = None
+        self._cancel = []
+
+    def start(self, call_kwargs: dict) -> None:
+        idx = len(self.models)
+        cancel = threading.Event()
+        self.models.append(call_kwargs["model"])
+        self._cancel.append(cancel)
+        self.alive += 1
+        threading.Thread(target=self._read, args=(idx, call_kwargs, cancel), daemon=True).start()
+
+    def claim(self, idx: int) -> None:
+        self.winner = idx
+        for i, cancel in enumerate(self._cancel):
+            if i != idx:
+                cancel.set()
+
+    def _read(self, idx: int, call_kwargs: dict, cancel: threading.Event) -> None:
+        responses = None
+        try:
+            responses = self._generation.call(**call_kwargs)
+            for r in responses:
+                if cancel.is_set():
+                    break
+                self.events.put((idx, r))
+        except Exception as e:
+            self.events.put((idx, e))
+            return
+        finally:
+            if cancel.is_set() and hasattr(responses, "close"):
+                try:
+                    responses.close()  # 关闭生成器，释放底层 HTTP 连接
+                except Exception:
+                    pass
+        self.events.put((idx, None))
+
+
+def _flush_policy(payload: dict) -> dict:
+    """Resolve flush policy: payload `flush` object > env > defaults."""
+    cfg = payload.get("flush") or {}
+    if not isinstance(cfg, dict):
+        cfg = {}
+
+    def _int(key: str, env: str, default: int) -> int:
+        try:
+            return int(cfg.get(key, os.getenv(env, default)))
+        except (TypeError, ValueError):
+            return default
+
+    sentence = cfg.get("sentence", os.getenv("EXAMINER_FLUSH_SENTENCE", "true"))
+    if isinstance(sentence, str):
+        sentence = sentence.lower() != "false"
+    return {
+        "flush_ms": _int("ms", "EXAMINER_FLUSH_MS", DEFAULT_FLUSH_MS),
+        "flush_bytes": _int("bytes", "EXAMINER_FLUSH_BYTES", DEFAULT_FLUSH_BYTES),
+        "sentence": bool(sentence),
+    }
+
+
+def normalize_messages(messages) -> list:
+    """Client messages ({role, text} or {role, content}) in DashScope shape; "model" becomes "assistant"."""
+    out = []
+    for m in messages:
+        role = m.get("role")
+        if not role:
+            continue
+        
+        # Normalize role names
+        if role == "model":
+            role = "assistant"
+        
+        # Extract content
+        if "content" in m:
+            out.append({"role": role, "content": m["content"]})
+        else:
+            text = m.get("text", "")
+            out.append({"role": role, "content": [{"text": str(text)}]})
+    return out
+
+
+def _persist(out, store, session_id: str, history: list, appended: list, source: str, part: int, question_count: int) -> None:
+    """
+    Write the turn's new messages through to the store and tell the BFF what to
+    cache: the appended rows when its cached history was used, else the whole list.
+    """
+    try:
+        store.append(session_id, len(history), appended, part, question_count, replace=source == "client")
+    except Exception as e:
+        sys.stderr.write(f"[ERROR] Conversation store write failed: {e}\n")
+        sys.stderr.flush()
+    evt = {"type": "conversation", "session": session_id, "messages_total": len(history) + len(appended)}
+    if source == "cache":
+        evt["appended"] = appended
+    else:
+        evt["history"] = history + appended
+    evt["part"] = part
+    evt["questionCount"] = question_count
+    out.emit(evt)
+
+
 def infer_next_action(accumulated_text: str, current_part: int, question_count: int) -> dict:
     """
     Infer metadata from the generated text.
@@ -135,9 +324,6 @@ def infer_next_action(accumulated_text: str, current_part: int, question_count:
 
 
 def main() -> int:
-    base_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", "https://dashscope.aliyuncs.com/api/v1")
-    dashscope.base_http_api_url = base_url
-
     api_key = os.getenv("DASHSCOPE_API_KEY", "")
     if not api_key:
         sys.stderr.write("[ERROR] DASHSCOPE_API_KEY is not set\n")
@@ -157,36 +343,55 @@ def main() -> int:
         sys.stderr.flush()
         return 4
 
+    out = EventWriter()
+
     # Extract parameters
-    model = payload.get("model", "qwen-plus")
     temperature = payload.get("temperature", 0.7)
-    messages = payload.get("messages", [])
-    
-    # NEW: State parameters (frontend should provide these)
-    current_part = payload.get("part", 0)  # 0=intro, 1=part1, 2=part2, 3=part3, 4=end
-    question_count = payload.get("questionCount", 0)
+
+    # Session mode: the client sends `sessionId` and only the new `message`; the history
+    # comes from the BFF's LRU (`history`, already normalized) or conversation_store.py.
+    # A client that sends the full `messages` with a sessionId (re)seeds the stored copy.
+    session_id = str(payload.get("sessionId") or "")
+    store = None
+    stored = None
+    if session_id:
+        from conversation_store import ConversationStore
+
+        store = ConversationStore()
+        if "messages" in payload:
+            history, source = [], "client"
+            new_messages = normalize_messages(payload.get("messages") or [])
+        else:
+            history, source = payload.get("history"), "cache"
+            if history is None:
+                history, source = store.load(session_id), "db"
+            expected = payload.get("historyLength")
+            if history is None or (isinstance(expected, int) and expected != len(history)):
+                sys.stderr.write(f"[ERROR] Session {session_id} out of sync (stored={None if history is None else len(history)}, client={expected})\n")
+                sys.stderr.flush()
+                out.emit({"type": "error", "code": "session_out_of_sync", "message": "Conversation not found or out of sync; resend the full messages."})
+                return 6
+            new_messages = normalize_messages([payload["message"]] if payload.get("message") else [])
+        if "part" not in payload or "questionCount" not in payload:
+            stored = store.state(session_id) or {}
+    else:
+        history, source = [], ""
+        new_messages = normalize_messages(payload.get("messages", []))
+
+    # NEW: State parameters (frontend should provide these; session mode falls back to the stored state)
+    current_part = payload.get("part", (stored or {}).get("part", 0))  # 0=intro, 1=part1, 2=part2, 3=part3, 4=end
+    question_count = payload.get("questionCount", (stored or {}).get("questionCount", 0))
+
+    # 按 (part, action) 选模型与输出上限；请求里显式给了 model 则固定用它
+    router = ModelRouter()
+    route = router.route(current_part, question_count, pinned=payload.get("model") or "")
+    model = route["model"]
     
     # Build dynamic system prompt based on current state
     system_prompt = build_system_prompt_for_part(current_part, question_count)
     
     # Construct messages
-    final_messages = [{"role": "system", "content": [{"text": system_prompt}]}]
-    
-    for m in messages:
-        role = m.get("role")
-        if not role:
-            continue
-        
-        # Normalize role names
-        if role == "model":
-            role = "assistant"
-        
-        # Extract content
-        if "content" in m:
-            final_messages.append({"role": role, "content": m["content"]})
-        else:
-            text = m.get("text", "")
-            final_messages.append({"role": role, "content": [{"text": str(text)}]})
+    final_messages = [{"role": "system", "content": [{"text": system_prompt}]}] + history + new_messages
     
     # If first interaction (intro), add trigger
     if len(final_messages) == 1:
@@ -195,56 +400,153 @@ def main() -> int:
             "content": [{"text": "(Begin the exam. Greet the candidate and ask for their name.)"}]
         })
     
-    sys.stderr.write(f"[LLM] part={current_part}, q_count={question_count}, total_msgs={len(final_messages)}\n")
+    sys.stderr.write(
+        f"[LLM] part={current_part}, q_count={question_count}, total_msgs={len(final_messages)}, "
+        + (f"session={session_id} history={source} new={len(new_messages)}, " if session_id else "")
+        + f"route={route['key']} model={model} ({route['reason']})\n"
+    )
     sys.stderr.flush()
 
-    # Call LLM
-    try:
-        responses = dashscope.Generation.call(
-            api_key=api_key,
-            model=model,
-            messages=final_messages,
-            result_format="message",
-            temperature=temperature,
-            stream=True,
-            incremental_output=True,
-        )
-    except Exception as e:
-        sys.stderr.write(f"[ERROR] API call failed: {e}\n")
-        sys.stderr.flush()
-        sys.stdout.write(json.dumps({
-            "type": "error",
-            "message": f"LLM API Error: {str(e)}"
-        }) + "\n")
-        sys.stdout.flush()
-        return 5
-
-    # Stream output (plain text deltas)
-    accumulated = ""
-    for r in responses:
-        delta = extract_delta(r)
+    # 延迟导入：参数校验通过后才加载 SDK，避免错误路径也付出导入开销
+    import dashscope
+    from dashscope import Generation
+
+    base_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", "https://dashscope.aliyuncs.com/api/v1")
+    dashscope.base_http_api_url = base_url
+    call_kwargs = dict(
+        api_key=api_key,
+        model=model,
+        messages=final_messages,
+        result_format="message",
+        temperature=temperature,
+        stream=True,
+        incremental_output=True,
+    )
+    if route.get("max_tokens"):
+        call_kwargs["max_tokens"] = route["max_tokens"]
+
+    # Call LLM (with an optional hedge: same prompt to HEDGE_LLM_MODEL / HEDGE_LLM_BASE_URL)
+    policy = HedgePolicy("llm")
+    hedge_after_ms = policy.threshold_ms()
+    race = _StreamRace(Generation)
+    t0 = time.monotonic()
+    race.start(call_kwargs)
+
+    parts = []
+    usage = {}
+    coalescer = DeltaCoalescer(out, **_flush_policy(payload))
+    hedge = None
+    ttft_ms = None
+    while True:
+        timeout = None
+        if race.winner is None and hedge is None and hedge_after_ms is not None:
+            timeout = max(0.0, hedge_after_ms / 1000 - (time.monotonic() - t0))
+        try:
+            idx, item = race.events.get(timeout=timeout)
+        except queue.Empty:
+            hedge_after_ms = None  # 每个请求最多对冲一次
+            if policy.try_acquire():
+                hedge = {
+                    "model": os.getenv("HEDGE_LLM_MODEL", "") or model,
+                    "base_url": os.getenv("HEDGE_LLM_BASE_URL", "") or base_url,
+                }
+                race.start({**call_kwargs, "model": hedge["model"], "base_address": hedge["base_url"]})
+                out.emit({"type": "hedge", "after_ms": round((time.monotonic() - t0) * 1000), "model": hedge["model"]})
+            continue
+
+        if isinstance(item, Exception):
+            race.alive -= 1
+            if race.winner in (None, idx):
+                sys.stderr.write(f"[ERROR] API call failed{' (hedge)' if idx else ''}: {item}\n")
+                sys.stderr.flush()
+            if race.winner == idx or (race.winner is None and not race.alive):
+                if race.winner is None:
+                    # 没有任何首字节就失败：按已等待的时长计入样本
+                    policy.record((time.monotonic() - t0) * 1000)
+                out.emit({
+                    "type": "error",
+                    "message": f"LLM API Error: {str(item)}"
+                })
+                if store is not None:
+                    # 用户这句前端已经记下了，服务端也要记，否则下一轮对不上
+                    _persist(out, store, session_id, history, new_messages, source, current_part, question_count)
+                return 5
+            continue
+        if item is None:  # stream ended
+            race.alive -= 1
+            if race.winner is None:
+                race.claim(idx)  # 没有任何 delta 就结束（空回复）也算先完成
+                policy.record((time.monotonic() - t0) * 1000)
+            if race.winner == idx:
+                break
+            continue
+        if race.winner is None:
+            if not extract_delta(item):
+                continue  # 首个 delta 之前的空 chunk
+            race.claim(idx)
+            # 从主请求发出算起：对冲胜出时记的就是主请求已经等了多久
+            ttft_ms = (time.monotonic() - t0) * 1000
+            policy.record(ttft_ms)
+        if idx != race.winner:
+            continue
+        delta = extract_delta(item)
         if delta:
-            accumulated += delta
-            # Output plain text delta (no JSON wrapping for the text itself)
-            sys.stdout.write(json.dumps({"type": "delta", "text": delta}) + "\n")
-            sys.stdout.flush()
-    
+            parts.append(delta)
+            coalescer.push(delta)
+        usage = extract_usage(item) or usage
+    accumulated = "".join(parts)
+    total_ms = (time.monotonic() - t0) * 1000
+    router.record(route, race.models[race.winner], total_ms if ttft_ms is None else ttft_ms, total_ms)
+
     # Infer metadata
     metadata = infer_next_action(accumulated, current_part, question_count)
     
-    # Send final event with metadata
-    sys.stdout.write(json.dumps({
-        "type": "final",
-        "text": accumulated.strip(),
-        "meta": {
-            "current_part": current_part,
-            "question_count": question_count,
-            "suggested_next_part": metadata.get("next_part"),
-            "should_end_exam": metadata.get("shouldEndExam", False),
-            "action": metadata.get("action", "ask")
-        }
-    }) + "\n")
-    sys.stdout.flush()
+    # Last buffered delta + final event with metadata, in one write
+    with out.batch():
+        coalescer.flush()
+        out.emit({
+            "type": "final",
+            "text": accumulated.strip(),
+            "meta": {
+                "current_part": current_part,
+                "question_count": question_count,
+                "suggested_next_part": metadata.get("next_part"),
+                "should_end_exam": metadata.get("shouldEndExam", False),
+                "action": metadata.get("action", "ask"),
+                "route": {**route, "model": race.models[race.winner]},
+            }
+        })
+        # 计量：最后一个 chunk 的 usage 是整次调用的累计值；被取消的对冲请求只计请求数
+        out.emit({"type": "usage", "model": race.models[race.winner], "requests": len(race.models), **usage})
+
+    if store is not None:
+        # final 已经发出，落库不占流式路径
+        reply = {"role": "assistant", "content": [{"text": accumulated.strip()}]}
+        _persist(out, store, session_id, history, new_messages + [reply], source, current_part, question_count)
+
+    # 考试记录：本轮新增的考生发言与考官回复写入 session_store 的 spool（一次追加写，不碰数据库）
+    exam_session = str(payload.get("session") or session_id)
+    if exam_session:
+        if source == "client":
+            # user 由 BFF 按鉴权身份填入（IELTS_USER_HEADER），客户端自带的会被覆盖
+            spool({"kind": "session", "session": exam_session, "user": payload.get("user") or None,
+                   "examiner": payload.get("examinerId"), "mode": "full"})
+        # 会话模式带上消息在对话里的位置 seq：客户端重新整段上送（首轮 / 失步后重同步）时，
+        # 已入库的消息按 (session, seq) 去重，不会重复记录
+        spoken = new_messages if session_id else new_messages[-1:]
+        for i, m in enumerate(spoken + [{"role": "assistant", "content": [{"text": accumulated.strip()}]}]):
+            text = "".join(c.get("text", "") for c in m["content"] if isinstance(c, dict))
+            rec = {"kind": "turn", "session": exam_session, "role": "examiner" if m["role"] == "assistant" else "user",
+                   "text": text, "part": current_part}
+            if session_id:
+                rec["seq"] = len(history) + i
+            spool(rec)
+
+    sys.stderr.write(
+        f"[LLM] deltas={len(parts)}, frames={coalescer.frames}, writes={out.writes}"
+        + (f", hedged winner={'hedge' if race.winner else 'primary'}" if hedge else "") + "\n"
+    )
+    sys.stderr.flush()
     
     return 0
 
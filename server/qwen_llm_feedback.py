@@ -2,7 +2,9 @@ import json
 import os
 import sys
 
-import dashscope
+from event_writer import EventWriter
+from qwen_llm_examiner_stream import extract_usage
+from session_store import spool
 
 
 SYSTEM = """You are an IELTS Speaking Rater (not the examiner).
@@ -13,6 +15,18 @@ Return ONLY a valid JSON object and nothing else.
 IMPORTANT: Provide strengths/improvements/comment in Simplified Chinese (zh-CN).
 Be conservative if the transcript is short or unclear; mention limitations in the comment when evidence is insufficient.
 
+The input may also contain "acoustic": measurements taken from the candidate's audio
+(the transcript alone cannot show how the answers sounded). Use them as evidence for
+Fluency and Pronunciation only, alongside the transcript:
+- articulation_rate: syllables per second of speaking time (about 3.5-5.5 is typical for fluent English);
+  speech_rate includes pauses
+- pauses / long_pauses (>= 1 s) / mean_pause_s: hesitation between stretches of speech
+- pitch_range_st / pitch_std_st: intonation range in semitones (below ~3 st sounds flat or monotone)
+- loudness_stability (0-1, higher is steadier) and loudness_std_db: volume control
+- voiced_ratio / speech_ratio: share of voiced frames in speech, share of speech in the answer
+The numbers are estimates from a simple signal analyzer: weigh them as supporting evidence,
+never quote them verbatim, and ignore them when a turn is very short.
+
 Output JSON structure:
 {
   "reportVersion": "v1",
@@ -27,6 +41,35 @@ Output JSON structure:
 }
 """
 
+# 每轮声学特征按说话时长加权汇总；逐轮只保留评分用得上的几项，控制 prompt 长度
+ACOUSTIC_SUMMARY_KEYS = (
+    "speech_ratio", "voiced_ratio", "loudness_std_db", "loudness_stability", "pitch_median_hz",
+    "pitch_range_st", "pitch_std_st", "articulation_rate", "speech_rate", "mean_pause_s",
+)
+ACOUSTIC_TURN_KEYS = ("speech_s", "articulation_rate", "pauses", "long_pauses", "pitch_range_st")
+
+
+def summarize_acoustic(transcript: list) -> dict:
+    turns = []
+    for i, m in enumerate(transcript):
+        if isinstance(m, dict) and isinstance(m.get("acoustic"), dict) and m["acoustic"].get("speech_s"):
+            turns.append((i, m["acoustic"]))
+    if not turns:
+        return {}
+
+    total = sum(float(f["speech_s"]) for _, f in turns)
+    summary = {"turns": len(turns), "speech_s": round(total, 1)}
+    for key in ACOUSTIC_SUMMARY_KEYS:
+        vals = [(float(f[key]), float(f["speech_s"])) for _, f in turns if isinstance(f.get(key), (int, float))]
+        weight = sum(w for _, w in vals)
+        if weight > 0:
+            summary[key] = round(sum(v * w for v, w in vals) / weight, 2)
+    summary["pauses"] = sum(int(f.get("pauses") or 0) for _, f in turns)
+    summary["long_pauses"] = sum(int(f.get("long_pauses") or 0) for _, f in turns)
+
+    per_turn = [{"message": i, **{k: f[k] for k in ACOUSTIC_TURN_KEYS if f.get(k) is not None}} for i, f in turns]
+    return {"summary": summary, "turns": per_turn}
+
 
 def main() -> int:
     api_key = os.getenv("DASHSCOPE_API_KEY", "")
@@ -35,8 +78,6 @@ def main() -> int:
         sys.stderr.flush()
         return 2
 
-    dashscope.api_key = api_key
-
     raw = sys.stdin.read()
     if not raw.strip():
         sys.stderr.write("Missing JSON stdin payload\n")
@@ -53,9 +94,22 @@ def main() -> int:
     model = payload.get("model") or "qwen-plus"
     transcript = payload.get("transcript") or []
 
-    user_text = json.dumps({"transcript": transcript}, ensure_ascii=False)
+    # 文本给评分模型，声学特征单独汇总（来自 ASR bridge 的 acoustic 事件，不额外调用 API）
+    acoustic = summarize_acoustic(transcript)
+    rater_input = {
+        "transcript": [{"role": m.get("role"), "text": m.get("text")} if isinstance(m, dict) else m for m in transcript],
+    }
+    if acoustic:
+        rater_input["acoustic"] = acoustic
+    user_text = json.dumps(rater_input, ensure_ascii=False)
+
+    import dashscope
+    from dashscope import Generation
+
+    dashscope.api_key = api_key
+    dashscope.base_http_api_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", "https://dashscope.aliyuncs.com/api/v1")
 
-    resp = dashscope.Generation.call(
+    resp = Generation.call(
         api_key=api_key,
         model=model,
         messages=[
@@ -84,8 +138,18 @@ def main() -> int:
     else:
         out = str(content)
 
+    # 计量事件单独占第一行，其后是模型原样输出的报告 JSON（Node 先取出 usage 行再解析报告）
+    writer = EventWriter()
+    writer.emit({"event": "usage", "model": model, "requests": 1, **extract_usage(resp)})
     sys.stdout.write(str(out))
     sys.stdout.flush()
+
+    # 报告已经返回，再排队写入考试记录（解析失败也保留原文）
+    try:
+        report = json.loads(out)
+    except ValueError:
+        report = None
+    spool({"kind": "report", "session": payload.get("session"), "report": report if isinstance(report, dict) else None, "raw": str(out)})
     return 0
 
 
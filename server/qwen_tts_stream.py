@@ -1,73 +1,256 @@
 import argparse
 import base64
-import json
 import os
 import sys
 import threading
+import time
 
-import dashscope
-from dashscope.audio.qwen_tts_realtime import (
-    QwenTtsRealtime,
-    QwenTtsRealtimeCallback,
-    AudioFormat,
-)
+from event_writer import EventWriter, frame
+from hedge import HedgePolicy
 
+SAMPLE_RATE = 24000
+TTS_MODEL = "qwen3-tts-flash-realtime"
+OPEN = frame({"event": "open"})
+END = frame({"event": "end"})
+
+
+class _LeadingSilenceTrimmer:
+    """
+    Drop silence at the very start of the stream (the first deltas are often
+    near-zero padding). Scans each chunk with one vectorized threshold test,
+    keeps `preroll` samples before the first loud sample so the onset is not
+    clipped, and never drops more than `max_trim` samples in total.
+    """
+
+    def __init__(self, threshold: int, preroll: int, max_trim: int):
+        import numpy as np
+
+        self._np = np
+        self.threshold = threshold
+        self.preroll = preroll
+        self.max_trim = max_trim
+        self.active = True
+        self.trimmed = 0
+        self._held = None  # 静音尾巴（≤ preroll），语音开始时要一起发出
+
+    def feed(self, pcm):
+        if not self.active:
+            return pcm
+        np = self._np
+        buf = pcm if self._held is None else np.concatenate([self._held, pcm])
+        self._held = None
+        budget = self.max_trim - self.trimmed
+
+        loud = (buf > self.threshold) | (buf < -self.threshold)
+        if loud.any():
+            cut = min(max(0, int(loud.argmax()) - self.preroll), budget)
+        else:
+            cut = max(0, buf.shape[0] - self.preroll)
+            if cut < budget:
+                self.trimmed += cut
+                self._held = buf[cut:]
+                return buf[:0]
+            cut = budget
+
+        self.active = False
+        self.trimmed += cut
+        return buf[cut:]
+
+    def flush(self):
+        """Whatever is still held back (only if the whole response was silent)."""
+        self.active = False
+        held, self._held = self._held, None
+        return held
+
+
+class _AudioPipeline:
+    """
+    Post-process upstream PCM16 deltas before they go to Node:
+    leading-silence trim, exact sample accounting, optional IMA-ADPCM re-encode.
+    Every audio event carries `samples` (this chunk) and `end_ms` (cumulative
+    duration of everything emitted so far).
+    """
+
+    def __init__(self, trimmer=None, adpcm_block: int = 0):
+        self.trimmer = trimmer
+        self.adpcm_block = adpcm_block
+        self._carry = b""  # delta 可能在半个采样处截断，留到下一块
+        self.samples = 0
+        self.pcm_bytes = 0
+        self.out_bytes = 0
+        if adpcm_block:
+            import numpy as np
+            import ima_adpcm
+
+            self._np = np
+            self._codec = ima_adpcm
+        elif trimmer is not None:
+            self._np = trimmer._np
+
+    def _needs_array(self) -> bool:
+        return bool(self.adpcm_block) or (self.trimmer is not None and self.trimmer.active)
+
+    def process(self, b64: str):
+        raw = base64.b64decode(b64)
+        if not self._carry and not (len(raw) & 1) and not self._needs_array():
+            # 快路径：PCM 直通，原样转发上游 base64
+            return self._event(b64, len(raw) // 2, len(raw))
+
+        raw = self._carry + raw
+        usable = len(raw) - (len(raw) & 1)
+        self._carry = raw[usable:]
+        if not usable:
+            return None
+        if not self._needs_array():
+            return self._event(base64.b64encode(raw[:usable]).decode("ascii"), usable // 2, usable)
+
+        pcm = self._np.frombuffer(raw[:usable], dtype="<i2")
+        if self.trimmer is not None:
+            pcm = self.trimmer.feed(pcm)
+        return self._emit(pcm)
+
+    def flush(self):
+        if self.trimmer is None:
+            return None
+        held = self.trimmer.flush()
+        return self._emit(held) if held is not None else None
+
+    def _emit(self, pcm):
+        n = int(pcm.shape[0])
+        if not n:
+            return None
+        if self.adpcm_block:
+            data = self._codec.encode(pcm, self.adpcm_block)
+            evt = self._event(base64.b64encode(data).decode("ascii"), n, len(data))
+            evt["codec"] = "ima_adpcm"
+            evt["block"] = self.adpcm_block
+            return evt
+        data = pcm.astype("<i2", copy=False).tobytes()
+        return self._event(base64.b64encode(data).decode("ascii"), n, len(data))
+
+    def _event(self, b64: str, samples: int, out_bytes: int) -> dict:
+        self.samples += samples
+        self.pcm_bytes += samples * 2
+        self.out_bytes += out_bytes
+        return {"event": "audio", "b64": b64, "samples": samples, "end_ms": self.duration_ms()}
+
+    def duration_ms(self) -> float:
+        return round(self.samples * 1000 / SAMPLE_RATE, 1)
+
+    def trimmed_ms(self) -> float:
+        return round((self.trimmer.trimmed if self.trimmer else 0) * 1000 / SAMPLE_RATE, 1)
+
+
+class _Race:
+    """
+    Which of the sessions (0 = primary, 1 = hedge) owns the output. The
+    first one to produce audio, or to finish without any, claims it; until
+    then only the primary's events are written.
+    """
 
-class _Callback(QwenTtsRealtimeCallback):
     def __init__(self):
-        super().__init__()
+        self._lock = threading.Lock()
+        self.winner = None
+        self.first = threading.Event()
+        self.first_at = 0.0  # time.monotonic() of the claim
+
+    def claim(self, idx: int) -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = idx
+                self.first_at = time.monotonic()
+                self.first.set()
+            return self.winner == idx
+
+    def owns(self, idx: int) -> bool:
+        winner = self.winner
+        return winner == idx or (winner is None and idx == 0)
+
+
+class _Callback:  # QwenTtsRealtimeCallback compatible (duck-typing), so the SDK is imported lazily
+    def __init__(self, audio: _AudioPipeline, out: EventWriter, race: _Race, idx: int = 0):
         self.done = threading.Event()
+        self.audio = audio
+        self.out = out
+        self._write = self.out.emit
+        self.race = race
+        self.idx = idx
 
     def on_open(self) -> None:
         # Inform node the websocket is ready
-        sys.stdout.write(json.dumps({"event": "open"}) + "\n")
-        sys.stdout.flush()
+        if self.race.owns(self.idx):
+            self._write(OPEN)
 
     def on_close(self, close_status_code, close_msg) -> None:
-        sys.stdout.write(json.dumps({"event": "close", "code": close_status_code, "msg": close_msg}) + "\n")
-        sys.stdout.flush()
+        if self.race.owns(self.idx):
+            self._write({"event": "close", "code": close_status_code, "msg": close_msg})
 
     def on_event(self, response) -> None:
+        t = response.get("type")
+        if t in ("response.audio.delta", "session.finished") and self.race.winner is None:
+            self.race.claim(self.idx)
+        if not self.race.owns(self.idx):
+            return  # 对冲中落败（或尚未出音频的对冲会话）的事件一律丢弃
+        # response.done 的音频尾巴和 response_done 一次写出
+        with self.out.batch():
+            self._handle_event(response)
+        if t == "session.finished":
+            self.done.set()  # 在 end 写出之后再唤醒主线程，否则进程可能先退出
+
+    def _handle_event(self, response) -> None:
         try:
             t = response.get("type")
             if t == "session.created":
-                sys.stdout.write(json.dumps({"event": "session", "id": response["session"]["id"]}) + "\n")
-                sys.stdout.flush()
+                self._write({"event": "session", "id": response["session"]["id"]})
                 return
 
             if t == "response.audio.delta":
                 # delta is already base64 from server
                 b64 = response.get("delta", "")
                 if b64:
-                    # Validate base64 quickly (optional) and forward
-                    try:
-                        base64.b64decode(b64, validate=False)
-                    except Exception:
-                        pass
-                    sys.stdout.write(json.dumps({"event": "audio", "b64": b64}) + "\n")
-                    sys.stdout.flush()
+                    evt = self.audio.process(b64)
+                    if evt:
+                        self._write(evt)
                 return
 
             if t == "response.done":
-                sys.stdout.write(json.dumps({"event": "response_done"}) + "\n")
-                sys.stdout.flush()
+                evt = self.audio.flush()
+                if evt:
+                    self._write(evt)
+                # 精确的累计时长：前端据此判断考官何时说完
+                self._write({
+                    "event": "response_done",
+                    "samples": self.audio.samples,
+                    "duration_ms": self.audio.duration_ms(),
+                    "trimmed_ms": self.audio.trimmed_ms(),
+                })
                 return
 
             if t == "session.finished":
-                sys.stdout.write(json.dumps({"event": "end"}) + "\n")
-                sys.stdout.flush()
-                self.done.set()
+                self._write(END)
                 return
         except Exception as e:
-            sys.stdout.write(json.dumps({"event": "error", "message": str(e)}) + "\n")
-            sys.stdout.flush()
+            self._write({"event": "error", "message": str(e)})
 
     def wait(self, timeout=None) -> bool:
         return self.done.wait(timeout=timeout)
 
 
-def _audio_format(name: str) -> AudioFormat:
-    # V1 只暴露常用 PCM 24k，后续需要再扩展
+def _close_quietly(tts) -> None:
+    try:
+        tts.close()
+    except Exception:
+        pass
+
+
+def _is_adpcm(name: str) -> bool:
+    return name.lower() in ("ima_adpcm", "ima_adpcm_24000", "adpcm")
+
+
+def _audio_format(name: str):
+    from dashscope.audio.qwen_tts_realtime import AudioFormat
+
+    # V1 只暴露常用 PCM 24k，后续需要再扩展；ADPCM 是本地对 PCM 24k 的二次编码，上游仍请求 PCM
     if name.lower() in ("pcm_24000", "pcm_24000hz_mono_16bit", "pcm"):
         return AudioFormat.PCM_24000HZ_MONO_16BIT
     return AudioFormat.PCM_24000HZ_MONO_16BIT
@@ -79,11 +262,18 @@ def main() -> int:
     parser.add_argument("--voice", default="Cherry")
     parser.add_argument("--language-type", default="English")
     parser.add_argument("--mode", default="server_commit", choices=["server_commit", "commit"])
-    parser.add_argument("--format", default="pcm_24000")
+    parser.add_argument("--format", default="pcm_24000", help="pcm_24000 | ima_adpcm_24000 (downlink re-encoded, ~3.8x smaller)")
+    parser.add_argument("--adpcm-block", type=int, default=0, help="Samples per ADPCM block (odd; default from ima_adpcm)")
+    parser.add_argument("--no-trim", action="store_true", help="Keep leading silence of the first deltas")
+    parser.add_argument("--trim-threshold", type=int, default=200, help="|sample| above this counts as speech (int16)")
+    parser.add_argument("--trim-preroll-ms", type=int, default=20)
+    parser.add_argument("--trim-max-ms", type=int, default=1000)
     parser.add_argument("--ws-url", default="")
     parser.add_argument("--speech-rate", default="")
     parser.add_argument("--pitch-rate", default="")
     parser.add_argument("--volume", default="")
+    parser.add_argument("--finish-timeout-s", type=float, default=float(os.getenv("TTS_FINISH_TIMEOUT_S", "15")),
+                        help="Give up waiting for session.finished this long after the text is sent")
     args = parser.parse_args()
 
     api_key = os.getenv("DASHSCOPE_API_KEY", "")
@@ -92,21 +282,47 @@ def main() -> int:
         sys.stderr.flush()
         return 2
 
+    # 延迟导入：只有参数与 Key 校验通过后才加载 SDK 的 realtime TTS 模块
+    import dashscope
+    from dashscope.audio.qwen_tts_realtime import QwenTtsRealtime
+
     dashscope.api_key = api_key
 
     # Default WS by region; allow override via env or arg.
     # 为了减少“地域/网络导致连不上”的手动排查：若用户未指定 ws_url，则自动按顺序尝试 CN -> INTL。
+    # 有 endpoint_prober.py 的探测结果时，先按延迟排序尝试健康的地域。
     ws_url_override = args.ws_url or os.getenv("DASHSCOPE_TTS_WS_URL", "")
-    ws_candidates = (
-        [ws_url_override]
-        if ws_url_override
-        else [
+    if ws_url_override:
+        ws_candidates = [ws_url_override]
+    else:
+        from endpoints import ranked_ws_urls
+
+        ws_candidates = ranked_ws_urls("tts", [
             "wss://dashscope.aliyuncs.com/api-ws/v1/realtime",
             "wss://dashscope-intl.aliyuncs.com/api-ws/v1/realtime",
-        ]
-    )
+        ])
 
-    cb = _Callback()
+    block = 0
+    if _is_adpcm(args.format):
+        import ima_adpcm
+
+        block = args.adpcm_block or ima_adpcm.DEFAULT_BLOCK_SAMPLES
+        if block < 3 or block % 2 == 0:
+            sys.stderr.write(f"--adpcm-block must be odd and >= 3 (got {block})\n")
+            sys.stderr.flush()
+            return 2
+    trimmer = None
+    if not args.no_trim and args.trim_max_ms > 0:
+        trimmer = _LeadingSilenceTrimmer(
+            threshold=max(0, args.trim_threshold),
+            preroll=args.trim_preroll_ms * SAMPLE_RATE // 1000,
+            max_trim=args.trim_max_ms * SAMPLE_RATE // 1000,
+        )
+    audio = _AudioPipeline(trimmer, block)
+
+    race = _Race()
+    cb = _Callback(audio, EventWriter(), race)
+    t0 = time.monotonic()
     tts = None
     last_err = None
     
@@ -123,7 +339,7 @@ def main() -> int:
             # Shorten SDK connect timeout if possible? SDK doesn't expose it easily.
             # But we can assume if it fails quickly, we move to next.
             tts = QwenTtsRealtime(
-                model="qwen3-tts-flash-realtime",
+                model=TTS_MODEL,
                 callback=cb,
                 url=ws_url,
             )
@@ -161,26 +377,25 @@ def main() -> int:
 
     # CRITICAL: Per official docs, update_session must be called immediately after connect()
     # to configure the session before any other operations
-    import time
     start_time = time.time()
     sys.stderr.write(f"[DEBUG-TTS] Starting session update with voice={args.voice}\n")
     sys.stderr.flush()
     
-    tts.update_session(
+    session = dict(
         voice=args.voice,
         response_format=_audio_format(args.format),
         mode=args.mode,
         language_type=args.language_type,
         **kwargs,
     )
+    tts.update_session(**session)
     
     elapsed = time.time() - start_time
     sys.stderr.write(f"[DEBUG-TTS] Session updated in {elapsed:.2f}s\n")
     sys.stderr.flush()
     
     # Now safe to output status after session is properly configured
-    sys.stdout.write(json.dumps({"event": "ws_url", "url": ws_url}) + "\n")
-    sys.stdout.flush()
+    cb.out.emit({"event": "ws_url", "url": ws_url})
 
     # Server-commit: we can just append full text; server decides chunking
     sys.stderr.write(f"[DEBUG-TTS] Appending text (len={len(args.text)})\n")
@@ -195,15 +410,69 @@ def main() -> int:
     sys.stderr.flush()
 
     # Add timeout to prevent hanging forever (e.g. if network drops FIN packet)
-    # 15s should be enough for most examiner sentences.
-    if not cb.wait(timeout=15):
+    deadline = time.monotonic() + args.finish_timeout_s
+    sessions = [tts]
+    billed_sessions = 1  # sessions that got the text (a hedge that failed before append_text is not billed)
+    callbacks = [cb]
+    policy = HedgePolicy("tts")
+    hedge_after_ms = policy.threshold_ms()
+    if hedge_after_ms is not None:
+        # 对冲：首个音频迟迟不来时，同样的文本发给备用端点（没有备用就再开一个会话），先出音频的胜出
+        if not race.first.wait(max(0.0, hedge_after_ms / 1000 - (time.monotonic() - t0))) and policy.try_acquire():
+            hedge_url = os.getenv("HEDGE_TTS_WS_URL", "") or next((u for u in ws_candidates if u != ws_url), ws_url)
+            hedge_cb = _Callback(audio, cb.out, race, idx=1)
+            after_ms = round((time.monotonic() - t0) * 1000)
+            hedge_tts = None
+            try:
+                hedge_tts = QwenTtsRealtime(model=TTS_MODEL, callback=hedge_cb, url=hedge_url)
+                hedge_tts.connect()
+                # 连上就登记：配置失败时也要关掉它；下标与 hedge_cb 的 idx 对应
+                sessions.append(hedge_tts)
+                callbacks.append(hedge_cb)
+                hedge_tts.update_session(**session)
+                hedge_tts.append_text(args.text)
+                billed_sessions += 1
+                hedge_tts.finish()
+                cb.out.emit({"event": "hedge", "after_ms": after_ms, "url": hedge_url})
+            except Exception as e:
+                sys.stderr.write(f"[DEBUG-TTS] Hedge to {hedge_url} failed: {e}\n")
+                sys.stderr.flush()
+                if hedge_tts is not None:
+                    threading.Thread(target=_close_quietly, args=(hedge_tts,), daemon=True).start()
+        if race.first.wait(max(0.0, deadline - time.monotonic())):
+            # 从主请求发出算起：对冲胜出时记的就是主请求已经等了多久
+            policy.record((race.first_at - t0) * 1000)
+            for i, sess in enumerate(sessions):
+                if i != race.winner:
+                    # 取消落败的会话；close() 要等服务端回 close 帧（卡住的服务端最多 3s），放到后台线程
+                    threading.Thread(target=_close_quietly, args=(sess,), daemon=True).start()
+        else:
+            # 到截止时间都没有音频：也要计入样本，否则服务变慢时 p95 反而偏低
+            policy.record((min(time.monotonic(), deadline) - t0) * 1000)
+    winner_cb = callbacks[race.winner] if race.winner is not None else cb
+    if not winner_cb.wait(timeout=max(0.0, deadline - time.monotonic())):
         sys.stderr.write("TTS session timed out waiting for finish signal.\n")
         sys.stderr.flush()
 
-    try:
-        tts.close()
-    except Exception:
-        pass
+    # 计量：按输入字符计费（对冲会话同样计费）；输出时长用于核对与按句分析
+    cb.out.emit({
+        "event": "usage",
+        "model": TTS_MODEL,
+        "chars": len(args.text) * billed_sessions,
+        "samples": audio.samples,
+        "audio_ms": audio.duration_ms(),
+    })
+
+    if audio.out_bytes:
+        sys.stderr.write(
+            f"[DEBUG-TTS] audio={audio.duration_ms():.0f}ms trimmed={audio.trimmed_ms():.0f}ms "
+            f"pcm={audio.pcm_bytes}B out={audio.out_bytes}B" + (f" adpcm_block={block}" if block else "") + "\n"
+        )
+        sys.stderr.flush()
+
+    for i, sess in enumerate(sessions):
+        if race.winner in (None, i):
+            _close_quietly(sess)
     
     return 0
 
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Embedded store for exam history: the ielts_sessions / ielts_turns /
+ielts_reports tables of ARCHITECTURE.md in one SQLite file (IELTS_DB,
+default server/.ielts.db) in WAL mode, with an FTS5 index over transcripts.
+
+Writes never sit on a streaming path. The examiner and feedback scripts call
+`spool()` once their final output is out: one O_APPEND write of a JSON line
+to IELTS_SPOOL (default server/.ielts-spool.jsonl), no database access.
+`session_store.py ingest --follow` (started by the BFF when IELTS_STORE=1)
+is the only writer: it tails the spool and applies it in batches of up to
+--batch records, one transaction each. The spool offset is committed in the
+same transaction, so a restart neither loses nor repeats records. Once the
+spool is fully applied and larger than IELTS_SPOOL_ROTATE_BYTES it is
+renamed aside, drained and deleted; writers simply create a new one. The
+store records which of the two files the offset belongs to, so a crash at
+any point of a rotation resumes in the right file.
+
+Spool records ("ts" in epoch seconds; unknown sessions are created on first sight):
+  {"kind": "session", "session", "ts", "user"?, "examiner"?, "accent"?, "mode"?}
+    user = the owner; the first record that names one claims the session for good
+  {"kind": "turn", "session", "ts", "role": "user" | "examiner", "text", "part"?, "seq"?, "stt_meta"?, "audio_url"?}
+    seq = position in the examiner conversation; a turn whose (session, seq) is already stored is skipped
+  {"kind": "report", "session", "ts", "report": {score, fluency, ...}?, "raw"?}
+
+Queries are scoped to one user; `get` of another user's session is "unknown".
+The BFF's history endpoints run these and relay the JSON:
+  python3 server/session_store.py list [--user U] [--sort date|score] [--limit 20] [--cursor C]
+  python3 server/session_store.py get SESSION_ID [--user U]
+  python3 server/session_store.py search "QUERY" [--user U] [--limit 20]
+  python3 server/session_store.py ingest [--follow]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(SERVER_DIR, ".ielts.db")
+DEFAULT_SPOOL = os.path.join(SERVER_DIR, ".ielts-spool.jsonl")
+DEFAULT_ROTATE_BYTES = 64 * 1024 * 1024
+FOLLOW_POLL_S = 0.25
+MAX_LIMIT = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ielts_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL DEFAULT '',
+    examiner_id TEXT,
+    accent TEXT,
+    mode TEXT NOT NULL DEFAULT 'full',
+    state_part INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    overall_score REAL,
+    turns INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ielts_sessions_by_date ON ielts_sessions (user_id, started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ielts_sessions_by_score ON ielts_sessions (user_id, overall_score DESC, started_at DESC, id DESC)
+    WHERE overall_score IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS ielts_turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES ielts_sessions (id),
+    seq INTEGER,
+    role TEXT NOT NULL,
+    part INTEGER,
+    audio_url TEXT,
+    transcript TEXT NOT NULL,
+    stt_meta TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ielts_turns_by_session ON ielts_turns (session_id, id);
+CREATE UNIQUE INDEX IF NOT EXISTS ielts_turns_by_seq ON ielts_turns (session_id, seq) WHERE seq IS NOT NULL;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS ielts_turns_fts USING fts5 (
+    transcript, content = 'ielts_turns', content_rowid = 'id', tokenize = 'unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS ielts_turns_fts_ai AFTER INSERT ON ielts_turns BEGIN
+    INSERT INTO ielts_turns_fts (rowid, transcript) VALUES (new.id, new.transcript);
+END;
+CREATE TRIGGER IF NOT EXISTS ielts_turns_fts_ad AFTER DELETE ON ielts_turns BEGIN
+    INSERT INTO ielts_turns_fts (ielts_turns_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+END;
+
+CREATE TABLE IF NOT EXISTS ielts_reports (
+    session_id TEXT PRIMARY KEY REFERENCES ielts_sessions (id),
+    report_version TEXT,
+    overall_score REAL,
+    fluency REAL,
+    vocabulary REAL,
+    grammar REAL,
+    pronunciation REAL,
+    strengths TEXT,
+    improvements TEXT,
+    comment TEXT,
+    raw_model_output TEXT,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ielts_store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def db_file() -> str:
+    return os.getenv("IELTS_DB", "") or DEFAULT_DB
+
+
+def spool_file() -> str:
+    return os.getenv("IELTS_SPOOL", "") or DEFAULT_SPOOL
+
+
+def enabled() -> bool:
+    return os.getenv("IELTS_STORE", "0") == "1"
+
+
+def spool(record: dict) -> None:
+    """Queue one record for the store: a single O_APPEND write, no database access. No-op unless IELTS_STORE=1."""
+    if not enabled() or not record.get("session"):
+        return
+    record.setdefault("ts", round(time.time(), 3))
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        fd = os.open(spool_file(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        sys.stderr.write(f"[ERROR] Cannot spool {record.get('kind')} record: {e}\n")
+
+
+def _num(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class SessionStore:
+    def __init__(self, path: str = "", readonly: bool = False):
+        self.path = path or db_file()
+        if readonly:
+            self.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5.0, isolation_level=None)
+        else:
+            self.db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+
+    # ---- writes (ingester only) ----
+    def apply(self, records, meta: dict = None) -> int:
+        """Apply a batch of spool records (and `meta` key/values) in one transaction; returns records applied."""
+        db = self.db
+        applied = 0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for rec in records:
+                if self._apply_one(rec):
+                    applied += 1
+            for key, value in (meta or {}).items():
+                db.execute("INSERT OR REPLACE INTO ielts_store_meta (key, value) VALUES (?, ?)", (key, str(value)))
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return applied
+
+    def _apply_one(self, rec: dict) -> bool:
+        db = self.db
+        sid = str(rec.get("session") or "")
+        kind = rec.get("kind")
+        if not sid or kind not in ("session", "turn", "report"):
+            return False
+        ts = _num(rec.get("ts")) or time.time()
+        db.execute("INSERT OR IGNORE INTO ielts_sessions (id, started_at) VALUES (?, ?)", (sid, ts))
+
+        if kind == "session":
+            # 归属只认第一次：会话 id 由客户端给出，后来的 session 记录不能把别人的会话改到自己名下
+            db.execute(
+                "UPDATE ielts_sessions SET user_id = CASE user_id WHEN '' THEN coalesce(?, '') ELSE user_id END, examiner_id = coalesce(?, examiner_id), "
+                "accent = coalesce(?, accent), mode = coalesce(?, mode), started_at = min(started_at, ?) WHERE id = ?",
+                (rec.get("user"), rec.get("examiner"), rec.get("accent"), rec.get("mode"), ts, sid),
+            )
+        elif kind == "turn":
+            text = str(rec.get("text") or "")
+            if not text:
+                return False
+            meta = rec.get("stt_meta")
+            part = rec.get("part") if isinstance(rec.get("part"), int) else None
+            seq = rec.get("seq") if isinstance(rec.get("seq"), int) else None
+            cur = db.execute(
+                "INSERT OR IGNORE INTO ielts_turns (session_id, seq, role, part, audio_url, transcript, stt_meta, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sid, seq, "examiner" if rec.get("role") in ("examiner", "assistant", "model") else "user", part,
+                 rec.get("audio_url"), text, json.dumps(meta, ensure_ascii=False) if meta is not None else None, ts),
+            )
+            if not cur.rowcount:
+                return False  # 重同步时重复上送的消息
+            db.execute(
+                "UPDATE ielts_sessions SET turns = turns + 1, state_part = max(state_part, coalesce(?, 0)) WHERE id = ?",
+                (part, sid),
+            )
+        else:
+            report = rec.get("report") if isinstance(rec.get("report"), dict) else {}
+            score = _num(report.get("score"))
+            db.execute(
+                "INSERT OR REPLACE INTO ielts_reports (session_id, report_version, overall_score, fluency, vocabulary, "
+                "grammar, pronunciation, strengths, improvements, comment, raw_model_output, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (sid, report.get("reportVersion"), score, _num(report.get("fluency")), _num(report.get("vocabulary")),
+                 _num(report.get("grammar")), _num(report.get("pronunciation")),
+                 json.dumps(report.get("strengths") or [], ensure_ascii=False),
+                 json.dumps(report.get("improvements") or [], ensure_ascii=False),
+                 report.get("comment"), rec.get("raw"), ts),
+            )
+            # 分数冗余一份到 sessions，按分数分页的索引才能覆盖查询
+            db.execute("UPDATE ielts_sessions SET finished_at = ?, overall_score = ? WHERE id = ?", (ts, score, sid))
+        return True
+
+    def meta(self, key: str, default: str = "") -> str:
+        row = self.db.execute("SELECT value FROM ielts_store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # ---- reads ----
+    def list_sessions(self, user: str = "", sort: str = "date", limit: int = 20, cursor: str = "") -> dict:
+        """One page of sessions, newest (or best) first; `next_cursor` continues after the last row."""
+        limit = max(1, min(MAX_LIMIT, limit))
+        cols = "id, examiner_id, mode, state_part, started_at, finished_at, overall_score, turns"
+        if sort == "score":
+            sql = f"SELECT {cols} FROM ielts_sessions WHERE user_id = ? AND overall_score IS NOT NULL"
+            args = [user]
+            if cursor:
+                score, started, sid = cursor.split(",", 2)
+                sql += " AND (overall_score, started_at, id) < (?, ?, ?)"
+                args += [float(score), float(started), sid]
+            sql += " ORDER BY overall_score DESC, started_at DESC, id DESC LIMIT ?"
+        else:
+            sql = f"SELECT {cols} FROM ielts_sessions WHERE user_id = ?"
+            args = [user]
+            if cursor:
+                started, sid = cursor.split(",", 1)
+                sql += " AND (started_at, id) < (?, ?)"
+                args += [float(started), sid]
+            sql += " ORDER BY started_at DESC, id DESC LIMIT ?"
+        rows = self.db.execute(sql, args + [limit]).fetchall()
+        items = [
+            {"sessionId": r[0], "examinerId": r[1], "mode": r[2], "part": r[3], "startedAt": r[4],
+             "finishedAt": r[5], "overallScore": r[6], "turns": r[7]}
+            for r in rows
+        ]
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = f"{last[6]!r},{last[4]!r},{last[0]}" if sort == "score" else f"{last[4]!r},{last[0]}"
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get_session(self, session_id: str, user: str = None):
+        """One session with its turns and report; with `user`, only if that user owns it."""
+        row = self.db.execute(
+            "SELECT id, user_id, examiner_id, accent, mode, state_part, started_at, finished_at, overall_score, turns "
+            "FROM ielts_sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or (user is not None and row[1] != user):
+            return None  # 别人的会话和不存在的会话一样处理
+        keys = ("sessionId", "userId", "examinerId", "accent", "mode", "part", "startedAt", "finishedAt", "overallScore", "turns")
+        turns = [
+            {"role": r[0], "part": r[1], "audioUrl": r[2], "transcript": r[3],
+             "sttMeta": json.loads(r[4]) if r[4] else None, "createdAt": r[5]}
+            for r in self.db.execute(
+                "SELECT role, part, audio_url, transcript, stt_meta, created_at FROM ielts_turns "
+                "WHERE session_id = ? ORDER BY seq, id", (session_id,)
+            )
+        ]
+        rep = self.db.execute(
+            "SELECT report_version, overall_score, fluency, vocabulary, grammar, pronunciation, strengths, "
+            "improvements, comment, created_at FROM ielts_reports WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        report = None
+        if rep is not None:
+            report = {"reportVersion": rep[0], "score": rep[1], "fluency": rep[2], "vocabulary": rep[3],
+                      "grammar": rep[4], "pronunciation": rep[5], "strengths": json.loads(rep[6] or "[]"),
+                      "improvements": json.loads(rep[7] or "[]"), "comment": rep[8], "createdAt": rep[9]}
+        return {"session": dict(zip(keys, row)), "turns": turns, "report": report}
+
+    def search(self, query: str, user: str = "", limit: int = 20) -> dict:
+        """
+        Turns whose transcript matches `query` (FTS5 syntax; plain words are ANDed), newest first.
+        Walking the index in rowid order stops after `limit` hits of this user; ranking by bm25
+        would score every match of every user first (~0.5s per common word at 100k sessions).
+        """
+        limit = max(1, min(MAX_LIMIT, limit))
+        rows = self.db.execute(
+            "SELECT t.session_id, t.role, t.part, s.started_at, "
+            "snippet(ielts_turns_fts, 0, '[', ']', '...', 12) "
+            "FROM ielts_turns_fts JOIN ielts_turns t ON t.id = ielts_turns_fts.rowid "
+            "JOIN ielts_sessions s ON s.id = t.session_id "
+            "WHERE ielts_turns_fts MATCH ? AND s.user_id = ? ORDER BY ielts_turns_fts.rowid DESC LIMIT ?",
+            (query, user, limit),
+        ).fetchall()
+        return {"items": [{"sessionId": r[0], "role": r[1], "part": r[2], "startedAt": r[3], "snippet": r[4]} for r in rows]}
+
+
+def _read_lines(path: str, pos: int, max_records: int):
+    """Up to `max_records` complete lines from byte `pos`; returns (records, new_pos). A partial last line is left."""
+    with open(path, "rb") as f:
+        f.seek(pos)
+        records = []
+        while len(records) < max_records:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # 写到一半的行，下次再读
+            pos += len(line)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                sys.stderr.write(f"[ERROR] Bad spool line at {pos - len(line)}: {line[:120]!r}\n")
+    return records, pos
+
+
+def ingest(store: SessionStore, spool_path: str, batch: int, follow: bool, rotate_bytes: int) -> int:
+    """Apply the spool from the stored offset; with `follow`, keep tailing it."""
+    draining = spool_path + ".ingesting"
+    total = 0
+    while True:
+        # 轮换后还没读完的旧文件优先
+        path = draining if os.path.exists(draining) else spool_path
+        pos = int(store.meta("spool_offset", "0"))
+        owner = store.meta("spool_file", "")
+        if path == draining and owner != "ingesting":
+            # 刚改名（或改名后、记下之前崩溃）：偏移就是这个文件的
+            store.apply([], {"spool_file": "ingesting"})
+        elif path == spool_path and owner == "ingesting":
+            # 旧文件已删、偏移还没归零就崩溃了：偏移属于旧文件，新文件从头读
+            store.apply([], {"spool_offset": 0, "spool_file": ""})
+            pos = 0
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size < pos:
+            sys.stderr.write(f"[ERROR] {path} is shorter than the stored offset ({size} < {pos}); starting over\n")
+            pos = 0
+        records, new_pos = _read_lines(path, pos, batch) if size > pos else ([], pos)
+        if records or new_pos != pos:
+            t0 = time.perf_counter()
+            total += store.apply(records, {"spool_offset": new_pos})
+            sys.stderr.write(f"[STATS] ingested {len(records)} records in {(time.perf_counter() - t0) * 1000:.1f}ms\n")
+            sys.stderr.flush()
+            continue  # 还有积压就立刻读下一批
+
+        if path == draining:
+            # 旧文件读完：先删，再偏移归零。两步之间崩溃的话 spool_file 还是 ingesting，
+            # 重启后从新文件开头读，不会把旧文件再重放一遍
+            os.unlink(draining)
+            store.apply([], {"spool_offset": 0, "spool_file": ""})
+            continue
+        if size and pos == size and size >= rotate_bytes:
+            os.replace(spool_path, draining)
+            time.sleep(0.5)  # 让改名前已经打开文件的写入方写完
+            continue
+        if not follow:
+            return total
+        time.sleep(FOLLOW_POLL_S)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Exam history store (sessions, turns, reports)")
+    parser.add_argument("--db", default="", help="SQLite file (default: IELTS_DB or server/.ielts.db)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest", help="Apply the spool")
+    p.add_argument("--spool", default="", help="Spool file (default: IELTS_SPOOL or server/.ielts-spool.jsonl)")
+    p.add_argument("--batch", type=int, default=500, help="Records per transaction")
+    p.add_argument("--follow", action="store_true", help="Keep tailing the spool")
+    p = sub.add_parser("list")
+    p.add_argument("--user", default="")
+    p.add_argument("--sort", default="date", choices=["date", "score"])
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--cursor", default="")
+    p = sub.add_parser("get")
+    p.add_argument("session")
+    p.add_argument("--user", default="")
+    p = sub.add_parser("search")
+    p.add_argument("query")
+    p.add_argument("--user", default="")
+    p.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    path = args.db or db_file()
+    if args.cmd == "ingest":
+        store = SessionStore(path)
+        rotate = int(os.getenv("IELTS_SPOOL_ROTATE_BYTES", str(DEFAULT_ROTATE_BYTES)))
+        spool_path = args.spool or spool_file()
+        if args.follow:
+            sys.stderr.write(f"[DEBUG] Following {spool_path} -> {path}\n")
+            sys.stderr.flush()
+        n = ingest(store, spool_path, max(1, args.batch), args.follow, rotate)
+        sys.stderr.write(f"[STATS] ingest done: {n} records\n")
+        return 0
+
+    if not os.path.exists(path):
+        sys.stderr.write(f"[ERROR] No store at {path}\n")
+        return 2
+    store = SessionStore(path, readonly=True)
+    try:
+        if args.cmd == "list":
+            out = store.list_sessions(args.user, args.sort, args.limit, args.cursor)
+        elif args.cmd == "get":
+            out = store.get_session(args.session, args.user)
+            if out is None:
+                sys.stderr.write(f"[ERROR] Unknown session: {args.session}\n")
+                return 3
+        else:
+            out = store.search(args.query, args.user, args.limit)
+    except (ValueError, sqlite3.OperationalError) as e:
+        sys.stderr.write(f"[ERROR] Bad query: {e}\n")  # 游标格式错误 / FTS 语法错误
+        return 2
+    sys.stdout.write(json.dumps(out, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Local shadowing scorer: learner recording vs. reference TTS audio, no cloud call.
+
+Both signals are reduced to 10 ms frames of
+  - a spectral envelope: cepstrum of a 24-band log-mel spectrum (c1..c12,
+    which drops pitch harmonics and overall level), mean/variance
+    normalized over the utterance's speech frames and zeroed on silence, and
+  - a log-energy "speechness" value,
+all computed with numpy on strided frame views. The learner is aligned to
+the reference with DTW restricted to a Sakoe-Chiba band around the
+length-ratio diagonal. Each DP row is solved in one vectorized pass (the
+horizontal step becomes a prefix-min), so cost is O(frames x band) with
+only one Python-level iteration per reference frame.
+
+Per sentence of the reference (and overall, duration-weighted):
+  coverage          % of reference speech frames the learner also voiced
+  rhythm            correlation of the energy envelopes after alignment
+  timing_dev_ms     RMS of the aligned timing around the sentence's own tempo
+  tempo             learner duration / reference duration
+  pauses            reference pauses matched / missed, learner pauses inserted,
+                    and the total pause-time difference (pause_mismatch_ms)
+  spectral_match    how close the aligned spectral envelopes are
+  score             0-100 blend of the above
+
+Sentences come either from separate reference clips (one per sentence) or
+from one reference file plus the sentence texts; in the latter case the
+boundaries are placed by character share and snapped to the nearest pause.
+
+Usage:
+  python3 server/shadowing_score.py ref.wav learner.wav --text "First sentence. Second one."
+  python3 server/shadowing_score.py --ref-clip s1.wav --ref-clip s2.wav learner.wav
+"""
+import argparse
+import json
+import re
+import sys
+import wave
+from functools import lru_cache
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME = 400  # 25 ms
+HOP = 160  # 10 ms
+N_FFT = 512
+N_MELS = 24
+N_CEPS = 12
+HOP_MS = HOP * 1000 / SAMPLE_RATE
+
+# DTW band: half-width is this share of the longer signal, at least DEFAULT_BAND_MIN frames
+DEFAULT_BAND_FRAC = 0.2
+DEFAULT_BAND_MIN = 60
+MIN_PAUSE_FRAMES = 15  # 150 ms of silence inside a sentence counts as a pause
+RHYTHM_SMOOTH_FRAMES = 51
+CLIP_GAP_FRAMES = 20  # silence inserted between reference clips
+
+
+# ---------- audio ----------
+
+def load_wav(path: str) -> np.ndarray:
+    """16-bit WAV (any rate / channels) -> mono float32 at 16 kHz."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        rate, channels = w.getframerate(), w.getnchannels()
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    x = data.reshape(-1, channels).mean(axis=1) if channels > 1 else data
+    return resample(x.astype(np.float32) / 32768.0, rate)
+
+
+def resample(x: np.ndarray, rate: int) -> np.ndarray:
+    """Linear-interpolation resampling to 16 kHz, with a short windowed-sinc low-pass when downsampling."""
+    if rate == SAMPLE_RATE or len(x) == 0:
+        return x.astype(np.float32)
+    if rate > SAMPLE_RATE:
+        cutoff = 0.5 * SAMPLE_RATE / rate * 0.9
+        n = np.arange(-15, 16)
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(len(n))
+        x = np.convolve(x, taps / taps.sum(), mode="same")
+    t = np.arange(int(len(x) * SAMPLE_RATE / rate)) * (rate / SAMPLE_RATE)
+    return np.interp(t, np.arange(len(x)), x).astype(np.float32)
+
+
+# ---------- features ----------
+
+@lru_cache(maxsize=1)
+def _mel_filterbank() -> np.ndarray:
+    def mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def hz(m):
+        return 700.0 * (10 ** (m / 2595.0) - 1.0)
+
+    edges = hz(np.linspace(mel(80.0), mel(7600.0), N_MELS + 2))
+    bins = np.fft.rfftfreq(N_FFT, 1.0 / SAMPLE_RATE)
+    lo, mid, hi = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    fb = np.maximum(0.0, np.minimum((bins - lo) / (mid - lo), (hi - bins) / (hi - mid)))
+    return fb.T.astype(np.float32)  # (bins, mels)
+
+
+@lru_cache(maxsize=1)
+def _dct() -> np.ndarray:
+    """DCT-II basis (mels, ceps) for c1..c12."""
+    k = np.arange(1, N_CEPS + 1)[None, :]
+    m = np.arange(N_MELS)[:, None]
+    return np.cos(np.pi * k * (m + 0.5) / N_MELS).astype(np.float32)
+
+
+@lru_cache(maxsize=1)
+def _window() -> np.ndarray:
+    return np.hanning(FRAME).astype(np.float32)
+
+
+class Features:
+    """Frame-level view of one signal: `feats` (T, N_CEPS + 1), `energy_db` (T,), `speech` (T,) bool."""
+
+    def __init__(self, feats: np.ndarray, energy_db: np.ndarray, speech: np.ndarray):
+        self.feats = feats
+        self.energy_db = energy_db
+        self.speech = speech
+
+    def __len__(self) -> int:
+        return len(self.energy_db)
+
+
+def extract(x: np.ndarray, energy_weight: float = 2.0) -> Features:
+    if len(x) < FRAME:
+        x = np.pad(x, (0, FRAME - len(x)))
+    frames = np.lib.stride_tricks.sliding_window_view(x, FRAME)[::HOP]
+    power_t = frames * frames
+    energy_db = 10.0 * np.log10(power_t.mean(axis=1) + 1e-10)
+
+    spec = np.abs(np.fft.rfft(frames * _window(), n=N_FFT, axis=1)) ** 2
+    ceps = np.log(spec.astype(np.float32) @ _mel_filterbank() + 1e-8) @ _dct()
+
+    # 语音帧：高于底噪 8 dB，且不低于峰值 40 dB 以下（TTS 的数字静音底噪极低）
+    floor, peak = np.percentile(energy_db, 10), np.percentile(energy_db, 99)
+    speech = energy_db > max(floor + 8.0, peak - 40.0)
+
+    ref = ceps[speech] if speech.sum() >= 10 else ceps
+    norm = (ceps - ref.mean(axis=0)) / (ref.std(axis=0) + 1e-5)
+    norm[~speech] = 0.0
+    level = np.clip((energy_db - peak) / 30.0 + 1.0, 0.0, 1.0) * energy_weight
+    feats = np.concatenate([norm, level[:, None]], axis=1).astype(np.float32)
+    return Features(feats, energy_db.astype(np.float32), speech)
+
+
+# ---------- banded DTW ----------
+
+def _band(n: int, m: int, half_width: int):
+    """Per-row column range [lo, hi) of a band around the i * m / n diagonal; always connected."""
+    center = np.arange(n) * (m / max(n, 1))
+    lo = np.clip(np.floor(center).astype(np.int64) - half_width, 0, m - 1)
+    hi = np.clip(np.floor(center).astype(np.int64) + half_width + 1, 1, m)
+    hi[-1] = m
+    lo = np.maximum.accumulate(lo)
+    hi = np.maximum(np.maximum.accumulate(hi), lo + 1)
+    return lo, hi
+
+
+def _band_costs(X: np.ndarray, Y: np.ndarray, lo: np.ndarray, hi: np.ndarray, block: int = 256) -> np.ndarray:
+    """Euclidean frame distances inside the band, (n, W) padded with inf; one GEMM per block of rows."""
+    n = len(X)
+    width = int((hi - lo).max())
+    out = np.full((n, width), np.inf, dtype=np.float32)
+    xx = np.einsum("ij,ij->i", X, X)
+    yy = np.einsum("ij,ij->i", Y, Y)
+    cols = np.arange(width)
+    for s in range(0, n, block):
+        e = min(n, s + block)
+        c0, c1 = int(lo[s:e].min()), int(hi[s:e].max())
+        d2 = xx[s:e, None] + yy[None, c0:c1] - 2.0 * (X[s:e] @ Y[c0:c1].T)
+        d = np.sqrt(np.maximum(d2, 0.0))
+        idx = lo[s:e, None] - c0 + cols[None, :]
+        valid = cols[None, :] < (hi[s:e] - lo[s:e])[:, None]
+        rows = np.arange(e - s)[:, None]
+        out[s:e] = np.where(valid, d[rows, np.minimum(idx, c1 - c0 - 1)], np.inf)
+    return out
+
+
+def banded_dtw(X: np.ndarray, Y: np.ndarray, band_frac: float = DEFAULT_BAND_FRAC, band_min: int = DEFAULT_BAND_MIN):
+    """
+    DTW with steps (1,1), (1,0), (0,1) inside a Sakoe-Chiba band.
+
+    Returns (path_i, path_j, local_cost_along_path). Row recurrence:
+      A[j] = d[i,j] + min(D[i-1,j-1], D[i-1,j])
+      D[i,j] = min(A[j], D[i,j-1] + d[i,j]) = S[j] + prefix_min(A - S)[j],  S = cumsum(d[i])
+    """
+    n, m = len(X), len(Y)
+    half = max(band_min, int(band_frac * max(n, m)), int(np.ceil(m / max(n, 1))) + 1)
+    lo, hi = _band(n, m, half)
+    cost = _band_costs(X, Y, lo, hi).astype(np.float64)
+    width = cost.shape[1]
+    D = np.full((n, width), np.inf)
+
+    for i in range(n):
+        span = int(hi[i] - lo[i])
+        d = cost[i, :span]
+        S = np.cumsum(d)
+        if i == 0:
+            A = np.full(span, np.inf)
+            if lo[0] == 0:
+                A[0] = d[0]
+        else:
+            # previous row on columns lo[i]-1 .. hi[i]-1 (inf outside its band)
+            pl, ph = int(lo[i - 1]), int(hi[i - 1])
+            start = int(lo[i]) - 1
+            P = np.full(span + 1, np.inf)
+            a, b = max(start, pl), min(int(hi[i]), ph)
+            if b > a:
+                P[a - start:b - start] = D[i - 1, a - pl:b - pl]
+            A = d + np.minimum(P[:-1], P[1:])
+        D[i, :span] = S + np.minimum.accumulate(A - S)
+
+    # traceback
+    def at(i, j):
+        if i < 0 or j < lo[i] or j >= hi[i]:
+            return np.inf
+        return D[i, j - lo[i]]
+
+    i, j = n - 1, m - 1
+    path_i, path_j = [i], [j]
+    while i > 0 or j > 0:
+        cands = ((at(i - 1, j - 1), i - 1, j - 1), (at(i - 1, j), i - 1, j), (at(i, j - 1), i, j - 1))
+        _, i, j = min(cands, key=lambda c: c[0])
+        path_i.append(i)
+        path_j.append(j)
+    pi = np.array(path_i[::-1])
+    pj = np.array(path_j[::-1])
+    local = cost[pi, pj - lo[pi]]
+    return pi, pj, local
+
+
+# ---------- sentences ----------
+
+def split_sentences(text: str):
+    parts = [p.strip() for p in re.split(r"(?<=[.!?;])\s+", text or "") if p.strip()]
+    return parts or [text.strip()]
+
+
+def _runs(mask: np.ndarray):
+    """[(start, end)] of True runs."""
+    if not len(mask):
+        return []
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def boundaries_from_text(ref: Features, sentences) -> list:
+    """Sentence frame ranges of one reference file: split by character share of the speech, snapped to pauses."""
+    n = len(ref)
+    if len(sentences) <= 1:
+        return [(0, n)]
+    speech_idx = np.flatnonzero(ref.speech)
+    if not len(speech_idx):
+        return [(round(k * n / len(sentences)), round((k + 1) * n / len(sentences))) for k in range(len(sentences))]
+    silences = [(s, e) for s, e in _runs(~ref.speech) if s > 0 and e < n]
+    chars = np.cumsum([len(s) for s in sentences])
+    cuts = []
+    for share in chars[:-1] / chars[-1]:
+        target = int(speech_idx[min(len(speech_idx) - 1, int(share * len(speech_idx)))])
+        near = [((s + e) // 2, abs((s + e) // 2 - target)) for s, e in silences if abs((s + e) // 2 - target) <= 100]
+        cuts.append(min(near, key=lambda c: c[1])[0] if near else target)
+    cuts = sorted(set(cuts))
+    edges = [0] + cuts + [n]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def concat_clips(clips):
+    """Reference clips (one per sentence) -> one signal with short gaps, plus sentence frame ranges."""
+    gap = np.zeros(CLIP_GAP_FRAMES * HOP, dtype=np.float32)
+    parts, bounds, pos = [], [], 0
+    for k, clip in enumerate(clips):
+        if k:
+            parts.append(gap)
+            pos += len(gap)
+        parts.append(clip.astype(np.float32))
+        start = pos // HOP
+        pos += len(clip)
+        bounds.append((start, pos // HOP))
+    signal = np.concatenate(parts) if parts else np.zeros(FRAME, dtype=np.float32)
+    n = max(1, (len(signal) - FRAME) // HOP + 1)
+    bounds = [(min(s, n - 1), min(max(e, s + 1), n)) for s, e in bounds]
+    return signal, bounds
+
+
+# ---------- scoring ----------
+
+def _sentence_metrics(ref: Features, lrn: Features, a: int, b: int, t_of_i: np.ndarray,
+                      lrn_speech_frac: np.ndarray, cost_of_i: np.ndarray) -> dict:
+    idx = np.arange(a, b)
+    ref_speech = ref.speech[a:b]
+    n_speech = int(ref_speech.sum())
+    t = t_of_i[a:b]
+
+    coverage = float((lrn_speech_frac[a:b][ref_speech] > 0.5).mean()) if n_speech else 0.0
+
+    # timing: residual of the aligned learner time around the sentence's own straight-line tempo
+    if n_speech >= 3:
+        xi, ti = idx[ref_speech].astype(np.float64), t[ref_speech]
+        slope, intercept = np.polyfit(xi, ti, 1)
+        timing_dev_ms = float(np.sqrt(np.mean((ti - (slope * xi + intercept)) ** 2)) * HOP_MS)
+    else:
+        slope, timing_dev_ms = 1.0, 0.0
+
+    # rhythm: energy envelopes correlated through a smoothed alignment (~0.5 s), so the
+    # comparison follows the learner's tempo changes but DTW cannot snap syllables onto each other
+    kernel = np.ones(5) / 5
+    ref_env = np.convolve(ref.energy_db[a:b], kernel, mode="same")
+    smooth = np.convolve(np.pad(t, RHYTHM_SMOOTH_FRAMES // 2, mode="edge"), np.ones(RHYTHM_SMOOTH_FRAMES) / RHYTHM_SMOOTH_FRAMES,
+                         mode="valid")[:len(t)]
+    lrn_env = np.convolve(lrn.energy_db, kernel, mode="same")[np.clip(np.round(smooth).astype(int), 0, len(lrn) - 1)]
+    if b - a >= 5 and ref_env.std() > 1e-6 and lrn_env.std() > 1e-6:
+        rhythm = max(0.0, float(np.corrcoef(ref_env, lrn_env)[0, 1]))
+    else:
+        rhythm = 0.0
+
+    # pauses inside the sentence (not its leading / trailing silence)
+    speech_pos = np.flatnonzero(ref_speech)
+    ref_pauses = []
+    if len(speech_pos):
+        first, last = speech_pos[0], speech_pos[-1]
+        ref_pauses = [(a + first + s, a + first + e) for s, e in _runs(~ref_speech[first:last + 1]) if e - s >= MIN_PAUSE_FRAMES]
+    l0, l1 = int(np.floor(t.min())), int(np.ceil(t.max())) + 1
+    lrn_seg = lrn.speech[l0:l1]
+    lrn_pos = np.flatnonzero(lrn_seg)
+    lrn_pauses = []
+    if len(lrn_pos):
+        first, last = lrn_pos[0], lrn_pos[-1]
+        lrn_pauses = [(l0 + first + s, l0 + first + e) for s, e in _runs(~lrn_seg[first:last + 1]) if e - s >= MIN_PAUSE_FRAMES]
+    mapped = [(t_of_i[s], t_of_i[e - 1]) for s, e in ref_pauses]
+    matched = sum(1 for ms, me in mapped if any(ls < me + 10 and le > ms - 10 for ls, le in lrn_pauses))
+    inserted = sum(1 for ls, le in lrn_pauses if not any(ls < me + 10 and le > ms - 10 for ms, me in mapped))
+    ref_pause_ms = sum(e - s for s, e in ref_pauses) * HOP_MS
+    lrn_pause_ms = sum(e - s for s, e in lrn_pauses) * HOP_MS
+
+    match_cost = float(cost_of_i[a:b][ref_speech].mean()) if n_speech else float("nan")
+    spectral = float(100.0 * np.exp(-match_cost / 4.0)) if n_speech else 0.0
+
+    timing_score = 100.0 * float(np.exp(-timing_dev_ms / 150.0))
+    score = 0.3 * coverage * 100 + 0.25 * rhythm * 100 + 0.25 * timing_score + 0.2 * spectral
+    return {
+        "ref_ms": [round(a * HOP_MS), round(b * HOP_MS)],
+        "learner_ms": [round(l0 * HOP_MS), round(l1 * HOP_MS)],
+        "coverage": round(coverage * 100, 1),
+        "rhythm": round(rhythm * 100, 1),
+        "timing_dev_ms": round(timing_dev_ms, 1),
+        "tempo": round(float(slope), 3),
+        "pauses": {"reference": len(ref_pauses), "matched": matched, "missed": len(ref_pauses) - matched,
+                   "inserted": inserted},
+        "pause_mismatch_ms": round(abs(lrn_pause_ms - ref_pause_ms)),
+        "spectral_match": round(spectral, 1),
+        "score": round(score, 1),
+    }
+
+
+def score_attempt(reference: np.ndarray, learner: np.ndarray, sentences=None, bounds=None,
+                  band_frac: float = DEFAULT_BAND_FRAC) -> dict:
+    """
+    reference / learner: float32 mono at 16 kHz.
+    bounds: sentence frame ranges in the reference; otherwise derived from `sentences` (texts).
+    """
+    ref = extract(reference)
+    lrn = extract(learner)
+    if bounds is None:
+        bounds = boundaries_from_text(ref, list(sentences or [""]))
+
+    pi, pj, local = banded_dtw(ref.feats, lrn.feats, band_frac=band_frac)
+    n = len(ref)
+    count = np.bincount(pi, minlength=n).astype(np.float64)
+    t_of_i = np.bincount(pi, weights=pj, minlength=n) / np.maximum(count, 1)
+    lrn_speech_frac = np.bincount(pi, weights=lrn.speech[pj].astype(np.float64), minlength=n) / np.maximum(count, 1)
+    cost_of_i = np.bincount(pi, weights=local, minlength=n) / np.maximum(count, 1)
+
+    per = []
+    for k, (a, b) in enumerate(bounds):
+        m = _sentence_metrics(ref, lrn, int(a), int(b), t_of_i, lrn_speech_frac, cost_of_i)
+        if sentences is not None and k < len(sentences):
+            m["text"] = sentences[k]
+        per.append(m)
+
+    weights = np.array([max(1, b - a) for a, b in bounds], dtype=np.float64)
+
+    def avg(key):
+        return round(float(np.average([s[key] for s in per], weights=weights)), 1)
+
+    return {
+        "score": avg("score"),
+        "coverage": avg("coverage"),
+        "rhythm": avg("rhythm"),
+        "timing_dev_ms": avg("timing_dev_ms"),
+        "spectral_match": avg("spectral_match"),
+        "pause_mismatch_ms": int(sum(s["pause_mismatch_ms"] for s in per)),
+        "tempo": round(float((len(lrn) / max(1, n))), 3),
+        "sentences": per,
+    }
+
+
+def score_files(job: dict) -> dict:
+    """Process-pool entry point: {"reference": path | "clips": [paths], "learner": path, "text": str}."""
+    learner = load_wav(job["learner"])
+    if job.get("clips"):
+        reference, bounds = concat_clips([load_wav(p) for p in job["clips"]])
+        return score_attempt(reference, learner, sentences=job.get("sentences"), bounds=bounds)
+    return score_attempt(load_wav(job["reference"]), learner, sentences=split_sentences(job.get("text", "")))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Score a shadowing attempt against the reference audio (local, DTW)")
+    parser.add_argument("paths", nargs="+", help="reference.wav learner.wav, or learner.wav with --ref-clip")
+    parser.add_argument("--ref-clip", action="append", default=[], help="Reference audio of one sentence (repeat, in order)")
+    parser.add_argument("--text", default="", help="Reference text; split into sentences for per-sentence scores")
+    parser.add_argument("--band", type=float, default=DEFAULT_BAND_FRAC, help="DTW band half-width as a share of the longer signal")
+    args = parser.parse_args()
+
+    try:
+        if args.ref_clip:
+            reference, bounds = concat_clips([load_wav(p) for p in args.ref_clip])
+            sentences = split_sentences(args.text) if args.text else None
+            if sentences and len(sentences) != len(bounds):
+                sentences = None
+            result = score_attempt(reference, load_wav(args.paths[-1]), sentences=sentences, bounds=bounds, band_frac=args.band)
+        else:
+            if len(args.paths) != 2:
+                parser.error("need reference.wav and learner.wav (or --ref-clip ... learner.wav)")
+            result = score_attempt(load_wav(args.paths[0]), load_wav(args.paths[1]),
+                                   sentences=split_sentences(args.text), band_frac=args.band)
+    except (OSError, ValueError, wave.Error) as e:
+        sys.stderr.write(f"[ERROR] {e}\n")
+        return 2
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -8,13 +8,9 @@ import json
 import base64
 import threading
 import time
-import dashscope
-from dashscope.audio.qwen_omni import OmniRealtimeConversation, OmniRealtimeCallback, MultiModality
-from dashscope.audio.qwen_omni.omni_realtime import TranscriptionParams
 
-class TestCallback(OmniRealtimeCallback):
+class TestCallback:  # OmniRealtimeCallback compatible (duck-typing)
     def __init__(self):
-        super().__init__()
         self.opened = False
         self.received_events = []
         self.done = threading.Event()
@@ -47,6 +43,11 @@ def main():
         return 1
     
     print(f"✓ API Key: {api_key[:10]}...")
+
+    import dashscope
+    from dashscope.audio.qwen_omni import OmniRealtimeConversation, MultiModality
+    from dashscope.audio.qwen_omni.omni_realtime import TranscriptionParams
+
     dashscope.api_key = api_key
     
     callback = TestCallback()
@@ -1,117 +1,256 @@
 #!/usr/bin/env python3
 """
-Test script to detect if Sarah.jpg is suitable for digital human generation
+Check whether examiner avatars are suitable for digital human generation
+(wan2.2-s2v-detect), for a whole directory at once.
+
+For every image: hash the content, skip it if the cache already holds a
+verdict for that hash, otherwise upload it to DashScope (multipart body
+streamed from disk in 64 KB pieces, never the whole file in memory) and call
+face-detect with the temporary URL. Checks run on a bounded thread pool that
+shares one pooled HTTP session; identical files are checked once. Verdicts
+(pass or fail, not transport errors) are cached by SHA-256 in a JSON file,
+so unchanged avatars are never uploaded again.
+
+Environment:
+  DASHSCOPE_API_KEY             required (any value against the stand-in)
+  DASHSCOPE_BASE_HTTP_API_URL   default https://dashscope.aliyuncs.com/api/v1;
+                                http://127.0.0.1:<port>/api/v1 for server/dashscope_standin.py
+
+Usage:
+  python3 server/test_face_detect.py [public/examiners ...] [--workers 4] [--force] [--json]
+
+Exit status: 0 all images passed, 1 some failed or errored, 2 bad usage.
 """
+import argparse
+import hashlib
+import json
 import os
 import sys
-import json
-import dashscope
-from http import HTTPStatus
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIR = os.path.join(ROOT, "public", "examiners")
+DEFAULT_CACHE = os.path.join(ROOT, "server", ".face_detect_cache.json")
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/api/v1"
+MODEL = "wan2.2-s2v-detect"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+CHUNK = 64 * 1024
+TIMEOUT_S = (10, 120)  # connect, read
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def find_images(paths) -> list:
+    found = []
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                full = os.path.join(p, name)
+                if os.path.isfile(full) and name.lower().endswith(IMAGE_EXTS):
+                    found.append(full)
+        elif os.path.isfile(p):
+            found.append(p)
+        else:
+            raise FileNotFoundError(p)
+    return found
+
+
+class MultipartFile:
+    """multipart/form-data body with a single file field, streamed from disk.
+
+    Has __len__ so requests sends a Content-Length instead of chunked encoding,
+    and reopens the file on every iteration so a retried request can resend it.
+    """
+
+    def __init__(self, path: str, field: str = "file"):
+        self.path = path
+        self.boundary = uuid.uuid4().hex
+        name = os.path.basename(path).replace('"', "")
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("ascii")
+        self.size = os.path.getsize(path)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self._head) + self.size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK), b""):
+                yield block
+        yield self._tail
+
+
+class ResultCache:
+    """SHA-256 -> verdict, persisted as JSON (written atomically after each new verdict)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, digest: str):
+        with self._lock:
+            return self._data.get(digest)
+
+    def put(self, digest: str, verdict: dict) -> None:
+        with self._lock:
+            self._data[digest] = verdict
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=2, ensure_ascii=False, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def make_session(api_key: str, workers: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {api_key}"
+    # One keep-alive connection per worker; retry throttling and gateway errors
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504), allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def check_image(session, base_url: str, path: str) -> dict:
+    """Upload one image and run face-detect; returns the verdict (raises on transport/API errors)."""
+    body = MultipartFile(path)
+    t0 = time.perf_counter()
+    up = session.post(f"{base_url}/uploads", data=body, headers={"Content-Type": body.content_type}, timeout=TIMEOUT_S)
+    if up.status_code != 200:
+        raise RuntimeError(f"upload failed: HTTP {up.status_code} {up.text[:200]}")
+    image_url = (up.json().get("output") or {}).get("url")
+    if not image_url:
+        raise RuntimeError(f"upload response has no url: {up.text[:200]}")
+    upload_ms = (time.perf_counter() - t0) * 1000
+
+    det = session.post(
+        f"{base_url}/services/aigc/image2video/face-detect",
+        json={"model": MODEL, "input": {"image_url": image_url}},
+        timeout=TIMEOUT_S,
+    )
+    if det.status_code != 200:
+        raise RuntimeError(f"face-detect failed: HTTP {det.status_code} {det.text[:200]}")
+    result = det.json()
+    output = result.get("output") or {}
+    return {
+        "check_pass": bool(output.get("check_pass")),
+        "message": output.get("message") or "",
+        "request_id": result.get("request_id", ""),
+        "model": MODEL,
+        "bytes": body.size,
+        "upload_ms": round(upload_ms),
+        "total_ms": round((time.perf_counter() - t0) * 1000),
+        "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Batch wan2.2-s2v-detect check of examiner avatars (cached by content hash)")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_DIR], help="Image files or directories")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent checks")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="Verdict cache (JSON, keyed by SHA-256)")
+    parser.add_argument("--force", action="store_true", help="Ignore cached verdicts and check again")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per image")
+    args = parser.parse_args()
 
-def detect_face(image_path):
-    """Detect if image is suitable for wan2.2-s2v model"""
-    
-    # Get API key
     api_key = os.getenv("DASHSCOPE_API_KEY", "")
     if not api_key:
-        print("Error: DASHSCOPE_API_KEY not set")
-        return False
-    
-    dashscope.api_key = api_key
-    
-    # Check if file exists
-    if not os.path.exists(image_path):
-        print(f"Error: File not found: {image_path}")
-        return False
-    
-    print(f"Detecting face in: {image_path}")
-    print(f"File size: {os.path.getsize(image_path)} bytes")
-    
-    # Upload file and get temporary URL
-    # DashScope SDK supports direct file upload
-    from dashscope import ImageSynthesis
-    
+        sys.stderr.write("[ERROR] DASHSCOPE_API_KEY is not set\n")
+        return 2
+    base_url = os.getenv("DASHSCOPE_BASE_HTTP_API_URL", DEFAULT_BASE_URL).rstrip("/")
+
     try:
-        # Use the face detection API
-        url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/image2video/face-detect"
-        
-        # Read image as base64
-        import base64
-        with open(image_path, 'rb') as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Try using local file path - some APIs support it
-        import requests
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # First, try to upload the file to get a temporary URL
-        print("Uploading image to get temporary URL...")
-        
-        # Use DashScope's file upload API
-        files = {'file': open(image_path, 'rb')}
-        upload_url = "https://dashscope.aliyuncs.com/api/v1/uploads"
-        
-        upload_headers = {
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        upload_resp = requests.post(upload_url, headers=upload_headers, files=files)
-        
-        if upload_resp.status_code == 200:
-            upload_data = upload_resp.json()
-            print(f"Upload response: {json.dumps(upload_data, indent=2)}")
-            
-            # Extract URL from response
-            if 'output' in upload_data and 'url' in upload_data['output']:
-                image_url = upload_data['output']['url']
-                print(f"Temporary URL: {image_url}")
-                
-                # Now call detection API
-                detect_data = {
-                    "model": "wan2.2-s2v-detect",
-                    "input": {
-                        "image_url": image_url
-                    }
-                }
-                
-                detect_resp = requests.post(url, headers=headers, json=detect_data)
-                
-                if detect_resp.status_code == 200:
-                    result = detect_resp.json()
-                    print("\n" + "="*50)
-                    print("Detection Result:")
-                    print("="*50)
-                    print(json.dumps(result, indent=2, ensure_ascii=False))
-                    
-                    if result.get('output', {}).get('check_pass'):
-                        print("\n✅ Image PASSED detection! Suitable for digital human generation.")
-                        return True
-                    else:
-                        print("\n❌ Image FAILED detection.")
-                        print(f"Reason: {result.get('output', {}).get('message', 'Unknown')}")
-                        return False
-                else:
-                    print(f"Detection API error: {detect_resp.status_code}")
-                    print(detect_resp.text)
-                    return False
-            else:
-                print(f"Failed to get URL from upload response")
-                return False
+        images = find_images(args.paths)
+    except FileNotFoundError as e:
+        sys.stderr.write(f"[ERROR] File not found: {e}\n")
+        return 2
+    if not images:
+        sys.stderr.write("[ERROR] No images found\n")
+        return 2
+
+    t0 = time.perf_counter()
+    cache = ResultCache(args.cache)
+    by_hash = {}
+    for path in images:
+        by_hash.setdefault(sha256_file(path), []).append(path)
+
+    verdicts, errors = {}, {}
+    todo = []
+    for digest in by_hash:
+        hit = None if args.force else cache.get(digest)
+        if hit is not None:
+            verdicts[digest] = dict(hit, cached=True)
         else:
-            print(f"Upload failed: {upload_resp.status_code}")
-            print(upload_resp.text)
-            return False
-            
-    except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+            todo.append(digest)
+
+    if todo:
+        workers = max(1, min(args.workers, len(todo)))
+        session = make_session(api_key, workers)
+
+        def run(digest: str):
+            try:
+                verdict = check_image(session, base_url, by_hash[digest][0])
+            except Exception as e:
+                errors[digest] = str(e)
+                return
+            cache.put(digest, verdict)
+            verdicts[digest] = dict(verdict, cached=False)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, todo))
+        session.close()
+
+    failed = 0
+    for digest, paths in by_hash.items():
+        for path in paths:
+            rel = os.path.relpath(path, ROOT) if path.startswith(ROOT) else path
+            if digest in errors:
+                failed += 1
+                row = {"image": rel, "sha256": digest, "error": errors[digest]}
+                text = f"ERROR  {rel}: {errors[digest]}"
+            else:
+                v = verdicts[digest]
+                failed += 0 if v["check_pass"] else 1
+                row = {"image": rel, "sha256": digest, **v}
+                source = "cached" if v["cached"] else f"{v['total_ms']} ms"
+                text = f"{'PASS' if v['check_pass'] else 'FAIL'}   {rel} ({source})" + \
+                       ("" if v["check_pass"] else f": {v['message'] or 'unknown reason'}")
+            print(json.dumps(row, ensure_ascii=False) if args.json else text)
+
+    sys.stderr.write(
+        f"[STATS] images={len(images)} unique={len(by_hash)} checked={len(todo) - len(errors)} "
+        f"cached={len(by_hash) - len(todo)} errors={len(errors)} wall_ms={(time.perf_counter() - t0) * 1000:.0f}\n"
+    )
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
-    image_path = "/Users/wann/Desktop/SmarTalk/Sarah.jpg"
-    success = detect_face(image_path)
-    sys.exit(0 if success else 1)
+    raise SystemExit(main())
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Usage metering: what an exam costs, per session and per day.
+
+Every script ends its output with a `usage` event (examiner / feedback: LLM
+tokens, TTS: input characters and output samples, ASR bridge: audio seconds
+sent upstream, client commits and segment auto-commits). index.js tags each
+one with the exam session, the service and the exam part, and appends it to
+the ledger (USAGE_LEDGER, default server/.usage.jsonl), one JSON object per
+line:
+
+  {"ts": 1760860000.1, "session": "exam_1760859000000", "service": "examiner",
+   "part": 1, "model": "qwen-plus", "requests": 1, "input_tokens": 812, "output_tokens": 41}
+
+This script prices the records (PRICES below, CNY list prices; override with
+USAGE_PRICES_FILE, a JSON object of the same shape) and rolls them up per
+day, per session and per (service, part), so the expensive parts of an exam
+stand out. Budgets come from USAGE_SESSION_BUDGET / USAGE_DAY_BUDGET (CNY)
+or the flags below; a budget alarms at 80% and again when exceeded.
+
+Usage:
+  python3 server/usage_meter.py [--days 7] [--top 10] [--json]
+  python3 server/usage_meter.py --session exam_1760859000000
+  # started by index.js when USAGE_FOLLOW=1: tail the ledger, print [ALARM]
+  # lines on stderr and keep the rollup file (USAGE_ROLLUP) current
+  python3 server/usage_meter.py --follow
+
+Exit status (report): 0 within budget, 1 a budget was exceeded, 2 bad usage.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LEDGER = os.path.join(SERVER_DIR, ".usage.jsonl")
+DEFAULT_ROLLUP = os.path.join(SERVER_DIR, ".usage-rollup.json")
+
+# CNY. LLM: per million tokens; TTS: per 10k input characters; ASR: per second of audio sent
+PRICES = {
+    "qwen-plus": {"input_per_mtok": 0.8, "output_per_mtok": 2.0},
+    "qwen-turbo": {"input_per_mtok": 0.3, "output_per_mtok": 0.6},
+    "qwen-flash": {"input_per_mtok": 0.15, "output_per_mtok": 1.5},
+    "qwen-max": {"input_per_mtok": 2.4, "output_per_mtok": 9.6},
+    "qwen3-tts-flash-realtime": {"per_10k_chars": 1.0},
+    "qwen3-asr-flash-realtime": {"per_audio_s": 0.00033},
+}
+# 累加的计量字段（其余字段只用于分组）
+METERED = ("requests", "input_tokens", "output_tokens", "chars", "audio_ms", "audio_s", "commits", "auto_commits", "sessions")
+ALARM_LEVELS = (0.8, 1.0)
+FOLLOW_POLL_S = 1.0
+ROLLUP_SESSIONS = 200  # 汇总文件只保留最近的会话
+
+
+def load_prices() -> dict:
+    prices = dict(PRICES)
+    path = os.getenv("USAGE_PRICES_FILE", "")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            prices.update(json.load(f))
+    return prices
+
+
+def cost_of(rec: dict, prices: dict):
+    """Estimated cost in CNY, or None when the model has no price."""
+    p = prices.get(rec.get("model") or "")
+    if p is None:
+        return None
+
+    def num(key):
+        value = rec.get(key)
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+    return (
+        num("input_tokens") / 1e6 * p.get("input_per_mtok", 0.0)
+        + num("output_tokens") / 1e6 * p.get("output_per_mtok", 0.0)
+        + num("chars") / 1e4 * p.get("per_10k_chars", 0.0)
+        + num("audio_s") * p.get("per_audio_s", 0.0)
+    )
+
+
+def part_label(rec: dict) -> str:
+    service = rec.get("service") or "?"
+    part = rec.get("part")
+    if part is None or part == "":
+        return service
+    return f"{service}/part{part}" if isinstance(part, int) or str(part).isdigit() else f"{service}/{part}"
+
+
+def _add(bucket: dict, rec: dict, cost) -> None:
+    bucket["records"] = bucket.get("records", 0) + 1
+    bucket["cost"] = bucket.get("cost", 0.0) + (cost or 0.0)
+    if cost is None:
+        bucket["unpriced"] = bucket.get("unpriced", 0) + 1
+    for key in METERED:
+        value = rec.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            bucket[key] = bucket.get(key, 0) + value
+
+
+class Rollup:
+    """Running totals per day, per session and per (service, part)."""
+
+    def __init__(self, prices: dict):
+        self.prices = prices
+        self.days = {}
+        self.sessions = OrderedDict()  # session -> {"day", "first_ts", "last_ts", "total", "parts"}; oldest first
+        self.parts = {}
+        self.records = 0
+        self.bad_lines = 0
+
+    def add(self, rec: dict):
+        """Add one ledger record; returns (day, session) it was booked under."""
+        ts = float(rec.get("ts") or time.time())
+        day = time.strftime("%Y-%m-%d", time.localtime(ts))
+        session = str(rec.get("session") or "-")
+        cost = cost_of(rec, self.prices)
+        label = part_label(rec)
+        self.records += 1
+
+        _add(self.days.setdefault(day, {}), rec, cost)
+        _add(self.parts.setdefault(label, {}), rec, cost)
+        s = self.sessions.get(session)
+        if s is None:
+            s = self.sessions[session] = {"day": day, "first_ts": ts, "last_ts": ts, "total": {}, "parts": {}}
+        else:
+            self.sessions.move_to_end(session)
+            s["last_ts"] = max(s["last_ts"], ts)
+        _add(s["total"], rec, cost)
+        _add(s["parts"].setdefault(label, {}), rec, cost)
+        return day, session
+
+    def add_line(self, line: str):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            self.bad_lines += 1
+            return None
+        if not isinstance(rec, dict):
+            self.bad_lines += 1
+            return None
+        return self.add(rec)
+
+    def day_sessions(self, day: str) -> int:
+        return sum(1 for s in self.sessions.values() if s["day"] == day)
+
+    def to_dict(self, max_sessions: int = ROLLUP_SESSIONS) -> dict:
+        sessions = list(self.sessions.items())[-max_sessions:]
+        return {
+            "updated_at": round(time.time(), 1),
+            "records": self.records,
+            "days": {d: _rounded(b) for d, b in sorted(self.days.items())},
+            "parts": {k: _rounded(b) for k, b in sorted(self.parts.items())},
+            "sessions": {
+                k: {**{f: v for f, v in s.items() if f not in ("total", "parts")},
+                    "total": _rounded(s["total"]), "parts": {p: _rounded(b) for p, b in s["parts"].items()}}
+                for k, s in sessions
+            },
+        }
+
+
+def _rounded(bucket: dict) -> dict:
+    return {k: round(v, 6 if k == "cost" else 2) if isinstance(v, float) else v for k, v in bucket.items()}
+
+
+class BudgetAlarms:
+    """Fires once per (scope, level): at 80% of a budget and when it is exceeded."""
+
+    def __init__(self, session_budget: float, day_budget: float):
+        self.session_budget = session_budget
+        self.day_budget = day_budget
+        self._fired = set()
+        self.exceeded = []
+
+    def check(self, rollup: Rollup, day: str, session: str, notify: bool = True) -> list:
+        alarms = []
+        scopes = []
+        if self.session_budget > 0 and session in rollup.sessions:
+            scopes.append(("session", session, rollup.sessions[session]["total"].get("cost", 0.0), self.session_budget))
+        if self.day_budget > 0 and day in rollup.days:
+            scopes.append(("day", day, rollup.days[day].get("cost", 0.0), self.day_budget))
+        for scope, key, cost, budget in scopes:
+            crossed = [level for level in ALARM_LEVELS if cost >= budget * level]
+            if not crossed or (scope, key, crossed[-1]) in self._fired:
+                continue
+            # 一条记录同时越过多个阈值时只报最高的那个
+            self._fired.update((scope, key, level) for level in crossed)
+            if crossed[-1] >= 1.0:
+                self.exceeded.append((scope, key))
+            if notify:
+                verb = "exceeded" if crossed[-1] >= 1.0 else f"at {cost / budget:.0%} of"
+                alarms.append(f"[ALARM] {scope} {key}: {cost:.4f} CNY {verb} budget {budget:.4f} CNY")
+        return alarms
+
+
+def write_rollup(path: str, rollup: Rollup, budgets: BudgetAlarms) -> None:
+    data = rollup.to_dict()
+    data["budgets"] = {"session": budgets.session_budget, "day": budgets.day_budget}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def follow(ledger: str, rollup_path: str, rollup: Rollup, budgets: BudgetAlarms) -> int:
+    """Tail the ledger: book new lines as Node appends them, alarm, keep the rollup file current."""
+    pos, carry = 0, b""
+    # 第一轮读完已有记录：已越过的阈值只标记为已触发，不重复报警
+    loaded = False
+    while True:
+        try:
+            size = os.path.getsize(ledger)
+        except OSError:
+            size = 0
+        if size < pos:
+            pos, carry = 0, b""  # 账本被截断或轮换：从头读新内容
+        changed = not loaded
+        if size > pos:
+            with open(ledger, "rb") as f:
+                f.seek(pos)
+                data = carry + f.read(size - pos)
+            pos = size
+            *lines, carry = data.split(b"\n")
+            for raw in lines:
+                booked = rollup.add_line(raw.decode("utf-8", "replace"))
+                if booked is None:
+                    continue
+                changed = True
+                for alarm in budgets.check(rollup, *booked, notify=loaded):
+                    sys.stderr.write(alarm + "\n")
+        if not loaded:
+            loaded = True
+            sys.stderr.write(f"[STATS] usage ledger loaded: records={rollup.records} days={len(rollup.days)} "
+                             f"sessions={len(rollup.sessions)}\n")
+        if changed:
+            try:
+                write_rollup(rollup_path, rollup, budgets)
+            except OSError as e:
+                sys.stderr.write(f"[ERROR] Cannot write {rollup_path}: {e}\n")
+        sys.stderr.flush()
+        time.sleep(FOLLOW_POLL_S)
+
+
+def _fmt_bucket(b: dict) -> str:
+    parts = []
+    if b.get("input_tokens") or b.get("output_tokens"):
+        parts.append(f"tok {b.get('input_tokens', 0)}/{b.get('output_tokens', 0)}")
+    if b.get("chars"):
+        parts.append(f"chars {b['chars']}")
+    if b.get("audio_s"):
+        parts.append(f"audio {b['audio_s']:.0f}s")
+    if b.get("unpriced"):
+        parts.append(f"unpriced {b['unpriced']}")
+    return ", ".join(parts)
+
+
+def print_report(rollup: Rollup, days: int, top: int, session: str) -> None:
+    if session:
+        s = rollup.sessions[session]
+        print(f"session {session} ({s['day']}, {(s['last_ts'] - s['first_ts']) / 60:.1f} min): "
+              f"{s['total'].get('cost', 0.0):.4f} CNY")
+        total = s["total"].get("cost", 0.0) or 1.0
+        for label, b in sorted(s["parts"].items(), key=lambda kv: -kv[1].get("cost", 0.0)):
+            print(f"  {label:20} {b.get('cost', 0.0):9.4f} CNY {b.get('cost', 0.0) / total:6.1%}  "
+                  f"x{b.get('records', 0):<4} {_fmt_bucket(b)}")
+        return
+
+    recent = sorted(rollup.days)[-days:]
+    print(f"{'day':12} {'sessions':>8} {'records':>8} {'cost CNY':>10} {'CNY/session':>12}")
+    for day in recent:
+        b = rollup.days[day]
+        n = rollup.day_sessions(day)
+        print(f"{day:12} {n:8d} {b.get('records', 0):8d} {b.get('cost', 0.0):10.4f} "
+              f"{b.get('cost', 0.0) / max(1, n):12.4f}")
+
+    in_range = {k: s for k, s in rollup.sessions.items() if s["day"] in recent}
+    if in_range:
+        print(f"\ntop {min(top, len(in_range))} sessions by cost")
+        for key, s in sorted(in_range.items(), key=lambda kv: -kv[1]["total"].get("cost", 0.0))[:top]:
+            worst = max(s["parts"].items(), key=lambda kv: kv[1].get("cost", 0.0))
+            print(f"  {key:28} {s['day']} {s['total'].get('cost', 0.0):9.4f} CNY  most: {worst[0]} "
+                  f"({worst[1].get('cost', 0.0):.4f})")
+
+    # 按 (服务, 部分) 汇总只看所选天数内的会话
+    parts = {}
+    for s in in_range.values():
+        for label, b in s["parts"].items():
+            acc = parts.setdefault(label, {})
+            for k, v in b.items():
+                acc[k] = acc.get(k, 0) + v
+    total = sum(b.get("cost", 0.0) for b in parts.values()) or 1.0
+    if parts:
+        print("\nwhere the cost goes")
+        print(f"  {'service/part':20} {'records':>8} {'cost CNY':>10} {'share':>7} {'CNY/record':>11}  usage")
+        for label, b in sorted(parts.items(), key=lambda kv: -kv[1].get("cost", 0.0)):
+            print(f"  {label:20} {b.get('records', 0):8d} {b.get('cost', 0.0):10.4f} {b.get('cost', 0.0) / total:7.1%} "
+                  f"{b.get('cost', 0.0) / max(1, b.get('records', 0)):11.5f}  {_fmt_bucket(b)}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Roll up usage events per exam session and per day, with budget alarms")
+    parser.add_argument("--ledger", default=os.getenv("USAGE_LEDGER", "") or DEFAULT_LEDGER)
+    parser.add_argument("--rollup", default=os.getenv("USAGE_ROLLUP", "") or DEFAULT_ROLLUP,
+                        help="Rollup JSON kept current in --follow mode")
+    parser.add_argument("--session-budget", type=float, default=float(os.getenv("USAGE_SESSION_BUDGET", "0") or 0),
+                        help="CNY per exam session (0 = no alarm)")
+    parser.add_argument("--day-budget", type=float, default=float(os.getenv("USAGE_DAY_BUDGET", "0") or 0),
+                        help="CNY per day (0 = no alarm)")
+    parser.add_argument("--days", type=int, default=7, help="Days in the report")
+    parser.add_argument("--top", type=int, default=10, help="Most expensive sessions to list")
+    parser.add_argument("--session", default="", help="Breakdown of one session")
+    parser.add_argument("--json", action="store_true", help="Print the rollup as JSON")
+    parser.add_argument("--follow", action="store_true", help="Tail the ledger and alarm as records arrive")
+    args = parser.parse_args()
+
+    try:
+        prices = load_prices()
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"[ERROR] Bad USAGE_PRICES_FILE: {e}\n")
+        return 2
+    rollup = Rollup(prices)
+    budgets = BudgetAlarms(args.session_budget, args.day_budget)
+
+    if args.follow:
+        sys.stderr.write(f"[DEBUG] Following {args.ledger} -> {args.rollup} "
+                         f"(budgets: session={args.session_budget} day={args.day_budget} CNY)\n")
+        sys.stderr.flush()
+        return follow(args.ledger, args.rollup, rollup, budgets)
+
+    try:
+        with open(args.ledger, "r", encoding="utf-8") as f:
+            for line in f:
+                booked = rollup.add_line(line)
+                if booked is not None:
+                    budgets.check(rollup, *booked, notify=False)
+    except FileNotFoundError:
+        sys.stderr.write(f"[ERROR] No usage ledger at {args.ledger}\n")
+        return 2
+    if args.session and args.session not in rollup.sessions:
+        sys.stderr.write(f"[ERROR] Unknown session: {args.session}\n")
+        return 2
+
+    if args.json:
+        data = rollup.to_dict(max_sessions=len(rollup.sessions))
+        if args.session:
+            data = data["sessions"][args.session]
+        print(json.dumps(data, indent=2, ensure_ascii=False))
+    else:
+        print_report(rollup, max(1, args.days), max(1, args.top), args.session)
+    for scope, key in budgets.exceeded:
+        sys.stderr.write(f"[ALARM] {scope} {key} exceeded its budget\n")
+    if rollup.bad_lines:
+        sys.stderr.write(f"[ERROR] Skipped {rollup.bad_lines} malformed ledger lines\n")
+    return 1 if budgets.exceeded else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
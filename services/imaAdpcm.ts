@@ -0,0 +1,50 @@
+// IMA-ADPCM decoder for the TTS downlink (format: ima_adpcm_24000).
+// Block layout matches server/ima_adpcm.py:
+//   int16 first sample | uint8 step index | uint8 reserved | 4-bit codes, low nibble first
+
+const STEP_TABLE = new Int32Array([
+  7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+  50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+  253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+  1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+  3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+  11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+  32767,
+]);
+
+const INDEX_TABLE = new Int8Array([-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]);
+
+const HEADER_BYTES = 4;
+
+export const decodeImaAdpcm = (bytes: Uint8Array, samples: number, blockSamples: number): Int16Array => {
+  const out = new Int16Array(samples);
+  const blockBytes = HEADER_BYTES + ((blockSamples - 1) >> 1);
+  let o = 0;
+
+  for (let b = 0; o < samples && b + HEADER_BYTES <= bytes.length; b += blockBytes) {
+    let pred = (bytes[b] | (bytes[b + 1] << 8)) << 16 >> 16;
+    let index = Math.min(88, bytes[b + 2]);
+    out[o++] = pred;
+
+    const end = Math.min(samples, o + blockSamples - 1);
+    for (let j = 0; o < end; j++) {
+      const byte = bytes[b + HEADER_BYTES + (j >> 1)];
+      const code = j & 1 ? byte >> 4 : byte & 0x0f;
+      const step = STEP_TABLE[index];
+
+      let diff = step >> 3;
+      if (code & 4) diff += step;
+      if (code & 2) diff += step >> 1;
+      if (code & 1) diff += step >> 2;
+      pred += code & 8 ? -diff : diff;
+      if (pred > 32767) pred = 32767;
+      else if (pred < -32768) pred = -32768;
+
+      index += INDEX_TABLE[code];
+      if (index < 0) index = 0;
+      else if (index > 88) index = 88;
+      out[o++] = pred;
+    }
+  }
+  return out;
+};
@@ -12,9 +12,30 @@ export enum ExamState {
   HISTORY = 'HISTORY'
 }
 
+// Per-answer measurements from the ASR bridge's acoustic analyzer (sent to the rater with the transcript)
+export interface AcousticFeatures {
+  duration_s: number;
+  speech_s: number;
+  speech_ratio: number;
+  voiced_ratio: number;
+  loudness_db: number | null;
+  loudness_std_db: number;
+  loudness_stability: number | null;
+  pitch_median_hz: number | null;
+  pitch_range_st: number | null;
+  pitch_std_st: number | null;
+  syllables: number;
+  articulation_rate: number;
+  speech_rate: number;
+  pauses: number;
+  mean_pause_s: number;
+  long_pauses: number;
+}
+
 export interface Message {
   role: 'user' | 'model';
   text: string;
+  acoustic?: AcousticFeatures;
 }
 
 export interface FeedbackData {